@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from bson import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime
 import uuid
 import os
@@ -10,6 +11,9 @@ from backend.app.database import Database
 from backend.app.models import UserInDB, CallInDB
 from backend.app.schemas import CallResponse, CallInviteRequest, CallAcceptRequest, CallEndRequest, RatePartnerRequest
 from backend.app.core.config import settings
+from backend.app.services.directory import directory
+from backend.app.services.presence import presence
+from backend.app.services.percentiles import percentile_service
 
 router = APIRouter()
 
@@ -38,7 +42,7 @@ async def invite_to_call(
                 detail="User not found"
             )
         
-        if not receiver.get("is_online", False):
+        if not await presence.is_online(invite_data.receiver_id):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User is offline"
@@ -64,6 +68,7 @@ async def invite_to_call(
                     {"_id": existing_call["_id"]},
                     {"$set": {"status": "failed", "end_time": datetime.utcnow()}}
                 )
+                directory.invalidate_call(existing_call["_id"])
             else:
                 # Return existing call if it's recent
                 return CallResponse(
@@ -98,6 +103,7 @@ async def invite_to_call(
         
         result = db.calls.insert_one(call_dict)
         call_id = result.inserted_id
+        directory.put_call(call_id, [caller_id, receiver_id], jitsi_room_id)
         
         # Send WebSocket notification to receiver
         try:
@@ -184,6 +190,7 @@ async def accept_call(
             {"_id": call_id},
             {"$set": {"status": "active", "start_time": datetime.utcnow()}}
         )
+        directory.put_call(call_id, [call.caller_id, call.receiver_id], call.jitsi_room_id)
         call.status = "active"
         call.start_time = datetime.utcnow()
     
@@ -246,27 +253,45 @@ async def end_call(
     if end_data.audio_file:
         update_data["audio_url"] = end_data.audio_file
     
-    db.calls.update_one(
-        {"_id": call_id},
+    # Both participants may end the call; only the first one completes it and counts it
+    completed_now = db.calls.update_one(
+        {"_id": call_id, "status": {"$ne": "completed"}},
         {"$set": update_data}
-    )
+    ).modified_count == 1
+    directory.invalidate_call(call_id)
+    await ws_manager.forget_call(str(call_id))
     
     # Update user statistics ONLY if BOTH users actually connected
     call_data = db.calls.find_one({"_id": call_id})
     both_connected = call_data.get("both_users_connected", False)
     
-    if both_connected and duration >= 10:
+    if not completed_now:
+        print(f"⚠️ Call {call_id} already completed - not counted again")
+    elif both_connected and duration >= 10:
         # Only count as valid call if both users connected AND spoke for 10+ seconds
+        from backend.app.services.skill_scores import skill_scores
+        from backend.app.services.achievements import achievements_engine
+        from backend.app.services.friends_leaderboard import friends_leaderboard
         for user_id in [call.caller_id, call.receiver_id]:
-            db.users.update_one(
+            # Before the $inc below: a first-time achievements doc is seeded from total_calls
+            achievements_engine.on_call_completed(user_id, duration)
+            totals = db.users.find_one_and_update(
                 {"_id": user_id},
                 {
                     "$inc": {
                         "total_calls": 1,
                         "total_call_duration": duration
                     }
-                }
+                },
+                projection={"total_calls": 1, "total_call_duration": 1},
+                return_document=ReturnDocument.AFTER
             )
+            skill_scores.record_activity(user_id)
+            friends_leaderboard.invalidate_member(user_id)
+            if totals:
+                percentile_service.observe(
+                    "avg_call_duration", round(totals["total_call_duration"] / totals["total_calls"], 2)
+                )
         
         # Generate INSTANT AI feedback for both users using stored conversation
         from backend.app.ai_processing.instant_analyzer import instant_analyzer
@@ -328,6 +353,27 @@ async def end_call(
             }
         )
         
+        # Grammar/fluency/vocabulary aggregates from each side's own transcript
+        from backend.app.ai_processing.text_analyzer import text_analyzer
+        for user_id, transcript in ((call.caller_id, caller_transcript), (call.receiver_id, receiver_transcript)):
+            if transcript and transcript.strip():
+                analysis = text_analyzer.analyze_text(transcript, duration)
+                skill_doc = skill_scores.record_analysis(user_id, analysis)
+                if skill_doc and skill_doc.get("wpm") is not None:
+                    percentile_service.observe("avg_wpm", skill_doc["wpm"])
+        
+        # Record the earned points in the score ledger (ai_rating is 0-10, ledger is 0-100)
+        from backend.app.services.score_ledger import score_ledger
+        score_ledger.record(call.caller_id, caller_feedback["ai_rating"] * 10, "call", ref_id=call_id)
+        score_ledger.record(call.receiver_id, receiver_feedback["ai_rating"] * 10, "call", ref_id=call_id)
+        
+        from backend.app.services.leagues import leagues
+        leagues.record_points(call.caller_id, caller_feedback["ai_rating"] * 10)
+        leagues.record_points(call.receiver_id, receiver_feedback["ai_rating"] * 10)
+        
+        from backend.app.services.leaderboard_feed import leaderboard_feed
+        leaderboard_feed.notify_score_change()
+        
         print(f"✅ Instant AI feedback generated for call {call_id}")
     else:
         print(f"⚠️ Call not counted - both_connected: {both_connected}, duration: {duration}")
@@ -505,26 +551,32 @@ async def rate_partner(
     # Update the appropriate rating
     if is_caller:
         # Caller rates receiver
-        db.calls.update_one(
-            {"_id": call_id},
-            {
-                "$set": {
-                    "receiver_peer_rating": rate_data.rating,
-                    "receiver_peer_feedback": rate_data.feedback
-                }
-            }
-        )
+        rated_user_id = call_data["receiver_id"]
+        rating_field, feedback_field = "receiver_peer_rating", "receiver_peer_feedback"
     else:
         # Receiver rates caller
-        db.calls.update_one(
-            {"_id": call_id},
-            {
-                "$set": {
-                    "caller_peer_rating": rate_data.rating,
-                    "caller_peer_feedback": rate_data.feedback
-                }
+        rated_user_id = call_data["caller_id"]
+        rating_field, feedback_field = "caller_peer_rating", "caller_peer_feedback"
+    
+    previous_rating = call_data.get(rating_field)
+    result = db.calls.update_one(
+        # Guard on the previous value so concurrent re-submits are counted once
+        {"_id": call_id, rating_field: previous_rating},
+        {
+            "$set": {
+                rating_field: rate_data.rating,
+                feedback_field: rate_data.feedback
             }
-        )
+        }
+    )
+    
+    # Fold into the rated user's running peer-rating aggregate
+    if result.modified_count:
+        from backend.app.services.peer_ratings import peer_ratings
+        peer_ratings.record(rated_user_id, rate_data.rating, previous_rating=previous_rating)
+        
+        from backend.app.services.leaderboard_feed import leaderboard_feed
+        leaderboard_feed.notify_score_change()
     
     return {"message": "Rating submitted successfully"}
 
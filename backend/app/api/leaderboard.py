@@ -1,3 +1,5 @@
+import asyncio
+
 from fastapi import APIRouter, Depends, HTTPException
 from bson import ObjectId
 from datetime import datetime, timedelta
@@ -7,37 +9,87 @@ from backend.app.auth import AuthHandler
 from backend.app.database import Database
 from backend.app.models import UserInDB
 from backend.app.schemas import LeaderboardEntry
+from backend.app.services.score_ledger import score_ledger, WINDOWS
+from backend.app.services.stats_cache import StaleWhileRevalidateCache
+from backend.app.services.skill_scores import skill_scores, SKILLS
+from backend.app.services.achievements import achievements_engine
+from backend.app.services.peer_ratings import peer_ratings
+from backend.app.services.percentiles import percentile_service
+from backend.app.services.leagues import leagues
+from backend.app.services.active_users import active_users
+from backend.app.core.config import settings
 
 router = APIRouter()
 
-@router.get("/top", response_model=List[LeaderboardEntry])
-async def get_top_leaderboard(
-    current_user: UserInDB = Depends(AuthHandler.get_current_user),
+def fetch_top_leaderboard(
     limit: int = 10,
-    timeframe: str = "all",  # all, weekly, monthly, daily
-    skill_filter: Optional[str] = None  # grammar, fluency, vocabulary
-):
-    """Get top users leaderboard with filters"""
+    timeframe: str = "all",
+    skill_filter: Optional[str] = None
+) -> List[LeaderboardEntry]:
+    """Build the top leaderboard (shared by /top and the WebSocket leaderboard feed)"""
     db = Database.get_db()
     
     # Filter out test email addresses
-    test_emails = ["john@example.com", "jane@example.com", "bob@example.com"]
-    
-    # Time filter
-    time_filter = {}
-    now = datetime.utcnow()
-    
-    if timeframe == "daily":
-        time_filter = {"updated_at": {"$gte": now - timedelta(days=1)}}
-    elif timeframe == "weekly":
-        time_filter = {"updated_at": {"$gte": now - timedelta(days=7)}}
-    elif timeframe == "monthly":
-        time_filter = {"updated_at": {"$gte": now - timedelta(days=30)}}
-    
-    # Base pipeline - exclude test emails
+    test_emails = settings.get_test_account_emails()
+    
+    # Timeframes rank by points earned in the window, served from the score ledger
+    if timeframe in WINDOWS:
+        return [
+            LeaderboardEntry(
+                rank=rank,
+                user_id=str(user_data["_id"]),
+                name=user_data["name"],
+                avatar_url=user_data.get("avatar_url"),
+                ai_score=user_data.get("ai_score", 0.0),
+                total_calls=user_data.get("total_calls", 0),
+                avg_fluency_score=user_data.get("avg_fluency_score", 0),
+                window_score=user_data["window_score"]
+            )
+            for rank, user_data in enumerate(
+                score_ledger.top(timeframe, limit, exclude_emails=test_emails), 1
+            )
+        ]
+    
+    # Skill rankings are a single indexed read of the precomputed skill aggregates
+    if skill_filter in SKILLS:
+        return [
+            LeaderboardEntry(
+                rank=rank,
+                user_id=str(user_data["_id"]),
+                name=user_data["name"],
+                avatar_url=user_data.get("avatar_url"),
+                ai_score=user_data.get("ai_score", 0.0),
+                total_calls=user_data.get("total_calls", 0),
+                avg_fluency_score=user_data.get("avg_fluency_score", 0),
+                skill_score=user_data["skill_score"]
+            )
+            for rank, user_data in enumerate(
+                skill_scores.top(skill_filter, limit, exclude_emails=test_emails), 1
+            )
+        ]
+    
+    # Peer-rated ranking reads the smoothed peer_rating index on users
+    if skill_filter == "peer_rating":
+        return [
+            LeaderboardEntry(
+                rank=rank,
+                user_id=str(user_data["_id"]),
+                name=user_data["name"],
+                avatar_url=user_data.get("avatar_url"),
+                ai_score=user_data.get("ai_score", 0.0),
+                total_calls=user_data.get("total_calls", 0),
+                avg_fluency_score=user_data.get("avg_fluency_score", 0),
+                peer_rating=user_data["peer_rating"],
+                peer_rating_count=user_data["peer_rating_count"]
+            )
+            for rank, user_data in enumerate(
+                peer_ratings.top(limit, exclude_emails=test_emails), 1
+            )
+        ]
+    
+    # Base pipeline - ranked users only (partial index on rankable, ai_score)
     pipeline = [
-        {"$match": {"ai_score": {"$gt": 0}, "email": {"$nin": test_emails}}},
-        {"$match": time_filter} if time_filter else {"$match": {}},
+        {"$match": {"rankable": True}},
         {"$sort": {"ai_score": -1}},
         {"$limit": limit},
         {"$project": {
@@ -52,30 +104,6 @@ async def get_top_leaderboard(
         }}
     ]
     
-    # Apply skill filter
-    if skill_filter:
-        if skill_filter == "grammar":
-            # Get users with grammar analysis data
-            analysis_pipeline = [
-                {"$match": {"grammar_errors": {"$exists": True}}},
-                {"$group": {
-                    "_id": "$user_id",
-                    "grammar_score": {"$avg": {"$subtract": [100, {"$multiply": ["$grammar_errors", 5]}]}}
-                }},
-                {"$sort": {"grammar_score": -1}},
-                {"$limit": limit}
-            ]
-            
-            analysis_results = list(db.ai_analysis.aggregate(analysis_pipeline))
-            user_ids = [ObjectId(r["_id"]) for r in analysis_results]
-            
-            pipeline.insert(0, {"$match": {"_id": {"$in": user_ids}}})
-            
-        elif skill_filter == "fluency":
-            pipeline[2] = {"$sort": {"avg_fluency_score": -1}}
-        elif skill_filter == "activity":
-            pipeline[2] = {"$sort": {"total_calls": -1}}
-    
     leaderboard = []
     cursor = db.users.aggregate(pipeline)
     
@@ -92,6 +120,16 @@ async def get_top_leaderboard(
     
     return leaderboard
 
+@router.get("/top", response_model=List[LeaderboardEntry])
+async def get_top_leaderboard(
+    current_user: UserInDB = Depends(AuthHandler.get_current_user),
+    limit: int = 10,
+    timeframe: str = "all",  # all, weekly, monthly, daily
+    skill_filter: Optional[str] = None  # grammar, fluency, vocabulary, activity, peer_rating
+):
+    """Get top users leaderboard with filters"""
+    return fetch_top_leaderboard(limit, timeframe, skill_filter)
+
 @router.get("/my-rank")
 async def get_my_rank(
     current_user: UserInDB = Depends(AuthHandler.get_current_user),
@@ -100,62 +138,119 @@ async def get_my_rank(
     """Get current user's rank with detailed position"""
     db = Database.get_db()
     
-    # Time filter
-    time_filter = {}
-    now = datetime.utcnow()
-    
-    if timeframe == "daily":
-        time_filter = {"updated_at": {"$gte": now - timedelta(days=1)}}
-    elif timeframe == "weekly":
-        time_filter = {"updated_at": {"$gte": now - timedelta(days=7)}}
-    elif timeframe == "monthly":
-        time_filter = {"updated_at": {"$gte": now - timedelta(days=30)}}
-    
-    # Get all users sorted by AI score with time filter
-    query = {"ai_score": {"$gt": 0}}
-    if time_filter:
-        query.update(time_filter)
-    
-    all_users = list(db.users.find(
-        query,
-        {"_id": 1, "ai_score": 1, "name": 1}
-    ).sort("ai_score", -1))
-    
-    # Find user's position
-    user_rank = 1
-    for idx, user in enumerate(all_users, 1):
-        if str(user["_id"]) == str(current_user.id):
-            user_rank = idx
-            break
-    
-    # Calculate percentiles
-    total_users = len(all_users)
+    if timeframe in WINDOWS:
+        position = score_ledger.rank(current_user.id, timeframe)
+        user_rank = position["rank"]
+        total_users = position["total"]
+        percentile = ((total_users - user_rank) / total_users * 100) if total_users > 0 else 0
+        
+        window_docs = position["above"] + [{"_id": current_user.id, timeframe: position["score"]}] + position["below"]
+        names = {
+            user["_id"]: user.get("name")
+            for user in db.users.find({"_id": {"$in": [doc["_id"] for doc in window_docs]}}, {"name": 1})
+        }
+        first_rank = user_rank - len(position["above"])
+        context_users = [
+            {
+                "rank": first_rank + offset,
+                "name": names.get(doc["_id"], "User"),
+                "ai_score": round(doc.get(timeframe, 0), 2),
+                "is_me": str(doc["_id"]) == str(current_user.id)
+            }
+            for offset, doc in enumerate(window_docs)
+        ]
+        
+        return {
+            "rank": user_rank,
+            "total_users": total_users,
+            "percentile": round(max(percentile, 0), 2),
+            "ai_score": current_user.ai_score,
+            "window_score": position["score"],
+            "context": context_users,
+            "timeframe": timeframe
+        }
+    
+    # Rank, percentile and context all come from the rankable_ai_score index
+    my_score = current_user.ai_score
+    user_rank = db.users.count_documents({"rankable": True, "ai_score": {"$gt": my_score}}) + 1
+    total_users = db.users.count_documents({"rankable": True})
     percentile = ((total_users - user_rank) / total_users * 100) if total_users > 0 else 0
     
     # Get users above and below
     context_size = 2
-    start_idx = max(0, user_rank - context_size - 1)
-    end_idx = min(total_users, user_rank + context_size)
-    
-    context_users = []
-    for i in range(start_idx, end_idx):
-        if i < len(all_users):
-            context_users.append({
-                "rank": i + 1,
-                "name": all_users[i]["name"],
-                "ai_score": all_users[i]["ai_score"],
-                "is_me": str(all_users[i]["_id"]) == str(current_user.id)
-            })
+    fields = {"_id": 1, "ai_score": 1, "name": 1}
+    above = list(db.users.find(
+        {"rankable": True, "ai_score": {"$gt": my_score}}, fields
+    ).sort("ai_score", 1).limit(context_size))[::-1]
+    below = list(db.users.find(
+        {"rankable": True, "ai_score": {"$lte": my_score}, "_id": {"$ne": current_user.id}}, fields
+    ).sort("ai_score", -1).limit(context_size))
+    
+    window_docs = above + [{"_id": current_user.id, "ai_score": my_score, "name": current_user.name}] + below
+    first_rank = user_rank - len(above)
+    context_users = [
+        {
+            "rank": first_rank + offset,
+            "name": doc.get("name", "User"),
+            "ai_score": doc["ai_score"],
+            "is_me": str(doc["_id"]) == str(current_user.id)
+        }
+        for offset, doc in enumerate(window_docs)
+    ]
     
     return {
         "rank": user_rank,
         "total_users": total_users,
-        "percentile": round(percentile, 2),
-        "ai_score": current_user.ai_score,
+        "percentile": round(max(percentile, 0), 2),
+        "ai_score": my_score,
         "context": context_users,
         "timeframe": timeframe
     }
 
+@router.get("/percentiles/{user_id}")
+async def get_user_percentiles(
+    user_id: str,
+    current_user: UserInDB = Depends(AuthHandler.get_current_user)
+):
+    """Approximate percentiles of a user's metrics across the platform"""
+    db = Database.get_db()
+    
+    try:
+        user = db.users.find_one({"_id": ObjectId(user_id)})
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid user ID")
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    # Exact for ai_score: two counts on the rankable_ai_score index
+    ai_score = user.get("ai_score", 0.0)
+    ranked = db.users.count_documents({"rankable": True})
+    at_or_below = db.users.count_documents({"rankable": True, "ai_score": {"$lte": ai_score}})
+    percentiles = {
+        "ai_score": {
+            "value": ai_score,
+            "percentile": round(at_or_below / ranked * 100, 2) if ranked else 0.0,
+            "error_bound": 0.0,
+            "sample_size": ranked
+        },
+        "fluency": percentile_service.percentile("avg_fluency", user.get("avg_fluency_score", 0.0))
+    }
+    
+    # The sketches hold per-user averages; look up the same averages here
+    skill_doc = skill_scores.get(user["_id"])
+    if skill_doc and skill_doc.get("wpm") is not None:
+        percentiles["wpm"] = percentile_service.percentile("avg_wpm", skill_doc["wpm"])
+    
+    if user.get("total_calls", 0) > 0:
+        avg_duration = user.get("total_call_duration", 0) / user["total_calls"]
+        percentiles["call_duration"] = percentile_service.percentile("avg_call_duration", round(avg_duration, 2))
+    
+    return {
+        "user_id": user_id,
+        "user_name": user.get("name"),
+        "percentiles": percentiles
+    }
+
 @router.get("/around-me", response_model=List[LeaderboardEntry])
 async def get_leaderboard_around_me(
     current_user: UserInDB = Depends(AuthHandler.get_current_user),
@@ -166,6 +261,7 @@ async def get_leaderboard_around_me(
     
     # Get user's rank
     higher_scorers = db.users.count_documents({
+        "rankable": True,
         "ai_score": {"$gt": current_user.ai_score}
     })
     user_rank = higher_scorers + 1
@@ -176,7 +272,7 @@ async def get_leaderboard_around_me(
     
     # Get users in range
     pipeline = [
-        {"$match": {"ai_score": {"$gt": 0}}},
+        {"$match": {"rankable": True}},
         {"$sort": {"ai_score": -1}},
         {"$skip": start_rank - 1},
         {"$limit": end_rank - start_rank + 1},
@@ -206,123 +302,54 @@ async def get_leaderboard_around_me(
     
     return leaderboard
 
+@router.get("/league")
+async def get_my_league(
+    current_user: UserInDB = Depends(AuthHandler.get_current_user)
+):
+    """Get current user's weekly league cohort standings"""
+    return leagues.standings(current_user.id)
+
+def _active_users_report(days: int) -> dict:
+    return {
+        **active_users.summary(),
+        "series": active_users.daily_series(days)
+    }
+
+@router.get("/active-users")
+async def get_active_users(
+    days: int = 30,
+    current_user: UserInDB = Depends(AuthHandler.get_current_user)
+):
+    """DAU/WAU/MAU and a daily active-user series (HyperLogLog estimates)"""
+    days = max(1, min(days, 90))
+    # Reads up to `days` sketches from Mongo; keep it off the event loop
+    return await asyncio.to_thread(_active_users_report, days)
+
 @router.get("/achievements/{user_id}")
 async def get_user_achievements(
     user_id: str,
     current_user: UserInDB = Depends(AuthHandler.get_current_user)
 ):
     """Get user's achievements and badges"""
-    db = Database.get_db()
-    
     try:
         target_user_id = ObjectId(user_id)
     except:
         raise HTTPException(status_code=400, detail="Invalid user ID")
     
-    # Get user data
-    user_data = db.users.find_one({"_id": target_user_id})
-    if not user_data:
+    # Achievements are unlocked incrementally; reading them is one document fetch
+    achievements_doc = achievements_engine.get(target_user_id)
+    if not achievements_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Calculate achievements
-    achievements = []
-    
-    # Call count achievements
-    total_calls = user_data.get("total_calls", 0)
-    if total_calls >= 1:
-        achievements.append({
-            "name": "First Call",
-            "description": "Completed your first practice call",
-            "icon": "🎤",
-            "unlocked": True,
-            "date": user_data.get("created_at")
-        })
-    if total_calls >= 5:
-        achievements.append({
-            "name": "Practice Enthusiast",
-            "description": "Completed 5 practice calls",
-            "icon": "🔥",
-            "unlocked": True
-        })
-    if total_calls >= 25:
-        achievements.append({
-            "name": "Conversation Master",
-            "description": "Completed 25 practice calls",
-            "icon": "👑",
-            "unlocked": True if total_calls >= 25 else False
-        })
-    
-    # Score achievements
-    ai_score = user_data.get("ai_score", 0)
-    if ai_score >= 70:
-        achievements.append({
-            "name": "Good Communicator",
-            "description": "Reached AI score of 70+",
-            "icon": "⭐",
-            "unlocked": True
-        })
-    if ai_score >= 85:
-        achievements.append({
-            "name": "Excellent Speaker",
-            "description": "Reached AI score of 85+",
-            "icon": "🌟",
-            "unlocked": True if ai_score >= 85 else False
-        })
-    
-    # Duration achievements
-    total_duration = user_data.get("total_call_duration", 0)
-    if total_duration >= 3600:  # 1 hour
-        achievements.append({
-            "name": "Hour of Practice",
-            "description": "Completed 1 hour of practice calls",
-            "icon": "⏱️",
-            "unlocked": True
-        })
-    
-    # Streak achievement (simplified - would need daily call tracking)
-    # Get recent calls for streak calculation
-    recent_calls = list(db.calls.find({
-        "$or": [
-            {"caller_id": target_user_id},
-            {"receiver_id": target_user_id}
-        ],
-        "status": "completed",
-        "created_at": {"$gte": datetime.utcnow() - timedelta(days=7)}
-    }).sort("created_at", -1))
-    
-    if len(recent_calls) >= 3:
-        achievements.append({
-            "name": "Consistent Learner",
-            "description": "Practiced 3 days in a row",
-            "icon": "📅",
-            "unlocked": True
-        })
-    
-    return {
-        "user_id": user_id,
-        "user_name": user_data.get("name"),
-        "total_achievements": len(achievements),
-        "achievements": achievements,
-        "progress": {
-            "calls": total_calls,
-            "score": ai_score,
-            "duration": total_duration,
-            "streak": len(recent_calls)
-        }
-    }
+    return achievements_engine.summary(achievements_doc)
 
-@router.get("/global-stats")
-async def get_global_statistics(
-    current_user: UserInDB = Depends(AuthHandler.get_current_user)
-):
-    """Get global platform statistics"""
+def compute_global_statistics() -> dict:
+    """Compute global platform statistics (runs in the stats cache refresher)"""
     db = Database.get_db()
     
     # Total users count
     total_users = db.users.count_documents({})
-    active_users = db.users.count_documents({
-        "last_seen": {"$gte": datetime.utcnow() - timedelta(days=7)}
-    })
+    activity = active_users.summary()
     
     # Total calls statistics
     calls_stats = list(db.calls.aggregate([
@@ -337,7 +364,7 @@ async def get_global_statistics(
     
     # Average AI score
     avg_score_result = list(db.users.aggregate([
-        {"$match": {"ai_score": {"$gt": 0}}},
+        {"$match": {"rankable": True}},
         {"$group": {
             "_id": None,
             "avg_score": {"$avg": "$ai_score"},
@@ -348,7 +375,7 @@ async def get_global_statistics(
     
     # Top 3 users
     top_users = list(db.users.find(
-        {"ai_score": {"$gt": 0}},
+        {"rankable": True},
         {"_id": 1, "name": 1, "ai_score": 1, "avatar_url": 1}
     ).sort("ai_score", -1).limit(3))
     
@@ -400,7 +427,8 @@ async def get_global_statistics(
     
     return {
         "total_users": total_users,
-        "active_users": active_users,
+        "active_users": activity["wau"],
+        "activity": activity,
         "calls_stats": calls_stats[0] if calls_stats else {},
         "score_stats": avg_score_result[0] if avg_score_result else {},
         "top_users": [
@@ -414,4 +442,22 @@ async def get_global_statistics(
         ],
         "most_active": most_active,
         "updated_at": datetime.utcnow().isoformat()
-    }
\ No newline at end of file
+    }
+
+# Served stale-while-revalidate; the refresher is started in the app lifespan
+global_stats_cache = StaleWhileRevalidateCache(
+    "global-stats",
+    compute_global_statistics,
+    refresh_seconds=settings.global_stats_refresh_seconds
+)
+
+@router.get("/global-stats")
+async def get_global_statistics(
+    current_user: UserInDB = Depends(AuthHandler.get_current_user)
+):
+    """Get global platform statistics from the background-refreshed cache"""
+    cached = await global_stats_cache.get()
+    return {
+        **cached["value"],
+        "cache_age_seconds": cached["age_seconds"]
+    }
@@ -6,10 +6,14 @@ from fastapi.responses import RedirectResponse, HTMLResponse
 import secrets
 import json
 
+from backend.app.core.config import settings
+from backend.app.services.ephemeral_store import create_store
+
 router = APIRouter()
 
-# Temporary storage for OAuth state (in production, use Redis or database)
-oauth_states = {}
+# OAuth state values expire with the login attempt (Redis-backed when configured).
+# Nothing reads or writes it until the Google/GitHub flows below are implemented.
+oauth_states = create_store("oauth_states", settings.oauth_state_ttl_seconds, max_entries=10000)
 
 @router.get("/auth/google/login")
 async def google_login():
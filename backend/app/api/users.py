@@ -1,25 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from bson import ObjectId
 import shutil
 import os
 
-from backend.app.schemas import UserRegisterRequest, UserLoginRequest, UserResponse
+from backend.app.schemas import UserRegisterRequest, UserLoginRequest, UserResponse, LeaderboardEntry
 from backend.app.models import UserInDB
 from backend.app.auth import AuthHandler
 from backend.app.database import Database
 from backend.app.core.config import settings
+from backend.app.utils import is_rankable
+from backend.app.services.presence import presence
+from backend.app.services.percentiles import percentile_service
 
 router = APIRouter()
 
-# Helper function to calculate user rank
-async def calculate_user_rank(user_id: str) -> int:
+# Helper functions to calculate user rank (indexed count over ranked users)
+def rank_for_user(user: dict) -> Optional[int]:
+    if not user or not user.get("rankable"):
+        return None
     db = Database.get_db()
-    test_emails = ["john@example.com", "jane@example.com", "bob@example.com"]
-    all_users = list(db.users.find({"email": {"$nin": test_emails}}).sort("ai_score", -1))
-    rank = next((i + 1 for i, u in enumerate(all_users) if str(u["_id"]) == user_id), None)
-    return rank
+    return db.users.count_documents({"rankable": True, "ai_score": {"$gt": user["ai_score"]}}) + 1
+
+async def calculate_user_rank(user_id: str) -> Optional[int]:
+    db = Database.get_db()
+    user = db.users.find_one({"_id": ObjectId(user_id)}, {"ai_score": 1, "rankable": 1})
+    return rank_for_user(user)
 
 @router.post("/register", response_model=UserResponse)
 async def register(user_data: UserRegisterRequest):
@@ -44,6 +51,7 @@ async def register(user_data: UserRegisterRequest):
         "avatar_url": None,
         "is_online": False,
         "ai_score": 0.0,
+        "rankable": False,
         "total_calls": 0,
         "total_call_duration": 0,
         "avg_fluency_score": 0.0,
@@ -100,15 +108,14 @@ async def login(user_data: UserLoginRequest):
     # Create access token
     token = AuthHandler.create_access_token(str(user["_id"]))
     
-    # Update online status
+    # Update last seen; online status comes from the presence service once the WebSocket connects
     db.users.update_one(
         {"_id": user["_id"]},
-        {"$set": {"is_online": True, "last_seen": datetime.utcnow()}}
+        {"$set": {"last_seen": datetime.utcnow()}}
     )
     
     # Calculate rank
-    all_users = list(db.users.find().sort("ai_score", -1))
-    rank = next((i + 1 for i, u in enumerate(all_users) if str(u["_id"]) == str(user["_id"])), None)
+    rank = rank_for_user(user)
     
     return {
         "access_token": token,
@@ -136,15 +143,14 @@ async def get_current_user_info(
     db = Database.get_db()
     
     # Calculate rank
-    all_users = list(db.users.find().sort("ai_score", -1))
-    rank = next((i + 1 for i, u in enumerate(all_users) if str(u["_id"]) == str(current_user.id)), None)
+    rank = rank_for_user({"ai_score": current_user.ai_score, "rankable": current_user.rankable})
     
     return UserResponse(
         id=str(current_user.id),
         email=current_user.email,
         name=current_user.name,
         avatar_url=current_user.avatar_url,
-        is_online=current_user.is_online,
+        is_online=await presence.is_online(current_user.id),
         ai_score=current_user.ai_score,
         total_calls=current_user.total_calls,
         total_call_duration=current_user.total_call_duration,
@@ -208,6 +214,16 @@ async def update_profile(
         {"$set": update_data}
     )
     
+    if "name" in update_data:
+        from backend.app.services.achievements import achievements_engine
+        achievements_engine.on_name_changed(current_user.id, update_data["name"])
+        
+        from backend.app.services.friends_leaderboard import friends_leaderboard
+        friends_leaderboard.invalidate_member(current_user.id)
+    
+    from backend.app.services.directory import directory
+    directory.invalidate_user(current_user.id)
+    
     # Get updated user
     updated_user = db.users.find_one({"_id": current_user.id})
     user = UserInDB(**updated_user)
@@ -220,7 +236,7 @@ async def update_profile(
         email=user.email,
         name=user.name,
         avatar_url=user.avatar_url,
-        is_online=user.is_online,
+        is_online=await presence.is_online(user.id),
         ai_score=user.ai_score,
         total_calls=user.total_calls,
         total_call_duration=user.total_call_duration,
@@ -240,19 +256,25 @@ async def update_user_score(
     db = Database.get_db()
     
     update_data = {"updated_at": datetime.utcnow()}
+    user_data = db.users.find_one({"_id": current_user.id})
     
     if ai_score is not None:
         update_data["ai_score"] = ai_score
+        update_data["rankable"] = is_rankable(current_user.email, ai_score)
     
     if fluency_score is not None:
         # Calculate new average fluency score
-        user_data = db.users.find_one({"_id": current_user.id})
         current_avg = user_data.get("avg_fluency_score", 0)
         total_calls = user_data.get("total_calls", 1)
         
         # Weighted average update
         new_avg = (current_avg * (total_calls - 1) + fluency_score) / total_calls
         update_data["avg_fluency_score"] = round(new_avg, 2)
+        
+        from backend.app.services.skill_scores import skill_scores
+        skill_scores.record(current_user.id, fluency=fluency_score)
+        
+        percentile_service.observe("avg_fluency", update_data["avg_fluency_score"])
     
     if weakness:
         # Add weakness if not already present
@@ -268,6 +290,19 @@ async def update_user_score(
             {"$set": update_data}
         )
     
+    # Windowed leaderboards and leagues count points earned in calls (see score_ledger),
+    # not rewrites of the lifetime score
+    if ai_score is not None:
+        from backend.app.services.achievements import achievements_engine
+        achievements_engine.on_score_changed(current_user.id, ai_score)
+    
+    if ai_score is not None or fluency_score is not None:
+        from backend.app.services.leaderboard_feed import leaderboard_feed
+        leaderboard_feed.notify_score_change()
+        
+        from backend.app.services.friends_leaderboard import friends_leaderboard
+        friends_leaderboard.invalidate_member(current_user.id)
+    
     return {"message": "User score updated successfully"}
 
 @router.get("/stats")
@@ -349,31 +384,28 @@ async def get_all_users(
     """Get all registered users excluding test accounts and current user"""
     db = Database.get_db()
     
-    # Get WebSocket manager to check real online status
-    from backend.app.api.websocket import manager
-    
     # Filter out test email addresses and current user
-    test_emails = ["john@example.com", "jane@example.com", "bob@example.com"]
-    
-    users = db.users.find({
+    users = list(db.users.find({
         "_id": {"$ne": current_user.id},
-        "email": {"$nin": test_emails}
-    })
+        "email": {"$nin": settings.get_test_account_emails()}
+    }))
+    
+    # Online status from the presence service, checked for the whole page at once
+    online_user_ids = await presence.online(user["_id"] for user in users)
     
     result = []
     for user in users:
         user_id_str = str(user["_id"])
         
-        # Check ACTUAL online status from WebSocket connections
-        is_actually_online = user_id_str in manager.active_connections
+        is_actually_online = user_id_str in online_user_ids
         
-        rank = await calculate_user_rank(user_id_str)
+        rank = rank_for_user(user)
         result.append(UserResponse(
             id=user_id_str,
             email=user["email"],
             name=user["name"],
             avatar_url=user.get("avatar_url"),
-            is_online=is_actually_online,  # Use WebSocket status, not DB status
+            is_online=is_actually_online,
             ai_score=user.get("ai_score", 0.0),
             total_calls=user.get("total_calls", 0),
             total_call_duration=user.get("total_call_duration", 0),
@@ -388,13 +420,12 @@ async def get_all_users(
 async def logout(
     current_user: UserInDB = Depends(AuthHandler.get_current_user)
 ):
-    """Logout user and update online status"""
+    """Logout user; they go offline when their last WebSocket closes"""
     db = Database.get_db()
     
-    # Update online status
     db.users.update_one(
         {"_id": current_user.id},
-        {"$set": {"is_online": False, "last_seen": datetime.utcnow()}}
+        {"$set": {"last_seen": datetime.utcnow()}}
     )
     
     return {"message": "Logged out successfully"}
@@ -445,14 +476,14 @@ async def send_friend_request(
     
     db.friend_requests.insert_one(friend_request)
     
-    # Send WebSocket notification to recipient
+    # Notify the recipient now, or on their next connect if they're offline
     from backend.app.api.websocket import manager
-    await manager.send_personal_message({
+    await manager.notify({
         "type": "friend_request",
         "from_user_id": str(current_user.id),
         "sender_name": current_user.name,
         "timestamp": datetime.utcnow().isoformat()
-    }, user_id)
+    }, user_id, ttl=settings.notification_ttl_days * 86400)
     
     return {"message": "Friend request sent successfully"}
 
@@ -524,6 +555,14 @@ async def accept_friend_request(
         {"$set": {"status": "accepted", "updated_at": datetime.utcnow()}}
     )
     
+    from backend.app.services.friends_leaderboard import friends_leaderboard
+    friends_leaderboard.invalidate_viewer(current_user.id)
+    friends_leaderboard.invalidate_viewer(request["from_user_id"])
+    
+    # Both sides now get each other's online/offline changes
+    await presence.watch(str(current_user.id), [request["from_user_id"]])
+    await presence.watch(str(request["from_user_id"]), [current_user.id])
+    
     return {"message": "Friend request accepted"}
 
 @router.post("/friend-request/{request_id}/reject")
@@ -570,17 +609,18 @@ async def get_friends(
         return []
     
     # Get friend details
-    friends = db.users.find({"_id": {"$in": friend_ids}})
+    friends = list(db.users.find({"_id": {"$in": friend_ids}}))
+    online_friend_ids = await presence.online(friend_ids)
     
     result = []
     for friend in friends:
-        rank = await calculate_user_rank(str(friend["_id"]))
+        rank = rank_for_user(friend)
         result.append(UserResponse(
             id=str(friend["_id"]),
             email=friend["email"],
             name=friend["name"],
             avatar_url=friend.get("avatar_url"),
-            is_online=friend.get("is_online", False),
+            is_online=str(friend["_id"]) in online_friend_ids,
             ai_score=friend.get("ai_score", 0.0),
             total_calls=friend.get("total_calls", 0),
             total_call_duration=friend.get("total_call_duration", 0),
@@ -591,6 +631,15 @@ async def get_friends(
     
     return result
 
+@router.get("/friends/leaderboard", response_model=List[LeaderboardEntry])
+async def get_friends_leaderboard(
+    current_user: UserInDB = Depends(AuthHandler.get_current_user)
+):
+    """Rank the current user and their friends by AI score"""
+    from backend.app.services.friends_leaderboard import friends_leaderboard
+    entries = friends_leaderboard.get(current_user.id, current_user.friends)
+    return [LeaderboardEntry(**entry) for entry in entries]
+
 @router.get("/find-random-partner")
 async def find_random_partner(
     current_user: UserInDB = Depends(AuthHandler.get_current_user)
@@ -598,15 +647,15 @@ async def find_random_partner(
     """Find a random online partner for calling"""
     db = Database.get_db()
     
-    # Filter out test emails and current user, get only online users
-    test_emails = ["john@example.com", "jane@example.com", "bob@example.com"]
-    
-    # Find online users who are not the current user
+    # Find online users who are not the current user, excluding test accounts
+    online_ids = [
+        ObjectId(user_id) for user_id in await presence.online_user_ids()
+        if user_id != str(current_user.id) and ObjectId.is_valid(user_id)
+    ]
     online_users = list(db.users.find({
-        "_id": {"$ne": current_user.id},
-        "email": {"$nin": test_emails},
-        "is_online": True
-    }))
+        "_id": {"$in": online_ids},
+        "email": {"$nin": settings.get_test_account_emails()}
+    })) if online_ids else []
     
     if not online_users:
         return {"message": "No online partners available", "partner": None}
@@ -641,14 +690,14 @@ async def get_user_profile(
                 detail="User not found"
             )
         
-        rank = await calculate_user_rank(user_id)
+        rank = rank_for_user(user)
         
         return UserResponse(
             id=str(user["_id"]),
             email=user["email"],
             name=user["name"],
             avatar_url=user.get("avatar_url"),
-            is_online=user.get("is_online", False),
+            is_online=await presence.is_online(user["_id"]),
             ai_score=user.get("ai_score", 0.0),
             total_calls=user.get("total_calls", 0),
             total_call_duration=user.get("total_call_duration", 0),
@@ -1,111 +1,470 @@
 import json
 import logging
 import uuid
-from typing import Dict, Set, List
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from typing import Dict, Set, List, Optional
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
 from datetime import datetime
 import asyncio
+from contextvars import ContextVar
+
+from backend.app.auth import AuthHandler
+from backend.app.models import UserInDB
+from backend.app.services.leaderboard_feed import leaderboard_feed, SCORES_CHANNEL
+from backend.app.services.friends_leaderboard import friends_leaderboard, INVALIDATION_CHANNEL
+from backend.app.services.active_users import active_users
+from backend.app.services.message_bus import message_bus, user_channel, USER_CHANNEL_PREFIX
+from backend.app.services.outbound_queue import OutboundQueue, OutboundMetrics, EncodedMessage
+from backend.app.services.outbound_queue import message_type as queue_message_type
+from backend.app.services.ws_dispatch import MessageRegistry, MessageError, decode_frame
+from backend.app.services.directory import directory, INVALIDATION_CHANNEL as DIRECTORY_CHANNEL
+from backend.app.services.presence import presence, PRESENCE_CHANNEL
+from backend.app.services.connection_registry import Connection, ConnectionRegistry
+from backend.app.services.heartbeat import HeartbeatMonitor
+from backend.app.services.signal_batcher import SignalBatcher
+from backend.app.services.replay_buffer import ReplayBuffer
+from backend.app.services.notification_inbox import notification_inbox
+from backend.app.services.ws_codec import JSON, negotiate
+from backend.app.services.ephemeral_store import create_store
+from backend.app.core.config import settings
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Per-recipient delivery results returned by ConnectionManager.fan_out
+QUEUED = "queued"      # enqueued on a connection held by this worker
+ROUTED = "routed"      # published to the worker holding the connection
+DROPPED = "dropped"    # recipient's outbound queue shed the message
+BUFFERED = "buffered"  # recipient just disconnected from this worker; replayed if they resume
+OFFLINE = "offline"    # no worker holds a connection for the recipient
+TIMEOUT = "timeout"
+FAILED = "error"
+DELIVERED = (QUEUED, ROUTED)
+
+# Every worker subscribes; carries call membership changes:
+# {"event": "started", "call_id", "participants", "room_id"}, {"event": "left", "call_id", "user_id"},
+# {"event": "ended", "call_id"}
+CALLS_CHANNEL = "calls:changes"
+
 class ConnectionManager:
     def __init__(self):
-        # Store active connections: user_id -> WebSocket
-        self.active_connections: Dict[str, WebSocket] = {}
-        # Store pending call invitations
-        self.pending_invitations: Dict[str, dict] = {}
+        # Open connections on this worker: several per user (tabs, devices)
+        self.connections = ConnectionRegistry()
+        # Store pending call invitations (expire if never answered)
+        self.pending_invitations = create_store(
+            "pending_invitations", settings.ws_invitation_ttl_seconds, max_entries=10000
+        )
         # Store active calls: call_id -> {participants: [], room_id: str}
+        # Every worker keeps a copy, kept in step through CALLS_CHANNEL
         self.active_calls: Dict[str, dict] = {}
         # Track user status: user_id -> {"is_online": bool, "current_call": call_id or None}
-        self.user_status: Dict[str, dict] = {}
+        self.user_status = create_store(
+            "user_status", settings.ws_user_status_ttl_seconds, max_entries=50000
+        )
+        # Bounded send queue per connection (connection_id -> queue), each drained by its own writer task
+        self.outbound: Dict[str, OutboundQueue] = {}
+        self.outbound_metrics = OutboundMetrics()
+        # Last-activity timer per connection; dead connections are reaped in bulk
+        self.heartbeats = HeartbeatMonitor(
+            settings.ws_heartbeat_interval_seconds, settings.ws_heartbeat_timeout_seconds
+        )
+        # Trickle-ICE candidates are forwarded in per-pair batches
+        self.ice_batches = SignalBatcher(
+            settings.ws_ice_batch_window_ms / 1000, settings.ws_ice_batch_max, self._forward_candidates
+        )
+        # Numbered per-user message stream; a reconnecting client resumes from its last seq
+        self.replay = ReplayBuffer(settings.ws_replay_buffer_size, settings.ws_replay_linger_seconds)
 
-    async def connect(self, websocket: WebSocket, user_id: str):
-        """Accept WebSocket connection"""
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-        self.user_status[user_id] = {"is_online": True, "current_call": None}
-        logger.info(f"✅ User {user_id} connected. Total: {len(self.active_connections)}")
-        
-        # Send welcome message
-        await self.send_personal_message({
+    async def connect(self, websocket: WebSocket, user_id: str, resume: Optional[tuple] = None) -> str:
+        """Accept WebSocket connection; returns its connection id
+        
+        Clients offering the "msgpack" subprotocol get MessagePack binary
+        frames; everyone else gets JSON text frames. `resume` is the
+        (stream, last_seq) a reconnecting client last saw: the frames it
+        missed are queued right after the welcome, ahead of anything new.
+        """
+        subprotocol = negotiate(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=subprotocol)
+        connection = Connection(user_id, websocket, codec=subprotocol or JSON)
+        queue = OutboundQueue(
+            websocket,
+            user_id,
+            maxsize=settings.ws_outbound_queue_size,
+            send_timeout=settings.ws_send_timeout_seconds,
+            metrics=self.outbound_metrics,
+            on_failure=self._on_send_failure,
+            connection_id=connection.id,
+            codec=connection.codec
+        )
+        queue.start()
+        connection.queue = queue
+        self.outbound[connection.id] = queue
+        
+        stream = self.replay.open(user_id)
+        missed = self.replay.resume(user_id, *resume) if resume else None
+        if resume and missed is None:
+            # Streams live on one worker: a resume that lands elsewhere (or after the
+            # linger expired) can't be replayed, and the welcome tells the client to resync
+            logger.info(f"🔁 {user_id} asked to resume stream {resume[0]}, not available here; resync")
+        # Welcome goes to the new connection only
+        queue.put({
             "type": "welcome",
             "user_id": user_id,
+            "connection_id": connection.id,
+            "connections": self.connections.count(user_id) + 1,
             "is_online": True,
+            "stream": stream.id,
+            "last_seq": stream.last_seq,
+            "resumed": missed is not None,
+            "replayed": len(missed or ()),
             "timestamp": datetime.now().isoformat()
-        }, user_id)
+        })
+        for item in missed or ():
+            queue.put(item)
+        # Registered only now so live messages queue behind the replay
+        user_connections = self.connections.add(connection)
+        self.heartbeats.track(connection.id)
+        
+        # Another tab may already be in a call; keep its current_call
+        status = await self.user_status.update(
+            user_id, {"is_online": True}, ttl=settings.ws_user_status_ttl_seconds
+        )
+        if status is None:
+            await self.user_status.set(user_id, {"is_online": True, "current_call": None})
+        active_users.observe(user_id)
+        if user_connections == 1:
+            # Preload name and open calls so handlers don't query MongoDB
+            asyncio.create_task(directory.warm(user_id))
+            # Messages for this user published by other workers now reach this one
+            await message_bus.subscribe(user_channel(user_id))
+            await presence.set_online(user_id)
+            # Friends' online/offline changes are pushed to this user
+            asyncio.create_task(presence.watch_friends(user_id))
+        # Notifications sent while no tab was open
+        asyncio.create_task(self._deliver_inbox(user_id, connection.id))
+        logger.info(
+            f"✅ User {user_id} connected ({user_connections} connection(s)). "
+            f"Total: {len(self.connections)}"
+        )
+        return connection.id
 
-    def disconnect(self, user_id: str):
-        """Clean up when user disconnects"""
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-        
-        if user_id in self.user_status:
-            self.user_status[user_id]["is_online"] = False
-            # Notify others in same call
-            current_call = self.user_status[user_id]["current_call"]
-            if current_call and current_call in self.active_calls:
-                participants = self.active_calls[current_call]["participants"]
-                for participant in participants:
-                    if participant != user_id and participant in self.active_connections:
-                        asyncio.create_task(
-                            self.send_personal_message({
-                                "type": "user_left_call",
-                                "user_id": user_id,
-                                "call_id": current_call,
-                                "timestamp": datetime.now().isoformat()
-                            }, participant)
-                        )
-                # Remove from active call
-                if user_id in participants:
-                    participants.remove(user_id)
+    def disconnect(self, user_id: str, connection_id: str):
+        """Clean up when one of a user's connections closes"""
+        connection = self.connections.remove(connection_id)
+        if connection is None:
+            return
+        
+        queue = self.outbound.pop(connection_id, None)
+        if queue:
+            asyncio.create_task(queue.close())
+        self.heartbeats.forget(connection_id)
+        leaderboard_feed.unsubscribe(connection_id)
+        
+        remaining = self.connections.count(user_id)
+        if remaining:
+            logger.info(f"❌ User {user_id} closed a connection ({remaining} still open)")
+            return
+        
+        presence.unwatch(user_id)
+        self.replay.release(user_id)
+        asyncio.create_task(self._leave(user_id))
         
         logger.info(f"❌ User {user_id} disconnected")
 
+    async def _leave(self, user_id: str):
+        """Release the user's channel, then mark them offline and tell the rest of their call
+        
+        Skipped if the user reconnected meanwhile, here or on another worker.
+        """
+        if user_id in self.connections:
+            return
+        try:
+            await message_bus.unsubscribe(user_channel(user_id))
+        except Exception as e:
+            logger.error(f"❌ Error unsubscribing {user_id} from message bus: {e}")
+        if await message_bus.subscriber_count(user_channel(user_id)):
+            return
+        await presence.set_offline(user_id)
+        status = await self.user_status.update(
+            user_id, {"is_online": False}, ttl=settings.ws_offline_status_ttl_seconds
+        )
+        if not status:
+            return
+        
+        # Notify others in same call
+        current_call = status.get("current_call")
+        if current_call and current_call in self.active_calls:
+            # Remove from active call
+            await self._call_event({"event": "left", "call_id": current_call, "user_id": user_id})
+            participants = self.active_calls[current_call]["participants"]
+            await self.fan_out({
+                "type": "user_left_call",
+                "user_id": user_id,
+                "call_id": current_call,
+                "timestamp": datetime.now().isoformat()
+            }, participants)
+
+    async def _deliver_inbox(self, user_id: str, connection_id: str):
+        """Hand a new connection every unacknowledged notification in one frame
+        
+        Sent even when empty: clients hold back acks until they have it, so
+        an ack for a live notification can't remove one still in the batch.
+        """
+        try:
+            notifications = await notification_inbox.pending(user_id)
+        except Exception as e:
+            logger.error(f"❌ Error loading notification inbox of {user_id}: {e}")
+            return
+        self.send_to_connection({
+            "type": "inbox",
+            "notifications": notifications,
+            "timestamp": datetime.now().isoformat()
+        }, connection_id)
+
+    def start_heartbeats(self):
+        self.heartbeats.start(self._probe, self._reap)
+
+    async def start(self):
+        """Follow call changes made on other workers and start heartbeats"""
+        await message_bus.subscribe(CALLS_CHANNEL)
+        self.start_heartbeats()
+
+    def _apply_call_event(self, event: dict):
+        call_id = event.get("call_id")
+        kind = event.get("event")
+        if kind == "started":
+            self.active_calls[call_id] = {
+                "participants": list(event["participants"]),
+                "room_id": event.get("room_id"),
+                "started_at": event.get("started_at") or datetime.now().isoformat(),
+                "status": "active"
+            }
+        elif kind == "left":
+            call = self.active_calls.get(call_id)
+            if call and event.get("user_id") in call["participants"]:
+                call["participants"].remove(event["user_id"])
+        elif kind == "ended":
+            self.active_calls.pop(call_id, None)
+            self.ice_batches.discard_call(call_id)
+            # The cached entry still says active; reload from the database if asked again.
+            # Every worker applies this event, so there is no need to announce it
+            directory.invalidate_call(call_id, announce=False)
+
+    async def _call_event(self, event: dict):
+        """Apply a call membership change here and tell the other workers"""
+        self._apply_call_event(event)
+        try:
+            await message_bus.publish(CALLS_CHANNEL, event, exclude_self=True)
+        except Exception as e:
+            logger.error(f"❌ Failed to publish {event.get('event')} for call {event.get('call_id')}: {e}")
+
+    async def forget_call(self, call_id: str):
+        """A call was completed outside the WebSocket flow: drop it on every worker"""
+        await self._call_event({"event": "ended", "call_id": call_id})
+
+    async def ensure_active_call(self, call_id: str) -> bool:
+        """Add a call to active_calls from the directory if this worker hasn't seen it"""
+        if not call_id:
+            return False
+        if call_id in self.active_calls:
+            return True
+        call_data = await directory.get_call(call_id)
+        if not call_data or call_data.get("status") == "completed":
+            logger.warning(f"⚠️ Could not add call {call_id} to active_calls")
+            return False
+        self.active_calls[call_id] = {
+            "participants": list(call_data["participants"]),
+            "room_id": call_data["room_id"],
+            "started_at": datetime.now().isoformat(),
+            "status": "active"
+        }
+        logger.info(f"✅ Added call {call_id} to active calls")
+        return True
+
+    async def _probe(self, connection_ids: List[str]):
+        """Ask idle connections to prove they are alive (any frame back will do)"""
+        probe = EncodedMessage.encode({"type": "heartbeat"})
+        for connection_id in connection_ids:
+            self.send_to_connection(probe, connection_id)
+
+    async def _reap(self, connection_ids: List[str]):
+        """Drop connections that ignored a probe, then close their sockets together"""
+        websockets = []
+        for connection_id in connection_ids:
+            connection = self.connections.get(connection_id)
+            if connection is None:
+                continue
+            self.disconnect(connection.user_id, connection_id)
+            websockets.append(connection.websocket)
+        
+        async def close(websocket):
+            try:
+                await asyncio.wait_for(websocket.close(code=1001), settings.ws_send_timeout_seconds)
+            except Exception:
+                pass
+        
+        await asyncio.gather(*(close(websocket) for websocket in websockets))
+
+    def send_to_connection(self, message, connection_id: str) -> bool:
+        """Queue a message for one connection held by this worker (replies, welcome)"""
+        queue = self.outbound.get(connection_id)
+        return queue is not None and queue.put(message)
+
+    def _deliver_local(self, message, user_id: str) -> bool:
+        """Queue a message (dict or EncodedMessage) on every connection the user has here
+        
+        The message is numbered in the user's replay stream and serialized
+        at most once; every connection queues the same frame, with the seq
+        spliced in as it is written.
+        """
+        user_connections = self.connections.for_user(user_id)
+        if not user_connections:
+            return False
+        message = self.replay.append(user_id, message) or message
+        delivered = False
+        for connection in user_connections:
+            if connection.queue.put(message):
+                delivered = True
+            else:
+                logger.debug(f"🗑️ Dropped {queue_message_type(message)} for {user_id}/{connection.id} (queue full)")
+        return delivered
+
+    async def _on_send_failure(self, queue: OutboundQueue, reason: str):
+        """Writer task callback: drop a connection that errored or fell too far behind"""
+        logger.error(f"❌ Error sending to {queue.user_id}/{queue.connection_id}: {reason}")
+        self.disconnect(queue.user_id, queue.connection_id)
+        try:
+            await queue.websocket.close(code=1011)
+        except Exception:
+            pass
+
+    async def handle_bus_message(self, channel: str, message: dict):
+        """Message bus callback: deliver a message published by another worker"""
+        if channel.startswith(USER_CHANNEL_PREFIX):
+            self._deliver_local(message, channel[len(USER_CHANNEL_PREFIX):])
+        elif channel == PRESENCE_CHANNEL:
+            presence.handle_change(message)
+        elif channel == CALLS_CHANNEL:
+            self._apply_call_event(message)
+        elif channel == SCORES_CHANNEL:
+            leaderboard_feed.handle_change(message)
+        elif channel == INVALIDATION_CHANNEL:
+            friends_leaderboard.handle_invalidation(message)
+        elif channel == DIRECTORY_CHANNEL:
+            directory.handle_invalidation(message)
+
+    async def _send(self, message: dict, user_id: str, encoded: EncodedMessage = None) -> str:
+        """Deliver to every connection of one user, on this worker and any other
+        
+        Returns a delivery result. Local connections are served directly;
+        the message is also published (skipping this worker) in case the
+        user has tabs or devices connected elsewhere.
+        """
+        local = user_id in self.connections
+        delivered = local and self._deliver_local(encoded or message, user_id)
+        # Lost the socket moments ago: keep the message for when the client resumes
+        buffered = not local and self.replay.append(user_id, encoded or message) is not None
+        
+        try:
+            routed = await message_bus.publish(
+                user_channel(user_id), message, encoded.text if encoded else None, exclude_self=local
+            )
+        except Exception as e:
+            logger.error(f"❌ Error publishing to {user_id}: {e}")
+            routed = 0
+            if not local:
+                return FAILED
+        
+        if delivered:
+            return QUEUED
+        if routed:
+            logger.debug(f"📤 Routed {message.get('type')} to {user_id} via message bus")
+            return ROUTED
+        if local:
+            return DROPPED
+        if buffered:
+            return BUFFERED
+        logger.warning(f"⚠️ User {user_id} not connected")
+        return OFFLINE
+
     async def send_personal_message(self, message: dict, user_id: str):
-        """Send message to specific user"""
-        if user_id in self.active_connections:
+        """Send message to every connection of a user, on this worker or any other"""
+        return await self._send(message, user_id) in DELIVERED
+
+    async def fan_out(self, message: dict, recipients, timeout: float = None) -> Dict[str, str]:
+        """Send one message to many users concurrently
+        
+        The payload is serialized once and shared by every recipient. Each
+        recipient gets its own timeout; the result maps user id -> delivery
+        result (queued/routed/dropped/buffered/offline/timeout/error).
+        """
+        recipients = list(dict.fromkeys(recipients))
+        if not recipients:
+            return {}
+        encoded = EncodedMessage.encode(message)
+        timeout = timeout if timeout is not None else settings.ws_fanout_timeout_seconds
+        
+        async def deliver(user_id: str) -> str:
             try:
-                await self.active_connections[user_id].send_json(message)
-                logger.debug(f"📤 Sent {message.get('type')} to {user_id}")
-                return True
+                return await asyncio.wait_for(self._send(message, user_id, encoded), timeout)
+            except asyncio.TimeoutError:
+                return TIMEOUT
             except Exception as e:
-                logger.error(f"❌ Error sending to {user_id}: {e}")
-                self.disconnect(user_id)
-                return False
-        logger.warning(f"⚠️ User {user_id} not connected")
-        return False
+                logger.error(f"❌ Fan-out to {user_id} failed: {e}")
+                return FAILED
+        
+        results = await asyncio.gather(*(deliver(user_id) for user_id in recipients))
+        return dict(zip(recipients, results))
+
+    async def notify(self, message: dict, user_id: str, ttl: float) -> bool:
+        """Store a notification in the user's inbox, then push it live
+        
+        Returns whether it reached a connection now; either way it is in the
+        inbox batch of the user's next connection until acknowledged.
+        """
+        try:
+            message = await notification_inbox.add(user_id, message, ttl)
+        except Exception as e:
+            logger.error(f"❌ Error storing {message.get('type')} for {user_id}: {e}")
+        return await self.send_personal_message(message, user_id)
+
+    async def is_online(self, user_id: str) -> bool:
+        """Whether the user is connected to any worker"""
+        if user_id in self.connections:
+            return True
+        return await presence.is_online(user_id)
+
+    async def online_user_ids(self) -> Set[str]:
+        """Users connected to any worker"""
+        return await presence.online_user_ids()
 
     async def send_call_invite(self, from_user_id: str, to_user_id: str, call_id: str, caller_name: str = None):
-        """Simple call invite notification (used by /api/calls/invite endpoint)"""
-        logger.info(f"📞 Sending call invite from {from_user_id} to {to_user_id} for call {call_id}")
+        """Simple call invite notification (used by /api/calls/invite endpoint)
         
-        # Check if receiver is actually online
-        if to_user_id not in self.active_connections:
-            logger.warning(f"⚠️ User {to_user_id} is not connected via WebSocket")
-            return False
+        A receiver who isn't connected gets the invite from their inbox if
+        they connect before it expires.
+        """
+        logger.info(f"📞 Sending call invite from {from_user_id} to {to_user_id} for call {call_id}")
         
-        # Send notification to receiver
-        success = await self.send_personal_message({
+        success = await self.notify({
             "type": "call_invite",
             "from_user_id": from_user_id,
             "call_id": call_id,
             "caller_name": caller_name or "Someone",
             "timestamp": datetime.now().isoformat()
-        }, to_user_id)
+        }, to_user_id, ttl=settings.ws_invitation_ttl_seconds)
         
         if success:
             logger.info(f"✅ Call invite sent to {to_user_id}")
         else:
-            logger.warning(f"⚠️ Failed to send call invite to {to_user_id} - user not connected")
+            logger.warning(f"⚠️ User {to_user_id} not connected - call invite left in their inbox")
         
         return success
     
     async def broadcast_transcription(self, call_id: str, speaker_id: str, speaker_role: str, text: str):
         """Broadcast real-time transcription to all participants in a call"""
-        if call_id not in self.active_calls:
+        if not await self.ensure_active_call(call_id):
             return False
         
         participants = self.active_calls[call_id]["participants"]
@@ -120,9 +479,7 @@ class ConnectionManager:
         }
         
         # Send to all participants
-        for participant in participants:
-            if participant in self.active_connections:
-                await self.send_personal_message(message, participant)
+        return await self.fan_out(message, participants)
 
     async def send_call_invitation(self, from_user: str, to_user: str, call_id: str, call_data: dict):
         """Send call invitation to receiver (legacy method for WebSocket messages)"""
@@ -130,14 +487,14 @@ class ConnectionManager:
         
         # Store invitation
         invitation_id = str(uuid.uuid4())
-        self.pending_invitations[invitation_id] = {
+        await self.pending_invitations.set(invitation_id, {
             "from_user": from_user,
             "to_user": to_user,
             "call_id": call_id,
             "call_data": call_data,
             "created_at": datetime.now().isoformat(),
             "status": "pending"
-        }
+        })
         
         # Send notification to receiver
         success = await self.send_personal_message({
@@ -163,35 +520,38 @@ class ConnectionManager:
 
     async def accept_call_invitation(self, invitation_id: str, user_id: str):
         """Accept a call invitation"""
-        if invitation_id not in self.pending_invitations:
+        invitation = await self.pending_invitations.get(invitation_id)
+        if invitation is None:
             return {"error": "Invitation not found"}
         
-        invitation = self.pending_invitations[invitation_id]
-        
         if invitation["to_user"] != user_id:
             return {"error": "Not authorized"}
         
         if invitation["status"] != "pending":
             return {"error": f"Invitation already {invitation['status']}"}
         
-        # Update invitation status
-        invitation["status"] = "accepted"
-        invitation["accepted_at"] = datetime.now().isoformat()
+        # Update invitation status; answered invitations only linger briefly
+        await self.pending_invitations.update(
+            invitation_id,
+            {"status": "accepted", "accepted_at": datetime.now().isoformat()},
+            ttl=settings.ws_answered_invitation_ttl_seconds
+        )
         
         # Create active call record
         call_id = invitation["call_id"]
         from_user = invitation["from_user"]
         
-        self.active_calls[call_id] = {
+        await self._call_event({
+            "event": "started",
+            "call_id": call_id,
             "participants": [from_user, user_id],
             "room_id": f"room_{call_id}",
-            "started_at": datetime.now().isoformat(),
-            "status": "active"
-        }
+            "started_at": datetime.now().isoformat()
+        })
         
         # Update user status
-        self.user_status[from_user]["current_call"] = call_id
-        self.user_status[user_id]["current_call"] = call_id
+        await self.user_status.update(from_user, {"current_call": call_id})
+        await self.user_status.update(user_id, {"current_call": call_id})
         
         # Notify both users
         await self.send_personal_message({
@@ -223,16 +583,18 @@ class ConnectionManager:
 
     async def reject_call_invitation(self, invitation_id: str, user_id: str):
         """Reject a call invitation"""
-        if invitation_id not in self.pending_invitations:
+        invitation = await self.pending_invitations.get(invitation_id) if invitation_id else None
+        if invitation is None:
             return {"error": "Invitation not found"}
         
-        invitation = self.pending_invitations[invitation_id]
-        
         if invitation["to_user"] != user_id:
             return {"error": "Not authorized"}
         
-        invitation["status"] = "rejected"
-        invitation["rejected_at"] = datetime.now().isoformat()
+        await self.pending_invitations.update(
+            invitation_id,
+            {"status": "rejected", "rejected_at": datetime.now().isoformat()},
+            ttl=settings.ws_answered_invitation_ttl_seconds
+        )
         
         # Notify caller
         await self.send_personal_message({
@@ -257,7 +619,7 @@ class ConnectionManager:
             logger.debug(f"🔧 WebRTC {signal_type} from {from_user} to {to_user}")
             
             # Validate both users are in the same call
-            if call_id not in self.active_calls:
+            if not await self.ensure_active_call(call_id):
                 return {"error": "Call not found"}
             
             if from_user not in self.active_calls[call_id]["participants"]:
@@ -266,6 +628,14 @@ class ConnectionManager:
             if to_user not in self.active_calls[call_id]["participants"]:
                 return {"error": "Target not in call"}
             
+            if SignalBatcher.is_candidate(signal_data):
+                # Sent with the rest of the burst once the batch window closes
+                self.ice_batches.add(call_id, from_user, to_user, signal_data)
+                return {"status": f"{signal_type}_queued"}
+            
+            # Anything buffered for this pair must arrive before e.g. a renegotiation offer
+            await self.ice_batches.flush(call_id, from_user, to_user)
+            
             # Forward the signal
             success = await self.send_personal_message({
                 "type": "webrtc_signal",
@@ -283,31 +653,46 @@ class ConnectionManager:
             logger.error(f"❌ Error handling WebRTC signal: {e}")
             return {"error": str(e)}
 
+    async def _forward_candidates(self, call_id: str, from_user: str, to_user: str, candidates: List[dict]):
+        """Forward a batch of ICE candidates as one frame (a lone candidate keeps its own shape)"""
+        if len(candidates) == 1:
+            signal = candidates[0]
+        else:
+            signal = {
+                "type": "ice-candidates",
+                "candidates": [candidate.get("candidate") for candidate in candidates],
+                "to_user_id": to_user,
+                "call_id": call_id
+            }
+        await self.send_personal_message({
+            "type": "webrtc_signal",
+            "signal": signal,
+            "from_user": from_user,
+            "timestamp": datetime.now().isoformat()
+        }, to_user)
+
     async def end_call(self, call_id: str, user_id: str):
         """End a call"""
-        if call_id not in self.active_calls:
+        if not await self.ensure_active_call(call_id):
             return {"error": "Call not found"}
         
         if user_id not in self.active_calls[call_id]["participants"]:
             return {"error": "User not in call"}
         
         # Notify all participants
-        for participant in self.active_calls[call_id]["participants"]:
-            if participant != user_id:
-                await self.send_personal_message({
-                    "type": "call_ended",
-                    "call_id": call_id,
-                    "ended_by": user_id,
-                    "timestamp": datetime.now().isoformat()
-                }, participant)
+        await self.fan_out({
+            "type": "call_ended",
+            "call_id": call_id,
+            "ended_by": user_id,
+            "timestamp": datetime.now().isoformat()
+        }, [participant for participant in self.active_calls[call_id]["participants"] if participant != user_id])
         
         # Update user status
         for participant in self.active_calls[call_id]["participants"]:
-            if participant in self.user_status:
-                self.user_status[participant]["current_call"] = None
+            await self.user_status.update(participant, {"current_call": None})
         
-        # Remove call from active calls
-        del self.active_calls[call_id]
+        # Remove call from active calls, here and on the other workers
+        await self._call_event({"event": "ended", "call_id": call_id})
         
         logger.info(f"📞 Call {call_id} ended by {user_id}")
         
@@ -316,154 +701,230 @@ class ConnectionManager:
 # Global connection manager instance
 manager = ConnectionManager()
 
-@router.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    """Main WebSocket endpoint for signaling"""
-    await manager.connect(websocket, user_id)
+# Message type -> handler registry shared by every WebSocket route
+messages = MessageRegistry()
+
+# Connection whose frame is being handled; each connection loop runs in its own task
+current_connection: ContextVar[Optional[str]] = ContextVar("current_connection", default=None)
+
+async def reply(message: dict, user_id: str) -> bool:
+    """Answer the connection that sent the current frame, not every tab of the user"""
+    connection_id = current_connection.get()
+    if connection_id and manager.send_to_connection(message, connection_id):
+        return True
+    return await manager.send_personal_message(message, user_id)
+
+@messages.on("resume", required={"stream": str, "last_seq": int})
+async def handle_resume(user_id: str, data: dict):
+    """Replay frames the client missed (e.g. it noticed a gap in seq) to this connection"""
+    connection_id = current_connection.get()
+    missed = manager.replay.resume(user_id, data["stream"], data["last_seq"])
+    if missed is None:
+        stream = manager.replay.stream(user_id)
+        await reply({
+            "type": "resync",
+            "stream": stream.id if stream else None,
+            "last_seq": stream.last_seq if stream else 0,
+            "timestamp": datetime.now().isoformat()
+        }, user_id)
+        return
+    for item in missed:
+        manager.send_to_connection(item, connection_id)
+    await reply({
+        "type": "resumed",
+        "replayed": len(missed),
+        "timestamp": datetime.now().isoformat()
+    }, user_id)
+
+@messages.on("inbox_ack", required={"seq": int})
+async def handle_inbox_ack(user_id: str, data: dict):
+    """Client handled every inbox notification up to seq"""
+    await notification_inbox.ack(user_id, data["seq"])
+
+@messages.on("heartbeat_ack")
+async def handle_heartbeat_ack(user_id: str, data: dict):
+    """Reply to a server heartbeat; receiving it already counted as activity"""
+
+@messages.on("ping")
+async def handle_ping(user_id: str, data: dict):
+    """Keep-alive ping"""
+    await reply({
+        "type": "pong",
+        "timestamp": datetime.now().isoformat()
+    }, user_id)
+
+@messages.on("send_call_invitation", required={"to_user": str, "call_id": str}, optional={"call_data": dict})
+async def handle_send_call_invitation(user_id: str, data: dict):
+    to_user = data["to_user"]
+    call_id = data["call_id"]
+    call_data = data.get("call_data") or {}
+    
+    success = await manager.send_call_invitation(user_id, to_user, call_id, call_data)
+    await reply({
+        "type": "invitation_result",
+        "success": success,
+        "to_user": to_user,
+        "call_id": call_id,
+        "timestamp": datetime.now().isoformat()
+    }, user_id)
+
+@messages.on("accept_call_invitation", required={"invitation_id": str})
+async def handle_accept_call_invitation(user_id: str, data: dict):
+    result = await manager.accept_call_invitation(data["invitation_id"], user_id)
+    await reply({
+        "type": "accept_result",
+        "data": result,
+        "timestamp": datetime.now().isoformat()
+    }, user_id)
+
+@messages.on("reject_call_invitation", optional={"invitation_id": str, "call_id": str, "from_user_id": str})
+async def handle_reject_call_invitation(user_id: str, data: dict):
+    invitation_id = data.get("invitation_id")
+    call_id = data.get("call_id")
+    from_user_id = data.get("from_user_id")
+    
+    result = await manager.reject_call_invitation(invitation_id, user_id)
+    
+    # Send confirmation to rejector
+    await reply({
+        "type": "reject_result",
+        "data": result,
+        "timestamp": datetime.now().isoformat()
+    }, user_id)
+    
+    # Notify sender that call was rejected
+    if from_user_id and await manager.is_online(from_user_id):
+        rejector_name = await directory.user_name(user_id)
+        
+        await manager.send_personal_message({
+            "type": "call_rejected",
+            "call_id": call_id,
+            "rejected_by": user_id,
+            "rejected_by_name": rejector_name,
+            "message": f"{rejector_name} declined your call",
+            "timestamp": datetime.now().isoformat()
+        }, from_user_id)
+        logger.info(f"✅ Notified {from_user_id} that call was rejected by {user_id}")
+
+@messages.on("webrtc_signal", optional={"signal": dict, "call_id": str, "ack": bool})
+async def handle_webrtc_signal(user_id: str, data: dict):
+    signal_data = data.get("signal") or {}
+    # Ensure call is in active_calls for transcription broadcasting
+    await manager.ensure_active_call(data.get("call_id") or signal_data.get("call_id"))
+    
+    result = await manager.handle_webrtc_signal(user_id, signal_data)
+    
+    # ICE candidates are acknowledged only on request (or failure); other signals by default
+    ack = data.get("ack")
+    if ack is None:
+        ack = not SignalBatcher.is_candidate(signal_data)
+    if not ack and "error" not in result:
+        return
+    await reply({
+        "type": "signal_result",
+        "data": result,
+        "timestamp": datetime.now().isoformat()
+    }, user_id)
+
+@messages.on("webrtc-signal", optional={"signal": dict})
+async def handle_legacy_webrtc_signal(user_id: str, data: dict):
+    """Older clients: forward the signal without a signal_result reply"""
+    await manager.handle_webrtc_signal(user_id, data.get("signal") or {})
+
+@messages.on("transcription", required={"call_id": str}, optional={"text": str, "speaker_role": str})
+async def handle_transcription(user_id: str, data: dict):
+    # Broadcast incoming transcription to partner
+    await manager.broadcast_transcription(
+        call_id=data["call_id"],
+        speaker_id=user_id,
+        speaker_role=data.get("speaker_role"),
+        text=data.get("text")
+    )
+
+@messages.on("end_call", required={"call_id": str})
+async def handle_end_call(user_id: str, data: dict):
+    result = await manager.end_call(data["call_id"], user_id)
+    await reply({
+        "type": "end_call_result",
+        "data": result,
+        "timestamp": datetime.now().isoformat()
+    }, user_id)
+
+@messages.on("subscribe_leaderboard", optional={"timeframe": str, "skill_filter": str, "limit": int})
+async def handle_subscribe_leaderboard(user_id: str, data: dict):
+    # Push leaderboard deltas instead of polling /api/leaderboard/top, to this connection only
+    await leaderboard_feed.subscribe(
+        current_connection.get(),
+        timeframe=data.get("timeframe") or "all",
+        skill_filter=data.get("skill_filter"),
+        limit=data.get("limit") or 10
+    )
+
+@messages.on("unsubscribe_leaderboard")
+async def handle_unsubscribe_leaderboard(user_id: str, data: dict):
+    leaderboard_feed.unsubscribe(current_connection.get())
+
+@messages.on("check_online", required={"target_user": str})
+async def handle_check_online(user_id: str, data: dict):
+    target_user = data["target_user"]
+    await reply({
+        "type": "online_status",
+        "user_id": target_user,
+        "is_online": await manager.is_online(target_user),
+        "timestamp": datetime.now().isoformat()
+    }, user_id)
+
+@messages.on("watch_presence", required={"user_ids": list})
+async def handle_watch_presence(user_id: str, data: dict):
+    # Users on screen (e.g. the all-users list); their changes are pushed from now on
+    await presence.watch(user_id, data["user_ids"][:500])
+
+@messages.on("unwatch_presence", optional={"user_ids": list})
+async def handle_unwatch_presence(user_id: str, data: dict):
+    presence.unwatch(user_id, data.get("user_ids"))
+
+async def receive_message(websocket: WebSocket, connection_id: str = None, codec: str = JSON) -> dict:
+    """Read one frame (text or binary) and decode it"""
+    frame = await websocket.receive()
+    if frame["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(frame.get("code", 1000))
+    if connection_id:
+        manager.heartbeats.activity(connection_id)
+    raw = frame.get("bytes")
+    return decode_frame(raw if raw is not None else frame.get("text") or "", codec)
+
+async def serve_connection(websocket: WebSocket, user_id: str):
+    """Connection loop shared by every WebSocket route: decode, validate, dispatch
+    
+    A reconnecting client passes ?stream=...&last_seq=... to get what it missed.
+    """
+    resume = None
+    stream_id = websocket.query_params.get("stream")
+    last_seq = websocket.query_params.get("last_seq", "")
+    if stream_id and last_seq.isdigit():
+        resume = (stream_id, int(last_seq))
+    connection_id = await manager.connect(websocket, user_id, resume)
+    current_connection.set(connection_id)
+    codec = manager.connections.get(connection_id).codec
     
     try:
         while True:
-            # Receive message from client
-            data = await websocket.receive_json()
-            message_type = data.get("type")
-            
-            logger.debug(f"📨 {message_type} from {user_id}")
-            
-            if message_type == "ping":
-                # Keep-alive ping
-                await manager.send_personal_message({
-                    "type": "pong",
-                    "timestamp": datetime.now().isoformat()
-                }, user_id)
-                
-            elif message_type == "send_call_invitation":
-                # Send call invitation
-                to_user = data.get("to_user")
-                call_id = data.get("call_id")
-                call_data = data.get("call_data", {})
-                
-                success = await manager.send_call_invitation(user_id, to_user, call_id, call_data)
-                await manager.send_personal_message({
-                    "type": "invitation_result",
-                    "success": success,
-                    "to_user": to_user,
-                    "call_id": call_id,
-                    "timestamp": datetime.now().isoformat()
-                }, user_id)
-                
-            elif message_type == "accept_call_invitation":
-                # Accept call invitation
-                invitation_id = data.get("invitation_id")
-                result = await manager.accept_call_invitation(invitation_id, user_id)
-                await manager.send_personal_message({
-                    "type": "accept_result",
-                    "data": result,
-                    "timestamp": datetime.now().isoformat()
-                }, user_id)
-                
-            elif message_type == "reject_call_invitation":
-                # Reject call invitation
-                invitation_id = data.get("invitation_id")
-                call_id = data.get("call_id")
-                from_user_id = data.get("from_user_id")
-                
-                result = await manager.reject_call_invitation(invitation_id, user_id)
-                
-                # Send confirmation to rejector
-                await manager.send_personal_message({
-                    "type": "reject_result",
-                    "data": result,
-                    "timestamp": datetime.now().isoformat()
-                }, user_id)
-                
-                # Notify sender that call was rejected
-                if from_user_id and from_user_id in manager.active_connections:
-                    # Get rejector's name
-                    from backend.app.database import Database
-                    from bson import ObjectId
-                    db = Database.get_db()
-                    rejector = db.users.find_one({"_id": ObjectId(user_id)})
-                    rejector_name = rejector.get("name", "User") if rejector else "User"
-                    
-                    await manager.send_personal_message({
-                        "type": "call_rejected",
-                        "call_id": call_id,
-                        "rejected_by": user_id,
-                        "rejected_by_name": rejector_name,
-                        "message": f"{rejector_name} declined your call",
-                        "timestamp": datetime.now().isoformat()
-                    }, from_user_id)
-                    logger.info(f"✅ Notified {from_user_id} that call was rejected by {user_id}")
-                
-            elif message_type == "webrtc_signal":
-                # Handle WebRTC signaling
-                signal_data = data.get("signal", {})
-                call_id = data.get("call_id") or signal_data.get("call_id")
-                
-                # Ensure call is in active_calls for transcription broadcasting
-                if call_id and call_id not in manager.active_calls:
-                    # Get call info to determine participants
-                    from backend.app.database import Database
-                    from bson import ObjectId
-                    db = Database.get_db()
-                    try:
-                        call_data = db.calls.find_one({"_id": ObjectId(call_id)})
-                        if call_data:
-                            manager.active_calls[call_id] = {
-                                "participants": [str(call_data["caller_id"]), str(call_data["receiver_id"])],
-                                "room_id": call_data["jitsi_room_id"],
-                                "started_at": datetime.now().isoformat(),
-                                "status": "active"
-                            }
-                            logger.info(f"✅ Added call {call_id} to active calls")
-                    except Exception as e:
-                        logger.warning(f"⚠️ Could not add call to active_calls: {e}")
-                
-                result = await manager.handle_webrtc_signal(user_id, signal_data)
-                await manager.send_personal_message({
-                    "type": "signal_result",
-                    "data": result,
+            try:
+                data = await receive_message(websocket, connection_id, codec)
+                message_type, handled = await messages.dispatch(user_id, data)
+            except MessageError as e:
+                logger.warning(f"⚠️ Invalid message from {user_id}: {e}")
+                await reply({
+                    "type": "error",
+                    "message": str(e),
                     "timestamp": datetime.now().isoformat()
                 }, user_id)
+                continue
             
-            elif message_type == "transcription":
-                # Handle incoming transcription to broadcast to partner
-                call_id = data.get("call_id")
-                text = data.get("text")
-                speaker_role = data.get("speaker_role")
-                
-                if call_id and call_id in manager.active_calls:
-                    await manager.broadcast_transcription(
-                        call_id=call_id,
-                        speaker_id=user_id,
-                        speaker_role=speaker_role,
-                        text=text
-                    )
-                
-            elif message_type == "end_call":
-                # End a call
-                call_id = data.get("call_id")
-                result = await manager.end_call(call_id, user_id)
-                await manager.send_personal_message({
-                    "type": "end_call_result",
-                    "data": result,
-                    "timestamp": datetime.now().isoformat()
-                }, user_id)
-                
-            elif message_type == "check_online":
-                # Check if user is online
-                target_user = data.get("target_user")
-                is_online = target_user in manager.active_connections
-                await manager.send_personal_message({
-                    "type": "online_status",
-                    "user_id": target_user,
-                    "is_online": is_online,
-                    "timestamp": datetime.now().isoformat()
-                }, user_id)
-                
-            else:
+            logger.debug(f"📨 {message_type} from {user_id}")
+            if not handled:
                 logger.warning(f"⚠️ Unknown message type: {message_type}")
-                await manager.send_personal_message({
+                await reply({
                     "type": "error",
                     "message": f"Unknown message type: {message_type}",
                     "timestamp": datetime.now().isoformat()
@@ -471,15 +932,35 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
                 
     except WebSocketDisconnect:
         logger.info(f"🔌 WebSocket disconnected: {user_id}")
-        manager.disconnect(user_id)
+        manager.disconnect(user_id, connection_id)
     except Exception as e:
         logger.error(f"❌ WebSocket error for {user_id}: {e}")
-        manager.disconnect(user_id)
+        manager.disconnect(user_id, connection_id)
+
+@router.websocket("/ws/{user_id}")
+async def websocket_endpoint(websocket: WebSocket, user_id: str):
+    """Main WebSocket endpoint for signaling"""
+    await serve_connection(websocket, user_id)
+
+@router.get("/ws-metrics")
+async def get_ws_metrics(
+    current_user: UserInDB = Depends(AuthHandler.get_current_user)
+):
+    """Outbound queue depth and drop counters for this worker (lists user and connection ids)"""
+    return {
+        **manager.outbound_metrics.snapshot(manager.outbound),
+        "registry": manager.connections.stats(),
+        "heartbeats": manager.heartbeats.stats(),
+        "ice_batches": manager.ice_batches.stats(),
+        "replay": manager.replay.stats(),
+        "stores": [manager.pending_invitations.stats(), manager.user_status.stats()]
+    }
 
 @router.get("/online-users")
 async def get_online_users():
     """Get list of online users"""
+    online_users = await manager.online_user_ids()
     return {
-        "online_users": list(manager.active_connections.keys()),
-        "total": len(manager.active_connections)
+        "online_users": list(online_users),
+        "total": len(online_users)
     }
\ No newline at end of file
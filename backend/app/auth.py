@@ -9,6 +9,7 @@ from backend.app.database import Database
 from backend.app.core.security import verify_password, get_password_hash, create_access_token, decode_access_token
 from backend.app.models import UserInDB, UserPublic, Token
 from backend.app.core.config import settings
+from backend.app.services.active_users import active_users
 
 security = HTTPBearer()
 
@@ -103,11 +104,12 @@ class AuthHandler:
         if "hashed_password" in user_data and "password_hash" not in user_data:
             user_data["password_hash"] = user_data["hashed_password"]
         
-        # Update last seen
+        # Update last seen (online status lives in the presence service)
         db.users.update_one(
             {"_id": ObjectId(user_id)},
-            {"$set": {"last_seen": datetime.utcnow(), "is_online": True}}
+            {"$set": {"last_seen": datetime.utcnow()}}
         )
+        active_users.observe(user_id)
         
         return UserInDB(**user_data)
     
@@ -136,9 +138,9 @@ class AuthHandler:
     
     @staticmethod
     async def logout_user(user_id: str):
-        """Mark user as offline"""
+        """Record when the user was last seen"""
         db = Database.get_db()
         db.users.update_one(
             {"_id": ObjectId(user_id)},
-            {"$set": {"is_online": False, "last_seen": datetime.utcnow()}}
+            {"$set": {"last_seen": datetime.utcnow()}}
         )
\ No newline at end of file
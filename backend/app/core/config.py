@@ -27,10 +27,56 @@ class Settings(BaseSettings):
         # Parse comma-separated origins from environment
         return [origin.strip() for origin in env_origins.split(",") if origin.strip()]
     
+    # Seed/demo accounts kept out of every ranking (comma-separated)
+    test_account_emails: str = os.getenv(
+        "TEST_ACCOUNT_EMAILS",
+        "john@example.com,jane@example.com,bob@example.com"
+    )
+    
+    def get_test_account_emails(self) -> List[str]:
+        """Get test account emails that are excluded from rankings"""
+        return [email.strip().lower() for email in self.test_account_emails.split(",") if email.strip()]
+    
     # Database
     mongodb_url: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
     db_name: str = os.getenv("DB_NAME", "english_comm")
     
+    # WebSocket outbound queues
+    ws_outbound_queue_size: int = int(os.getenv("WS_OUTBOUND_QUEUE_SIZE", "256"))
+    ws_send_timeout_seconds: float = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+    ws_fanout_timeout_seconds: float = float(os.getenv("WS_FANOUT_TIMEOUT_SECONDS", "5"))
+    # Trickle-ICE candidates per peer pair are coalesced over this window
+    ws_ice_batch_window_ms: int = int(os.getenv("WS_ICE_BATCH_WINDOW_MS", "20"))
+    ws_ice_batch_max: int = int(os.getenv("WS_ICE_BATCH_MAX", "32"))
+    
+    # WebSocket heartbeats: idle connections are probed, silent ones closed after the timeout
+    ws_heartbeat_interval_seconds: int = int(os.getenv("WS_HEARTBEAT_INTERVAL_SECONDS", "30"))
+    ws_heartbeat_timeout_seconds: int = int(os.getenv("WS_HEARTBEAT_TIMEOUT_SECONDS", "15"))
+    
+    # Replay buffer: last N messages per user, kept this long after their last connection closes.
+    # Per worker: a reconnect routed to a different worker resyncs instead of replaying
+    # (use sticky sessions by user when running several workers)
+    ws_replay_buffer_size: int = int(os.getenv("WS_REPLAY_BUFFER_SIZE", "256"))
+    ws_replay_linger_seconds: int = int(os.getenv("WS_REPLAY_LINGER_SECONDS", "120"))
+    
+    # Ephemeral WebSocket/OAuth state TTLs
+    ws_invitation_ttl_seconds: int = int(os.getenv("WS_INVITATION_TTL_SECONDS", "120"))
+    ws_answered_invitation_ttl_seconds: int = int(os.getenv("WS_ANSWERED_INVITATION_TTL_SECONDS", "60"))
+    ws_user_status_ttl_seconds: int = int(os.getenv("WS_USER_STATUS_TTL_SECONDS", "86400"))
+    ws_offline_status_ttl_seconds: int = int(os.getenv("WS_OFFLINE_STATUS_TTL_SECONDS", "300"))
+    oauth_state_ttl_seconds: int = int(os.getenv("OAUTH_STATE_TTL_SECONDS", "600"))
+    
+    # Presence: connected users are refreshed every refresh interval and lapse after the TTL
+    presence_ttl_seconds: int = int(os.getenv("PRESENCE_TTL_SECONDS", "90"))
+    presence_refresh_seconds: int = int(os.getenv("PRESENCE_REFRESH_SECONDS", "30"))
+    
+    # Notification inbox: unacknowledged notifications kept per user, and how long friend requests last
+    notification_inbox_size: int = int(os.getenv("NOTIFICATION_INBOX_SIZE", "100"))
+    notification_ttl_days: int = int(os.getenv("NOTIFICATION_TTL_DAYS", "30"))
+    
+    # Redis (cross-worker WebSocket routing); empty means single-worker in-memory bus
+    redis_url: str = os.getenv("REDIS_URL", "")
+    
     # Jitsi
     jitsi_domain: str = os.getenv("JITSI_DOMAIN", "meet.jit.si")
     
@@ -42,6 +88,22 @@ class Settings(BaseSettings):
     whisper_model: str = "base"  # base, small, medium, large
     language_tool_url: str = "http://localhost:8081"  # Local LanguageTool server
     
+    # Peer ratings (Bayesian prior: ratings are pulled towards prior_mean)
+    peer_rating_prior_mean: float = 3.0
+    peer_rating_prior_weight: float = 5.0
+    
+    # Caching
+    global_stats_refresh_seconds: int = int(os.getenv("GLOBAL_STATS_REFRESH_SECONDS", "60"))
+    
+    # Weekly leagues
+    league_size: int = int(os.getenv("LEAGUE_SIZE", "30"))
+    league_promote_count: int = int(os.getenv("LEAGUE_PROMOTE_COUNT", "5"))
+    league_demote_count: int = int(os.getenv("LEAGUE_DEMOTE_COUNT", "5"))
+    
+    # Percentile sketches
+    percentile_sketch_k: int = int(os.getenv("PERCENTILE_SKETCH_K", "200"))
+    percentile_checkpoint_seconds: int = int(os.getenv("PERCENTILE_CHECKPOINT_SECONDS", "300"))
+    
     class Config:
         env_file = ".env"
 
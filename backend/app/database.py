@@ -54,6 +54,26 @@ class Database:
             cls.connect()
         return cls.db
 
+def sync_rankable_flags(db):
+    """Bring users.rankable in line with is_rankable() for every user
+    
+    Runs at startup, so accounts added to or removed from the configured
+    test-account list (and documents that predate the flag) are corrected.
+    Only users whose stored flag differs are written.
+    """
+    from backend.app.core.config import settings
+    test_emails = settings.get_test_account_emails()
+    
+    # Same rule as utils.is_rankable
+    rankable = {"$and": [
+        {"$gt": [{"$ifNull": ["$ai_score", 0]}, 0]},
+        {"$not": [{"$in": [{"$toLower": {"$ifNull": ["$email", ""]}}, test_emails]}]}
+    ]}
+    db.users.update_many(
+        {"$expr": {"$ne": ["$rankable", rankable]}},
+        [{"$set": {"rankable": rankable}}]
+    )
+
 async def init_db():
     """Initialize database connection and indexes"""
     db = Database.get_db()
@@ -61,9 +81,61 @@ async def init_db():
     # Create indexes
     db.users.create_index("email", unique=True)
     db.users.create_index("ai_score")
+    
+    # Ranked users: all leaderboard and rank queries filter on rankable=True
+    db.users.create_index(
+        [("rankable", 1), ("ai_score", -1)],
+        name="rankable_ai_score",
+        partialFilterExpression={"rankable": True}
+    )
+    sync_rankable_flags(db)
+    db.users.create_index(
+        [("peer_rating", -1)],
+        name="peer_rating",
+        partialFilterExpression={"peer_rating_count": {"$gt": 0}}
+    )
+    # One-time backfill on first deployment
+    if not db.users.find_one({"peer_rating_count": {"$exists": True}}, {"_id": 1}):
+        from backend.app.services.peer_ratings import peer_ratings
+        peer_ratings.rebuild()
     db.calls.create_index([("caller_id", 1), ("receiver_id", 1)])
     db.calls.create_index("status")
     db.ai_analysis.create_index("user_id")
     db.ai_analysis.create_index("call_id", unique=True)
     
+    # Score ledger for windowed leaderboards
+    db.score_events.create_index([("user_id", 1), ("created_at", -1)])
+    # One event per user per call
+    from backend.app.services.score_ledger import score_ledger
+    if "unique_ref" not in db.score_events.index_information():
+        score_ledger.drop_duplicate_events()
+    db.score_events.create_index(
+        [("ref_id", 1), ("user_id", 1), ("source", 1)],
+        name="unique_ref",
+        unique=True,
+        partialFilterExpression={"ref_id": {"$type": "objectId"}}
+    )
+    db.score_daily.create_index([("user_id", 1), ("day", 1)], unique=True)
+    db.score_daily.create_index("day")
+    db.score_windows.create_index([("daily", -1)])
+    db.score_windows.create_index([("weekly", -1)])
+    db.score_windows.create_index([("monthly", -1)])
+    
+    # Weekly league cohorts
+    db.league_memberships.create_index([("user_id", 1), ("week", 1)], unique=True)
+    db.league_memberships.create_index([("week", 1), ("cohort_id", 1), ("points", -1)])
+    
+    # Offline notification inbox: acked by (user_id, seq), stale entries expire
+    db.notifications.create_index([("user_id", 1), ("seq", 1)], unique=True)
+    db.notifications.create_index("expires_at", expireAfterSeconds=0)
+    
+    # Per-user skill aggregates for skill leaderboards
+    for skill in ("grammar", "fluency", "vocabulary", "activity"):
+        db.user_skill_scores.create_index([(skill, -1)])
+    
+    # One-time backfill on first deployment
+    if db.user_skill_scores.estimated_document_count() == 0:
+        from backend.app.services.skill_scores import skill_scores
+        skill_scores.rebuild()
+    
     print("Database indexes created")
\ No newline at end of file
@@ -69,6 +69,8 @@ class UserInDB(UserBase):
     is_online: bool = False
     last_seen: datetime = Field(default_factory=datetime.utcnow)
     ai_score: float = 0.0
+    rankable: bool = False  # Non-test account with ai_score > 0
+    league_tier: Optional[str] = None  # Set by the weekly league rollover
     total_calls: int = 0
     total_call_duration: int = 0
     avg_fluency_score: float = 0.0
@@ -99,6 +99,10 @@ class LeaderboardEntry(BaseModel):
     ai_score: float
     total_calls: int
     avg_fluency_score: float
+    window_score: Optional[float] = None  # Points earned in the requested timeframe
+    skill_score: Optional[float] = None  # Aggregate for the requested skill filter
+    peer_rating: Optional[float] = None  # Bayesian-smoothed mean of partner ratings
+    peer_rating_count: Optional[int] = None
 
 class QuizQuestion(BaseModel):
     type: str
@@ -0,0 +1,265 @@
+"""
+Achievements Engine
+Evaluates achievements incrementally from call-completion and score events
+and tracks practice streaks with a per-user daily activity bitmap
+"""
+from datetime import datetime
+from typing import Dict, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from backend.app.database import Database
+
+EPOCH = datetime(1970, 1, 1)
+
+# Days per bitmap word; each word is stored as a signed 64-bit integer
+WORD_BITS = 32
+
+# key -> definition; "stat" is compared against "threshold"
+ACHIEVEMENTS = {
+    "first_call": {
+        "name": "First Call",
+        "description": "Completed your first practice call",
+        "icon": "🎤",
+        "stat": "calls",
+        "threshold": 1
+    },
+    "practice_enthusiast": {
+        "name": "Practice Enthusiast",
+        "description": "Completed 5 practice calls",
+        "icon": "🔥",
+        "stat": "calls",
+        "threshold": 5
+    },
+    "conversation_master": {
+        "name": "Conversation Master",
+        "description": "Completed 25 practice calls",
+        "icon": "👑",
+        "stat": "calls",
+        "threshold": 25
+    },
+    "good_communicator": {
+        "name": "Good Communicator",
+        "description": "Reached AI score of 70+",
+        "icon": "⭐",
+        "stat": "score",
+        "threshold": 70
+    },
+    "excellent_speaker": {
+        "name": "Excellent Speaker",
+        "description": "Reached AI score of 85+",
+        "icon": "🌟",
+        "stat": "score",
+        "threshold": 85
+    },
+    "hour_of_practice": {
+        "name": "Hour of Practice",
+        "description": "Completed 1 hour of practice calls",
+        "icon": "⏱️",
+        "stat": "duration",
+        "threshold": 3600
+    },
+    "consistent_learner": {
+        "name": "Consistent Learner",
+        "description": "Practiced 3 days in a row",
+        "icon": "📅",
+        "stat": "longest_streak",
+        "threshold": 3
+    }
+}
+
+
+def epoch_day(moment: datetime) -> int:
+    """Days since the Unix epoch (UTC)"""
+    return (moment - EPOCH).days
+
+
+class AchievementsEngine:
+    """Maintain user_achievements documents
+
+    Document shape:
+        {_id: user_id, user_name,
+         stats: {calls, duration, score},
+         activity: {"<word>": bits},    # bit i of word w = day w*32 + i
+         longest_streak,
+         unlocked: {key: unlocked_at}}
+
+    The activity bitmap is the only record of which days were active;
+    streaks are read from it a 32-day word at a time.
+    """
+
+    def _seed(self, user_oid: ObjectId) -> Optional[Dict]:
+        """Create the document from the user profile if it doesn't exist yet"""
+        db = Database.get_db()
+        user = db.users.find_one(
+            {"_id": user_oid},
+            {"name": 1, "total_calls": 1, "total_call_duration": 1, "ai_score": 1}
+        )
+        if not user:
+            return None
+
+        db.user_achievements.update_one(
+            {"_id": user_oid},
+            {"$setOnInsert": {
+                "user_name": user.get("name"),
+                "stats": {
+                    "calls": user.get("total_calls", 0),
+                    "duration": user.get("total_call_duration", 0),
+                    "score": user.get("ai_score", 0.0)
+                },
+                "activity": {},
+                "longest_streak": 0,
+                "unlocked": {}
+            }},
+            upsert=True
+        )
+        return self._evaluate(db.user_achievements.find_one({"_id": user_oid}))
+
+    def _evaluate(self, doc: Dict) -> Dict:
+        """Unlock any achievements whose thresholds the document now meets"""
+        stats = {**doc.get("stats", {}), "longest_streak": doc.get("longest_streak", 0)}
+        unlocked = doc.get("unlocked", {})
+
+        newly_unlocked = [
+            key for key, achievement in ACHIEVEMENTS.items()
+            if key not in unlocked and stats.get(achievement["stat"], 0) >= achievement["threshold"]
+        ]
+        if not newly_unlocked:
+            return doc
+
+        db = Database.get_db()
+        now = datetime.utcnow()
+        return db.user_achievements.find_one_and_update(
+            {"_id": doc["_id"]},
+            # Only set keys that are still missing so the first unlock time wins
+            [{"$set": {
+                f"unlocked.{key}": {"$ifNull": [f"$unlocked.{key}", now]}
+                for key in newly_unlocked
+            }}],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _ensure(self, user_oid: ObjectId):
+        db = Database.get_db()
+        if not db.user_achievements.find_one({"_id": user_oid}, {"_id": 1}):
+            self._seed(user_oid)
+
+    def on_call_completed(self, user_id, duration_seconds: int, at: datetime = None):
+        """Count a completed call and mark the day as active"""
+        db = Database.get_db()
+        user_oid = ObjectId(str(user_id))
+        day = epoch_day(at or datetime.utcnow())
+        self._ensure(user_oid)
+
+        word, offset = divmod(day, WORD_BITS)
+        doc = db.user_achievements.find_one_and_update(
+            {"_id": user_oid},
+            {
+                "$inc": {"stats.calls": 1, "stats.duration": duration_seconds},
+                "$bit": {f"activity.{word}": {"or": 1 << offset}}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+
+        streak = self.run_ending(doc.get("activity", {}), day)
+        if streak > doc.get("longest_streak", 0):
+            db.user_achievements.update_one(
+                {"_id": user_oid, "longest_streak": {"$lt": streak}},
+                {"$set": {"longest_streak": streak}}
+            )
+            doc["longest_streak"] = streak
+        self._evaluate(doc)
+
+    def on_score_changed(self, user_id, ai_score: float):
+        """Track the latest AI score and unlock score achievements"""
+        db = Database.get_db()
+        user_oid = ObjectId(str(user_id))
+        self._ensure(user_oid)
+
+        doc = db.user_achievements.find_one_and_update(
+            {"_id": user_oid},
+            {"$set": {"stats.score": ai_score}},
+            return_document=ReturnDocument.AFTER
+        )
+        self._evaluate(doc)
+
+    def on_name_changed(self, user_id, name: str):
+        """Keep the denormalized display name in sync"""
+        db = Database.get_db()
+        db.user_achievements.update_one({"_id": ObjectId(str(user_id))}, {"$set": {"user_name": name}})
+
+    @staticmethod
+    def run_ending(activity: Dict, day: int) -> int:
+        """Consecutive active days ending on `day`, read from the bitmap a word at a time"""
+        streak = 0
+        word, offset = divmod(day, WORD_BITS)
+        while True:
+            window = (1 << (offset + 1)) - 1
+            gaps = ~activity.get(str(word), 0) & window
+            if gaps:
+                # Days between the highest inactive day and `day` are all active
+                return streak + offset + 1 - gaps.bit_length()
+            streak += offset + 1
+            word, offset = word - 1, WORD_BITS - 1
+
+    @classmethod
+    def current_streak(cls, doc: Dict, today: int = None) -> int:
+        """Consecutive active days ending today or yesterday"""
+        today = today if today is not None else epoch_day(datetime.utcnow())
+        activity = doc.get("activity", {})
+        return cls.run_ending(activity, today) or cls.run_ending(activity, today - 1)
+
+    @staticmethod
+    def active_days(doc: Dict, days: int = 30, today: int = None) -> int:
+        """Number of active days among the last `days` (today included)"""
+        today = today if today is not None else epoch_day(datetime.utcnow())
+        activity = doc.get("activity", {})
+        first = today - days + 1
+        total = 0
+        for word in range(first // WORD_BITS, today // WORD_BITS + 1):
+            bits = activity.get(str(word), 0)
+            low = max(first - word * WORD_BITS, 0)
+            high = min(today - word * WORD_BITS, WORD_BITS - 1)
+            total += bin((bits >> low) & ((1 << (high - low + 1)) - 1)).count("1")
+        return total
+
+    def get(self, user_id) -> Optional[Dict]:
+        """Single document fetch, seeding from the profile on first view"""
+        db = Database.get_db()
+        user_oid = ObjectId(str(user_id))
+        return db.user_achievements.find_one({"_id": user_oid}) or self._seed(user_oid)
+
+    def summary(self, doc: Dict) -> Dict:
+        """Achievements response shape for the API"""
+        unlocked = doc.get("unlocked", {})
+        stats = doc.get("stats", {})
+        achievements = [
+            {
+                "name": achievement["name"],
+                "description": achievement["description"],
+                "icon": achievement["icon"],
+                "unlocked": True,
+                "date": unlocked[key]
+            }
+            for key, achievement in ACHIEVEMENTS.items()
+            if key in unlocked
+        ]
+        return {
+            "user_id": str(doc["_id"]),
+            "user_name": doc.get("user_name"),
+            "total_achievements": len(achievements),
+            "achievements": achievements,
+            "progress": {
+                "calls": stats.get("calls", 0),
+                "score": stats.get("score", 0),
+                "duration": stats.get("duration", 0),
+                "streak": self.current_streak(doc),
+                "longest_streak": doc.get("longest_streak", 0),
+                "active_days_30": self.active_days(doc)
+            }
+        }
+
+
+# Global instance
+achievements_engine = AchievementsEngine()
@@ -0,0 +1,217 @@
+"""
+Active Users
+Per-day HyperLogLog sketches of active user ids for DAU/WAU/MAU, fed by
+authenticated requests and WebSocket connects and persisted to MongoDB
+"""
+import asyncio
+import hashlib
+import math
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from bson import Binary
+
+from backend.app.database import Database
+
+# 2**14 one-byte registers = 16 KB per day, ~0.8% standard error
+PRECISION = 14
+
+
+class HyperLogLog:
+    """HyperLogLog cardinality sketch (Flajolet et al., 2007) over 64-bit hashes
+
+    Standard error is 1.04 / sqrt(2**p). Sketches with the same precision
+    merge losslessly by taking the register-wise max, so a window's unique
+    count is the count of the union of its daily sketches.
+    """
+
+    def __init__(self, p: int = PRECISION, registers: bytes = None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers else bytearray(self.m)
+
+    @staticmethod
+    def hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+    def add(self, key: str) -> bool:
+        """Observe a key; returns True if a register changed"""
+        x = self.hash(key)
+        index = x >> (64 - self.p)
+        remaining = x & ((1 << (64 - self.p)) - 1)
+        rho = (64 - self.p) - remaining.bit_length() + 1
+        if rho > self.registers[index]:
+            self.registers[index] = rho
+            return True
+        return False
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    @property
+    def standard_error(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+
+class ActiveUserCounter:
+    """Daily active-user sketches in the active_user_sketches collection
+
+    Document shape: {_id: "YYYY-MM-DD", p, registers: Binary, version}
+
+    Observations land in an in-memory sketch per day and are flushed by
+    merging them into the stored registers (optimistic, version-checked),
+    so several workers can share a day without losing updates.
+    """
+
+    def __init__(self, flush_seconds: float = 60, p: int = PRECISION):
+        self.flush_seconds = flush_seconds
+        self.p = p
+        # day -> sketch of observations not yet flushed
+        self._pending: Dict[str, HyperLogLog] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _day_key(moment: datetime) -> str:
+        return moment.strftime("%Y-%m-%d")
+
+    def observe(self, user_id, at: datetime = None):
+        """Mark a user as active; O(1), no database access"""
+        day = self._day_key(at or datetime.utcnow())
+        with self._lock:
+            sketch = self._pending.get(day)
+            if sketch is None:
+                sketch = self._pending[day] = HyperLogLog(self.p)
+            sketch.add(str(user_id))
+
+    def flush(self):
+        """Merge pending sketches into MongoDB
+
+        Days that could not be written (every attempt lost a race, or Mongo
+        failed) go back into _pending for the next flush.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        db = Database.get_db()
+        try:
+            for day in list(pending):
+                if self._write_day(db, day, pending[day]):
+                    del pending[day]
+        finally:
+            if pending:
+                with self._lock:
+                    for day, sketch in pending.items():
+                        self._pending.setdefault(day, HyperLogLog(self.p)).merge(sketch)
+
+    def _write_day(self, db, day: str, sketch: HyperLogLog) -> bool:
+        """Merge one day's sketch into Mongo; False if every attempt lost a race"""
+        for _ in range(5):
+            stored = db.active_user_sketches.find_one({"_id": day})
+            merged = HyperLogLog(self.p, stored["registers"] if stored else None)
+            merged.merge(sketch)
+            if stored:
+                result = db.active_user_sketches.update_one(
+                    {"_id": day, "version": stored["version"]},
+                    {"$set": {"registers": Binary(bytes(merged.registers))}, "$inc": {"version": 1}}
+                )
+                if result.modified_count:
+                    return True
+            else:
+                result = db.active_user_sketches.update_one(
+                    {"_id": day},
+                    {"$setOnInsert": {"p": self.p, "registers": Binary(bytes(merged.registers)), "version": 1}},
+                    upsert=True
+                )
+                if result.upserted_id is not None:
+                    return True
+        return False
+
+    def _window(self, start_day: str, end_day: str) -> HyperLogLog:
+        """Union of stored and pending sketches for start_day..end_day inclusive"""
+        db = Database.get_db()
+        union = HyperLogLog(self.p)
+        for doc in db.active_user_sketches.find({"_id": {"$gte": start_day, "$lte": end_day}}):
+            union.merge(HyperLogLog(self.p, doc["registers"]))
+        with self._lock:
+            for day, sketch in self._pending.items():
+                if start_day <= day <= end_day:
+                    union.merge(sketch)
+        return union
+
+    def unique_users(self, start: datetime, end: datetime = None) -> int:
+        """Estimated distinct active users over an arbitrary day range"""
+        end = end or datetime.utcnow()
+        return self._window(self._day_key(start), self._day_key(end)).count()
+
+    def summary(self, today: datetime = None) -> Dict:
+        """DAU, WAU and MAU ending today"""
+        today = today or datetime.utcnow()
+        return {
+            "dau": self.unique_users(today, today),
+            "wau": self.unique_users(today - timedelta(days=6), today),
+            "mau": self.unique_users(today - timedelta(days=29), today),
+            "error_rate": round(HyperLogLog(self.p).standard_error, 4)
+        }
+
+    def daily_series(self, days: int = 30, today: datetime = None) -> List[Dict]:
+        """DAU per day for the last `days` days, oldest first"""
+        today = today or datetime.utcnow()
+        start_day = self._day_key(today - timedelta(days=days - 1))
+        end_day = self._day_key(today)
+
+        db = Database.get_db()
+        sketches = {
+            doc["_id"]: HyperLogLog(self.p, doc["registers"])
+            for doc in db.active_user_sketches.find({"_id": {"$gte": start_day, "$lte": end_day}})
+        }
+        with self._lock:
+            for day, pending in self._pending.items():
+                if start_day <= day <= end_day:
+                    sketches.setdefault(day, HyperLogLog(self.p)).merge(pending)
+
+        series = []
+        for offset in range(days - 1, -1, -1):
+            day = self._day_key(today - timedelta(days=offset))
+            sketch = sketches.get(day)
+            series.append({"day": day, "active_users": sketch.count() if sketch else 0})
+        return series
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"⚠️ Failed to flush active-user sketches: {e}")
+
+    def start(self):
+        """Start periodic flushing (idempotent)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop flushing and write out pending observations"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+# Global instance
+active_users = ActiveUserCounter()
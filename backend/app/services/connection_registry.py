@@ -0,0 +1,85 @@
+"""
+Connection Registry
+Tracks every WebSocket a worker holds, keyed by connection id and grouped
+by user, so one user can be connected from several tabs and devices
+"""
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+
+class Connection:
+    """One WebSocket held by this worker"""
+
+    __slots__ = ("id", "user_id", "websocket", "queue", "codec", "connected_at")
+
+    def __init__(self, user_id: str, websocket, queue=None, connection_id: str = None, codec: str = "json"):
+        self.id = connection_id or uuid.uuid4().hex
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue = queue
+        # Wire format negotiated at connect (see ws_codec)
+        self.codec = codec
+        self.connected_at = datetime.now()
+
+
+class ConnectionRegistry:
+    """connection id -> Connection, plus user id -> {connection id: Connection}
+
+    Membership checks and per-user lookups are single dict hits. A user
+    counts as connected while at least one of their connections is open.
+    """
+
+    def __init__(self):
+        self.connections: Dict[str, Connection] = {}
+        self.by_user: Dict[str, Dict[str, Connection]] = {}
+
+    def add(self, connection: Connection) -> int:
+        """Register a connection; returns how many the user now has"""
+        self.connections[connection.id] = connection
+        user_connections = self.by_user.setdefault(connection.user_id, {})
+        user_connections[connection.id] = connection
+        return len(user_connections)
+
+    def remove(self, connection_id: str) -> Optional[Connection]:
+        """Unregister a connection; returns it, or None if it was already gone"""
+        connection = self.connections.pop(connection_id, None)
+        if connection is None:
+            return None
+        user_connections = self.by_user.get(connection.user_id)
+        if user_connections is not None:
+            user_connections.pop(connection_id, None)
+            if not user_connections:
+                del self.by_user[connection.user_id]
+        return connection
+
+    def get(self, connection_id: str) -> Optional[Connection]:
+        return self.connections.get(connection_id)
+
+    def for_user(self, user_id: str) -> List[Connection]:
+        user_connections = self.by_user.get(user_id)
+        return list(user_connections.values()) if user_connections else []
+
+    def count(self, user_id: str) -> int:
+        return len(self.by_user.get(user_id, ()))
+
+    def user_ids(self) -> List[str]:
+        return list(self.by_user)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self.by_user
+
+    def __iter__(self) -> Iterator[Connection]:
+        return iter(list(self.connections.values()))
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    def stats(self) -> Dict:
+        return {
+            "connections": len(self.connections),
+            "users": len(self.by_user),
+            "max_per_user": max((len(conns) for conns in self.by_user.values()), default=0),
+            "codecs": dict(Counter(connection.codec for connection in self.connections.values()))
+        }
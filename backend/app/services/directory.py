@@ -0,0 +1,194 @@
+"""
+Directory
+In-memory cache of user display info and call participants for the
+WebSocket handlers, warmed on connect and invalidated on profile/call writes
+"""
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+
+from backend.app.database import Database
+from backend.app.services.message_bus import message_bus
+
+MAX_USERS = 10000
+MAX_CALLS = 5000
+
+# Every worker subscribes; carries {"user_id": ...} or {"call_id": ...}
+INVALIDATION_CHANNEL = "directory:invalidations"
+
+
+class LRUCache:
+    """Small thread-safe LRU map"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._items: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: dict):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def pop(self, key: str):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class Directory:
+    """User and call lookups for the WebSocket loop
+
+    Hits are served from memory. A miss is read from MongoDB in a worker
+    thread, so the event loop never waits on a synchronous query.
+    Each worker has its own cache, so invalidations are published to every
+    worker and applied there by handle_invalidation.
+        users: user_id -> {name, avatar_url}
+        calls: call_id -> {participants: [user_id, user_id], room_id, status}
+    """
+
+    def __init__(self, max_users: int = MAX_USERS, max_calls: int = MAX_CALLS):
+        self.users = LRUCache(max_users)
+        self.calls = LRUCache(max_calls)
+
+    @staticmethod
+    def _user_entry(user: dict) -> dict:
+        return {"name": user.get("name", "User"), "avatar_url": user.get("avatar_url")}
+
+    @staticmethod
+    def _call_entry(call: dict) -> dict:
+        return {
+            "participants": [str(call["caller_id"]), str(call["receiver_id"])],
+            "room_id": call.get("jitsi_room_id"),
+            "status": call.get("status")
+        }
+
+    def _load_user(self, user_id: str) -> Optional[dict]:
+        db = Database.get_db()
+        user = db.users.find_one({"_id": ObjectId(user_id)}, {"name": 1, "avatar_url": 1})
+        if not user:
+            return None
+        entry = self._user_entry(user)
+        self.users.put(user_id, entry)
+        return entry
+
+    def _load_call(self, call_id: str) -> Optional[dict]:
+        db = Database.get_db()
+        call = db.calls.find_one(
+            {"_id": ObjectId(call_id)},
+            {"caller_id": 1, "receiver_id": 1, "jitsi_room_id": 1, "status": 1}
+        )
+        if not call:
+            return None
+        entry = self._call_entry(call)
+        self.calls.put(call_id, entry)
+        return entry
+
+    def _load_connection(self, user_id: str):
+        """Profile plus any calls the user is currently in, in two queries"""
+        self._load_user(user_id)
+        db = Database.get_db()
+        user_oid = ObjectId(user_id)
+        for call in db.calls.find(
+            {"$or": [{"caller_id": user_oid}, {"receiver_id": user_oid}], "status": {"$in": ["pending", "active"]}},
+            {"caller_id": 1, "receiver_id": 1, "jitsi_room_id": 1, "status": 1}
+        ):
+            self.calls.put(str(call["_id"]), self._call_entry(call))
+
+    async def warm(self, user_id: str):
+        """Preload a connecting user's profile and open calls"""
+        try:
+            await asyncio.to_thread(self._load_connection, str(user_id))
+        except Exception as e:
+            print(f"⚠️ Failed to warm directory for {user_id}: {e}")
+
+    async def get_user(self, user_id: str) -> Optional[dict]:
+        user_id = str(user_id)
+        entry = self.users.get(user_id)
+        if entry is None:
+            try:
+                entry = await asyncio.to_thread(self._load_user, user_id)
+            except Exception:
+                return None
+        return entry
+
+    async def user_name(self, user_id: str, default: str = "User") -> str:
+        entry = await self.get_user(user_id)
+        return entry["name"] if entry else default
+
+    async def get_call(self, call_id: str) -> Optional[dict]:
+        call_id = str(call_id)
+        entry = self.calls.get(call_id)
+        if entry is None:
+            try:
+                entry = await asyncio.to_thread(self._load_call, call_id)
+            except Exception:
+                return None
+        return entry
+
+    def put_call(self, call_id, participants: List, room_id: str = None, status: str = "active"):
+        """Record a call at write time so signalling never has to look it up"""
+        self.calls.put(str(call_id), {
+            "participants": [str(participant) for participant in participants],
+            "room_id": room_id,
+            "status": status
+        })
+
+    def invalidate_user(self, user_id, announce: bool = True):
+        """A profile changed: drop it here and, unless announce is False, on every worker"""
+        self.users.pop(str(user_id))
+        if announce:
+            self._announce({"user_id": str(user_id)})
+
+    def invalidate_call(self, call_id, announce: bool = True):
+        """A call changed: drop it here and, unless announce is False, on every worker"""
+        self.calls.pop(str(call_id))
+        if announce:
+            self._announce({"call_id": str(call_id)})
+
+    def _announce(self, change: dict):
+        try:
+            asyncio.get_running_loop().create_task(self._publish(change))
+        except RuntimeError:
+            # Called outside the event loop (scripts); no other worker to tell
+            pass
+
+    async def _publish(self, change: dict):
+        try:
+            await message_bus.publish(INVALIDATION_CHANNEL, change, exclude_self=True)
+        except Exception as e:
+            print(f"⚠️ Failed to publish directory invalidation: {e}")
+
+    def handle_invalidation(self, change: dict):
+        """Bus callback: apply an invalidation published by another worker"""
+        if change.get("user_id"):
+            self.users.pop(change["user_id"])
+        if change.get("call_id"):
+            self.calls.pop(change["call_id"])
+
+    async def start(self):
+        await message_bus.subscribe(INVALIDATION_CHANNEL)
+
+    async def stop(self):
+        await message_bus.unsubscribe(INVALIDATION_CHANNEL)
+
+    def stats(self) -> Dict:
+        return {"users": len(self.users), "calls": len(self.calls)}
+
+
+# Global instance
+directory = Directory()
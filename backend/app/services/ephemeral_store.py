@@ -0,0 +1,260 @@
+"""
+Ephemeral Store
+Key-value store for short-lived state with per-key TTL, hierarchical
+timer-wheel expiry and a memory cap, plus a Redis-backed variant
+"""
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TimerWheel:
+    """Hierarchical timing wheel (Varghese & Lauck)
+
+    Level L has `slots` buckets of slots**L ticks each, so four levels of
+    64 slots cover 64**4 ticks (~194 days at one-second ticks) with O(1)
+    scheduling and cancellation. A bucket of a higher level is cascaded
+    into the levels below when the clock reaches it. Deadlines past the
+    top level are parked in its furthest bucket and re-placed when they
+    cascade. Each key has at most one timer.
+    """
+
+    def __init__(self, slots_bits: int = 6, levels: int = 4, start_tick: int = 0):
+        self.bits = slots_bits
+        self.mask = (1 << slots_bits) - 1
+        self.levels = levels
+        self.span = 1 << (slots_bits * levels)
+        self.current = start_tick
+        self.wheels: List[List[Set[Any]]] = [
+            [set() for _ in range(1 << slots_bits)] for _ in range(levels)
+        ]
+        # key -> (deadline, level, slot)
+        self._timers: Dict[Any, Tuple[int, int, int]] = {}
+
+    def __len__(self):
+        return len(self._timers)
+
+    def _place(self, key, deadline: int):
+        target = min(max(deadline, self.current), self.current + self.span - 1)
+        delta = target - self.current
+        level = 0
+        while level < self.levels - 1 and delta >= 1 << (self.bits * (level + 1)):
+            level += 1
+        slot = (target >> (self.bits * level)) & self.mask
+        self.wheels[level][slot].add(key)
+        self._timers[key] = (deadline, level, slot)
+
+    def cancel(self, key):
+        timer = self._timers.pop(key, None)
+        if timer:
+            _, level, slot = timer
+            self.wheels[level][slot].discard(key)
+
+    def schedule(self, key, deadline: int):
+        """Fire key at the given tick (or the next one if that has passed)"""
+        self.cancel(key)
+        self._place(key, max(deadline, self.current + 1))
+
+    def advance(self, now_tick: int) -> List[Any]:
+        """Move the clock to now_tick; returns the keys that fired"""
+        fired = []
+        if not self._timers:
+            self.current = max(self.current, now_tick)
+            return fired
+
+        while self.current < now_tick:
+            self.current += 1
+            for level in range(1, self.levels):
+                if self.current & ((1 << (self.bits * level)) - 1):
+                    break
+                slot = (self.current >> (self.bits * level)) & self.mask
+                bucket, self.wheels[level][slot] = self.wheels[level][slot], set()
+                for key in bucket:
+                    self._place(key, self._timers[key][0])
+
+            slot = self.current & self.mask
+            bucket, self.wheels[0][slot] = self.wheels[0][slot], set()
+            for key in bucket:
+                deadline = self._timers[key][0]
+                if deadline > self.current:
+                    # Parked beyond the top level; not due yet
+                    self._place(key, deadline)
+                else:
+                    del self._timers[key]
+                    fired.append(key)
+        return fired
+
+
+class EphemeralStore(ABC):
+    """Interface shared by the store implementations (all methods are async)"""
+
+    @abstractmethod
+    async def get(self, key: str, default: Any = None) -> Any:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float = None):
+        ...
+
+    @abstractmethod
+    async def update(self, key: str, changes: Dict, ttl: float = None) -> Optional[Dict]:
+        """Merge fields into a dict value atomically; refreshes the TTL only if one is given"""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    async def contains(self, key: str) -> bool:
+        return await self.get(key) is not None
+
+    def stats(self) -> Dict:
+        return {}
+
+
+class MemoryEphemeralStore(EphemeralStore):
+    """Process-local store; expiry runs lazily on every operation
+
+    Entries expire through a TimerWheel with one-second ticks, one timer
+    per key. When max_entries is reached the least recently written key
+    is evicted, so memory stays bounded however long the worker runs.
+    """
+
+    def __init__(self, name: str, default_ttl: float, max_entries: int = 10000, tick_seconds: float = 1.0):
+        self.name = name
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.tick_seconds = tick_seconds
+        # key -> (value, deadline tick)
+        self._data: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._wheel = TimerWheel(start_tick=self._now_tick())
+        self.expired = 0
+        self.evicted = 0
+
+    def _now_tick(self) -> int:
+        return int(time.monotonic() / self.tick_seconds)
+
+    def _expire(self):
+        for key in self._wheel.advance(self._now_tick()):
+            if self._data.pop(key, None) is not None:
+                self.expired += 1
+
+    def _write(self, key: str, value: Any, ttl: float):
+        deadline = self._wheel.current + max(1, int(-(-ttl // self.tick_seconds)))
+        self._data[key] = (value, deadline)
+        self._data.move_to_end(key)
+        self._wheel.schedule(key, deadline)
+        while len(self._data) > self.max_entries:
+            evicted_key, _ = self._data.popitem(last=False)
+            self._wheel.cancel(evicted_key)
+            self.evicted += 1
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        self._expire()
+        entry = self._data.get(key)
+        return entry[0] if entry is not None else default
+
+    async def set(self, key: str, value: Any, ttl: float = None):
+        self._expire()
+        self._write(key, value, ttl if ttl is not None else self.default_ttl)
+
+    async def update(self, key: str, changes: Dict, ttl: float = None) -> Optional[Dict]:
+        self._expire()
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value = {**entry[0], **changes}
+        if ttl is None:
+            self._data[key] = (value, entry[1])
+        else:
+            self._write(key, value, ttl)
+        return value
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+        self._wheel.cancel(key)
+
+    def stats(self) -> Dict:
+        self._expire()
+        return {
+            "name": self.name,
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "scheduled_timers": len(self._wheel),
+            "expired": self.expired,
+            "evicted": self.evicted
+        }
+
+
+class RedisEphemeralStore(EphemeralStore):
+    """Store shared by all workers; Redis enforces TTLs (SET EX / KEEPTTL)
+
+    Memory is bounded by key TTLs plus the server's maxmemory policy
+    rather than a per-store cap. update() is an optimistic transaction
+    (WATCH/MULTI), retried when another worker writes the key meanwhile.
+    """
+
+    def __init__(self, name: str, url: str, default_ttl: float):
+        import redis.asyncio as aioredis
+        from redis.exceptions import WatchError
+
+        self.name = name
+        self.default_ttl = default_ttl
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self._watch_error = WatchError
+
+    def _key(self, key: str) -> str:
+        return f"eph:{self.name}:{key}"
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        raw = await self._redis.get(self._key(key))
+        return json.loads(raw) if raw is not None else default
+
+    async def set(self, key: str, value: Any, ttl: float = None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        await self._redis.set(self._key(key), json.dumps(value, default=str), px=max(1, int(ttl * 1000)))
+
+    async def update(self, key: str, changes: Dict, ttl: float = None) -> Optional[Dict]:
+        name = self._key(key)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(name)
+                    raw = await pipe.get(name)
+                    if raw is None:
+                        await pipe.unwatch()
+                        return None
+                    value = {**json.loads(raw), **changes}
+                    encoded = json.dumps(value, default=str)
+                    pipe.multi()
+                    if ttl is None:
+                        pipe.set(name, encoded, keepttl=True, xx=True)
+                    else:
+                        pipe.set(name, encoded, px=max(1, int(ttl * 1000)), xx=True)
+                    written, = await pipe.execute()
+                    return value if written else None
+                except self._watch_error:
+                    # Another worker changed the key between WATCH and EXEC; merge into its write
+                    continue
+
+    async def delete(self, key: str):
+        await self._redis.delete(self._key(key))
+
+    def stats(self) -> Dict:
+        return {"name": self.name, "backend": "redis"}
+
+
+def create_store(name: str, default_ttl: float, max_entries: int = 10000) -> EphemeralStore:
+    """Redis-backed when REDIS_URL is configured, otherwise in-memory"""
+    if settings.redis_url:
+        try:
+            return RedisEphemeralStore(name, settings.redis_url, default_ttl)
+        except ImportError:
+            logger.warning(f"⚠️ REDIS_URL is set but the redis package is missing; {name} stays in memory")
+    return MemoryEphemeralStore(name, default_ttl, max_entries)
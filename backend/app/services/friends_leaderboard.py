@@ -0,0 +1,143 @@
+"""
+Friends Leaderboard
+Per-user cached ranking of a user and their friends by ai_score, dropped
+whenever the score or name of anyone on a cached board changes
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, List, Set
+
+from bson import ObjectId
+
+from backend.app.database import Database
+from backend.app.services.message_bus import message_bus
+
+# Upper bound on how long a board is served without any invalidation
+MAX_AGE_SECONDS = 600
+
+# Every worker subscribes; carries {"member": user_id} or {"viewer": user_id}
+INVALIDATION_CHANNEL = "friends_leaderboard:invalidations"
+
+
+class FriendsLeaderboardCache:
+    """Cache friends leaderboards per viewer
+
+    Boards are built with one batched read over the viewer's friends array.
+    A reverse index (member -> viewers whose cached board includes them)
+    makes invalidation proportional to the number of boards affected.
+    Each worker caches its own boards, so invalidations are published to
+    every worker and applied there by handle_invalidation.
+    """
+
+    def __init__(self, max_age_seconds: float = MAX_AGE_SECONDS):
+        self.max_age_seconds = max_age_seconds
+        # viewer_id -> (built_at, entries)
+        self._boards: Dict[str, tuple] = {}
+        # member_id -> viewer_ids
+        self._watchers: Dict[str, Set[str]] = {}
+        # Bumped on every invalidation so a build that raced one isn't cached
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def _build(self, viewer_id: str, friend_ids: List) -> List[Dict]:
+        db = Database.get_db()
+        member_ids = [ObjectId(str(friend_id)) for friend_id in friend_ids] + [ObjectId(viewer_id)]
+        members = db.users.find(
+            {"_id": {"$in": member_ids}},
+            {"name": 1, "avatar_url": 1, "ai_score": 1, "total_calls": 1, "avg_fluency_score": 1}
+        ).sort([("ai_score", -1), ("_id", 1)])
+
+        return [
+            {
+                "rank": rank,
+                "user_id": str(member["_id"]),
+                "name": member.get("name", "User"),
+                "avatar_url": member.get("avatar_url"),
+                "ai_score": member.get("ai_score", 0.0),
+                "total_calls": member.get("total_calls", 0),
+                "avg_fluency_score": member.get("avg_fluency_score", 0.0)
+            }
+            for rank, member in enumerate(members, 1)
+        ]
+
+    def get(self, viewer_id, friend_ids: List) -> List[Dict]:
+        """The viewer's friends leaderboard, built on a cache miss"""
+        viewer_id = str(viewer_id)
+        with self._lock:
+            cached = self._boards.get(viewer_id)
+            if cached and time.monotonic() - cached[0] < self.max_age_seconds:
+                return cached[1]
+            version = self._version
+
+        entries = self._build(viewer_id, friend_ids)
+
+        with self._lock:
+            if version != self._version:
+                return entries
+            self._drop(viewer_id)
+            self._boards[viewer_id] = (time.monotonic(), entries)
+            for entry in entries:
+                self._watchers.setdefault(entry["user_id"], set()).add(viewer_id)
+        return entries
+
+    def _drop(self, viewer_id: str):
+        cached = self._boards.pop(viewer_id, None)
+        if not cached:
+            return
+        for entry in cached[1]:
+            watchers = self._watchers.get(entry["user_id"])
+            if watchers:
+                watchers.discard(viewer_id)
+                if not watchers:
+                    del self._watchers[entry["user_id"]]
+
+    def _drop_member(self, user_id: str):
+        with self._lock:
+            self._version += 1
+            for viewer_id in list(self._watchers.get(user_id, ())):
+                self._drop(viewer_id)
+
+    def _drop_viewer(self, user_id: str):
+        with self._lock:
+            self._version += 1
+            self._drop(user_id)
+
+    def _announce(self, change: dict):
+        try:
+            asyncio.get_running_loop().create_task(self._publish(change))
+        except RuntimeError:
+            # Called outside the event loop (scripts); no other worker to tell
+            pass
+
+    async def _publish(self, change: dict):
+        try:
+            await message_bus.publish(INVALIDATION_CHANNEL, change, exclude_self=True)
+        except Exception as e:
+            print(f"⚠️ Failed to publish friends leaderboard invalidation: {e}")
+
+    def invalidate_member(self, user_id):
+        """A user's score or profile changed: drop every board showing them, on every worker"""
+        self._drop_member(str(user_id))
+        self._announce({"member": str(user_id)})
+
+    def invalidate_viewer(self, user_id):
+        """A user's friend list changed: drop their own board, on every worker"""
+        self._drop_viewer(str(user_id))
+        self._announce({"viewer": str(user_id)})
+
+    def handle_invalidation(self, change: dict):
+        """Bus callback: apply an invalidation published by another worker"""
+        if change.get("member"):
+            self._drop_member(change["member"])
+        if change.get("viewer"):
+            self._drop_viewer(change["viewer"])
+
+    async def start(self):
+        await message_bus.subscribe(INVALIDATION_CHANNEL)
+
+    async def stop(self):
+        await message_bus.unsubscribe(INVALIDATION_CHANNEL)
+
+# Global instance
+friends_leaderboard = FriendsLeaderboardCache()
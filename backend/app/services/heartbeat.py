@@ -0,0 +1,124 @@
+"""
+Heartbeat
+Server-driven liveness checks for WebSocket connections: idle connections
+are probed and those that stay silent are reaped in bulk
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from backend.app.services.ephemeral_store import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+BatchHandler = Callable[[List[str]], Awaitable[None]]
+
+
+class HeartbeatMonitor:
+    """Last-activity tracking per connection on a one-second timer wheel
+
+    Any inbound frame counts as activity and only stamps a timestamp; the
+    wheel holds one timer per connection and is re-armed lazily when it
+    fires. A connection idle for `interval` seconds is probed, and one
+    that sends nothing within `timeout` seconds of the probe is dead.
+    """
+
+    def __init__(self, interval: float, timeout: float):
+        self.interval = interval
+        self.timeout = timeout
+        self._wheel = TimerWheel(start_tick=self._now_tick())
+        # connection_id -> monotonic time of the last inbound frame
+        self.last_activity: Dict[str, float] = {}
+        # connection_id -> monotonic time the outstanding probe was sent
+        self.probed: Dict[str, float] = {}
+        self.probes = 0
+        self.reaped = 0
+        # How late each one-second tick woke up (ms): event-loop lag, last minute
+        self.loop_lag_ms: Deque[float] = deque(maxlen=60)
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _now_tick() -> int:
+        return int(time.monotonic())
+
+    def _arm(self, connection_id: str, at: float):
+        self._wheel.schedule(connection_id, math.ceil(at))
+
+    def track(self, connection_id: str):
+        now = time.monotonic()
+        self.last_activity[connection_id] = now
+        self._arm(connection_id, now + self.interval)
+
+    def activity(self, connection_id: str):
+        if connection_id in self.last_activity:
+            self.last_activity[connection_id] = time.monotonic()
+            self.probed.pop(connection_id, None)
+
+    def forget(self, connection_id: str):
+        self.last_activity.pop(connection_id, None)
+        self.probed.pop(connection_id, None)
+        self._wheel.cancel(connection_id)
+
+    def due(self):
+        """Advance the wheel; returns (connections to probe, dead connections)"""
+        now = time.monotonic()
+        to_probe, dead = [], []
+        for connection_id in self._wheel.advance(self._now_tick()):
+            last = self.last_activity.get(connection_id)
+            if last is None:
+                continue
+            if connection_id in self.probed:
+                dead.append(connection_id)
+                self.forget(connection_id)
+            elif now - last >= self.interval:
+                self.probed[connection_id] = now
+                self._arm(connection_id, now + self.timeout)
+                to_probe.append(connection_id)
+            else:
+                self._arm(connection_id, last + self.interval)
+        return to_probe, dead
+
+    async def _run(self, on_probe: BatchHandler, on_dead: BatchHandler):
+        while True:
+            slept_from = time.monotonic()
+            await asyncio.sleep(1)
+            self.loop_lag_ms.append(max(0.0, (time.monotonic() - slept_from - 1) * 1000))
+            try:
+                to_probe, dead = self.due()
+                if to_probe:
+                    self.probes += len(to_probe)
+                    await on_probe(to_probe)
+                if dead:
+                    self.reaped += len(dead)
+                    logger.info(f"💀 Reaping {len(dead)} unresponsive connection(s)")
+                    await on_dead(dead)
+            except Exception as e:
+                logger.error(f"❌ Heartbeat check failed: {e}")
+
+    def start(self, on_probe: BatchHandler, on_dead: BatchHandler):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(on_probe, on_dead))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "tracked": len(self.last_activity),
+            "awaiting_reply": len(self.probed),
+            "probes": self.probes,
+            "reaped": self.reaped,
+            "loop_lag_ms": {
+                "last": round(self.loop_lag_ms[-1], 2) if self.loop_lag_ms else None,
+                "max_1m": round(max(self.loop_lag_ms), 2) if self.loop_lag_ms else None
+            }
+        }
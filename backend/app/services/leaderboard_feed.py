@@ -0,0 +1,187 @@
+"""
+Leaderboard Feed
+Pushes leaderboard rank/score deltas to WebSocket subscribers whenever a
+score change affects the window they are watching
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from backend.app.services.message_bus import message_bus
+
+logger = logging.getLogger(__name__)
+
+# Score changes arriving within this window are folded into one push
+COALESCE_SECONDS = 1.0
+
+MAX_LIMIT = 50
+
+# Every worker subscribes; one message per coalesced batch of score changes
+SCORES_CHANNEL = "leaderboard:changes"
+
+# (timeframe, skill_filter, limit)
+ViewKey = Tuple[str, Optional[str], int]
+
+
+class LeaderboardFeed:
+    """Track leaderboard subscriptions and push coalesced deltas
+
+    Subscriptions belong to a connection, not a user, so two tabs can
+    watch different views. Each distinct view is recomputed once per flush
+    no matter how many connections share it. Connections whose window did
+    not change get nothing.
+    Subscribers live on the worker holding their socket, so each batch of
+    score changes is also published to the other workers, which flush
+    their own subscribers (handle_change).
+    """
+
+    def __init__(self):
+        # connection_id -> view key
+        self.subscriptions: Dict[str, ViewKey] = {}
+        # connection_id -> {entry user_id: entry} as last sent to that connection
+        self.last_sent: Dict[str, Dict[str, dict]] = {}
+        self._dirty = False
+        # A local score change the other workers haven't heard about yet
+        self._announce = False
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _view_key(timeframe: str = "all", skill_filter: Optional[str] = None, limit: int = 10) -> ViewKey:
+        if skill_filter in (None, "", "all"):
+            skill_filter = None
+        return (timeframe or "all", skill_filter, max(1, min(int(limit or 10), MAX_LIMIT)))
+
+    @staticmethod
+    def _compute(view: ViewKey) -> Dict[str, dict]:
+        from backend.app.api.leaderboard import fetch_top_leaderboard
+
+        timeframe, skill_filter, limit = view
+        return {
+            entry.user_id: entry.model_dump()
+            for entry in fetch_top_leaderboard(limit, timeframe, skill_filter)
+        }
+
+    @staticmethod
+    def _view_payload(view: ViewKey) -> dict:
+        timeframe, skill_filter, limit = view
+        return {"timeframe": timeframe, "skill_filter": skill_filter, "limit": limit}
+
+    async def subscribe(self, connection_id: str, timeframe: str = "all", skill_filter: str = None, limit: int = 10):
+        """Register (or replace) a connection's subscription and send it the initial snapshot"""
+        from backend.app.api.websocket import manager
+
+        view = self._view_key(timeframe, skill_filter, limit)
+        entries = await asyncio.to_thread(self._compute, view)
+        if manager.connections.get(connection_id) is None:
+            # Closed while the snapshot was computed
+            return
+        self.subscriptions[connection_id] = view
+        self.last_sent[connection_id] = entries
+
+        manager.send_to_connection({
+            "type": "leaderboard_snapshot",
+            "view": self._view_payload(view),
+            "entries": sorted(entries.values(), key=lambda entry: entry["rank"]),
+            "timestamp": datetime.now().isoformat()
+        }, connection_id)
+
+    def unsubscribe(self, connection_id: str):
+        self.subscriptions.pop(connection_id, None)
+        self.last_sent.pop(connection_id, None)
+
+    def notify_score_change(self):
+        """Schedule a coalesced flush here and on every other worker; cheap enough to call on every score write"""
+        self._announce = True
+        self._schedule()
+
+    def handle_change(self, message: dict):
+        """Bus callback: scores changed on another worker"""
+        if self.subscriptions:
+            self._schedule()
+
+    def _schedule(self):
+        self._dirty = True
+        if self._flush_task is None or self._flush_task.done():
+            try:
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+            except RuntimeError:
+                # Called outside the event loop (scripts); nobody to push to
+                self._dirty = self._announce = False
+
+    async def _flush_later(self):
+        await asyncio.sleep(COALESCE_SECONDS)
+        while self._dirty or self._announce:
+            if self._announce:
+                self._announce = False
+                try:
+                    await message_bus.publish(SCORES_CHANNEL, {"changed_at": datetime.now().isoformat()}, exclude_self=True)
+                except Exception as e:
+                    logger.error(f"❌ Failed to publish leaderboard change: {e}")
+            if not self._dirty:
+                continue
+            self._dirty = False
+            if not self.subscriptions:
+                continue
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Leaderboard feed flush failed: {e}")
+
+    async def start(self):
+        await message_bus.subscribe(SCORES_CHANNEL)
+
+    async def stop(self):
+        """Stop following other workers' score changes and drop any pending flush"""
+        await message_bus.unsubscribe(SCORES_CHANNEL)
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+
+    @staticmethod
+    def diff(previous: Dict[str, dict], current: Dict[str, dict]) -> Tuple[List[dict], List[str]]:
+        """Entries that are new or moved, and user ids that left the window"""
+        changes = [
+            entry for user_id, entry in current.items()
+            if user_id not in previous
+            or previous[user_id]["rank"] != entry["rank"]
+            or previous[user_id]["ai_score"] != entry["ai_score"]
+            or previous[user_id].get("window_score") != entry.get("window_score")
+            or previous[user_id].get("skill_score") != entry.get("skill_score")
+            or previous[user_id].get("peer_rating") != entry.get("peer_rating")
+        ]
+        removed = [user_id for user_id in previous if user_id not in current]
+        return changes, removed
+
+    async def flush(self):
+        """Recompute each subscribed view once and push deltas to its connections"""
+        from backend.app.api.websocket import manager
+
+        viewers: Dict[ViewKey, Set[str]] = {}
+        for connection_id, view in list(self.subscriptions.items()):
+            viewers.setdefault(view, set()).add(connection_id)
+
+        for view, connection_ids in viewers.items():
+            current = await asyncio.to_thread(self._compute, view)
+            for connection_id in connection_ids:
+                if self.subscriptions.get(connection_id) != view:
+                    continue
+                changes, removed = self.diff(self.last_sent.get(connection_id, {}), current)
+                if not changes and not removed:
+                    continue
+                self.last_sent[connection_id] = current
+                manager.send_to_connection({
+                    "type": "leaderboard_delta",
+                    "view": self._view_payload(view),
+                    "changes": sorted(changes, key=lambda entry: entry["rank"]),
+                    "removed": removed,
+                    "timestamp": datetime.now().isoformat()
+                }, connection_id)
+
+
+# Global instance
+leaderboard_feed = LeaderboardFeed()
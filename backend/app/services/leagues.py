@@ -0,0 +1,383 @@
+"""
+Leagues
+Weekly league cohorts of bounded size grouped by score band, with in-memory
+standings per cohort and promotion/demotion when the week rolls over
+"""
+import asyncio
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from backend.app.core.config import settings
+from backend.app.database import Database
+
+# Lowest to highest; (tier, minimum ai_score for users placed by score band)
+TIERS = [
+    ("bronze", 0),
+    ("silver", 40),
+    ("gold", 55),
+    ("platinum", 70),
+    ("diamond", 85)
+]
+TIER_NAMES = [tier for tier, _ in TIERS]
+
+# How often workers check whether the week has rolled over, and how long one may hold the rollover
+ROLLOVER_CHECK_SECONDS = 60
+ROLLOVER_LEASE = timedelta(minutes=10)
+
+
+def week_key(moment: datetime) -> str:
+    """ISO week, e.g. 2024-W07"""
+    year, week, _ = moment.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def week_ends_at(moment: datetime) -> datetime:
+    """Start of next Monday (UTC)"""
+    monday = datetime(moment.year, moment.month, moment.day) - timedelta(days=moment.weekday())
+    return monday + timedelta(days=7)
+
+
+def tier_for_score(ai_score: float) -> str:
+    """Initial tier for a user who has never finished a league week"""
+    placed = TIER_NAMES[0]
+    for tier, minimum in TIERS:
+        if ai_score >= minimum:
+            placed = tier
+    return placed
+
+
+class CohortStandings:
+    """Sorted set of (points, user_id) for one cohort, highest points first"""
+
+    def __init__(self, cohort_id: str, tier: str):
+        self.cohort_id = cohort_id
+        self.tier = tier
+        self.points: Dict[str, float] = {}
+        # (-points, user_id) so ties break on user id deterministically
+        self._order: List[Tuple[float, str]] = []
+
+    def __len__(self):
+        return len(self.points)
+
+    def add(self, user_id: str, points: float):
+        old = self.points.get(user_id)
+        if old is not None:
+            del self._order[bisect_left(self._order, (-old, user_id))]
+        new = (old or 0) + points
+        self.points[user_id] = new
+        insort(self._order, (-new, user_id))
+
+    def rank(self, user_id: str) -> Optional[int]:
+        points = self.points.get(user_id)
+        if points is None:
+            return None
+        return bisect_left(self._order, (-points, user_id)) + 1
+
+    def entries(self) -> List[Tuple[int, str, float]]:
+        return [(index + 1, user_id, -points) for index, (points, user_id) in enumerate(self._order)]
+
+
+class LeagueService:
+    """Assign active users to weekly cohorts and keep their standings in memory
+
+    Collection league_memberships holds one document per user per week:
+        {user_id, week, tier, cohort_id, points, joined_at, result}
+    and league_cohorts one seat counter per week and tier:
+        {_id: "<week>:<tier>", seats}
+
+    Users join a cohort the first time they earn points in a week. New users
+    are placed by ai_score band; everyone else plays in users.league_tier,
+    which the weekly rollover sets from their last cohort result. Seats are
+    handed out by an atomic counter and seat n sits in cohort n // size + 1,
+    so every worker agrees on cohort ids and no cohort outgrows the size.
+    Standings are kept per cohort in memory and reloaded from the
+    (week, cohort_id, points) index when viewed, so points earned through
+    other workers show up. The rollover runs in a background task; one
+    worker at a time holds a lease on it.
+    """
+
+    def __init__(self, size: int = None, promote: int = None, demote: int = None):
+        self.size = size or settings.league_size
+        self.promote = promote if promote is not None else settings.league_promote_count
+        self.demote = demote if demote is not None else settings.league_demote_count
+        self._week: Optional[str] = None
+        self._cohorts: Dict[str, CohortStandings] = {}
+        self._members: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self):
+        """Rebuild this week's standings from league_memberships"""
+        with self._lock:
+            week = self._current()
+            db = Database.get_db()
+            self._cohorts, self._members = {}, {}
+            for doc in db.league_memberships.find({"week": week}):
+                self._track(str(doc["user_id"]), doc["cohort_id"], doc["tier"], doc.get("points", 0))
+
+    def _track(self, user_id: str, cohort_id: str, tier: str, points: float):
+        cohort = self._cohorts.get(cohort_id)
+        if cohort is None:
+            cohort = self._cohorts[cohort_id] = CohortStandings(cohort_id, tier)
+        cohort.add(user_id, points)
+        self._members[user_id] = cohort_id
+
+    def _current(self) -> str:
+        """The current ISO week; standings of a finished week are dropped from memory"""
+        week = week_key(datetime.utcnow())
+        if self._week != week:
+            with self._lock:
+                if self._week != week:
+                    self._week = week
+                    self._cohorts, self._members = {}, {}
+        return week
+
+    def roll_if_due(self) -> bool:
+        """Settle the last recorded week if a new one has started; returns whether this call did it
+
+        A lease on score_meta["leagues"] makes sure only one worker settles
+        a week. If that worker dies mid-way the lease lapses and another one
+        retries; rollover() is idempotent.
+        """
+        db = Database.get_db()
+        week = week_key(datetime.utcnow())
+        now = datetime.utcnow()
+        try:
+            # First deployment: nothing to settle yet
+            db.score_meta.insert_one({"_id": "leagues", "week": week, "rolled_at": now})
+            return False
+        except DuplicateKeyError:
+            pass
+
+        meta = db.score_meta.find_one_and_update(
+            {
+                "_id": "leagues",
+                "week": {"$ne": week},
+                "$or": [{"lock_until": None}, {"lock_until": {"$lt": now}}]
+            },
+            {"$set": {"lock_until": now + ROLLOVER_LEASE}}
+        )
+        if meta is None:
+            return False
+
+        try:
+            self.rollover(meta["week"])
+        except Exception:
+            db.score_meta.update_one({"_id": "leagues"}, {"$unset": {"lock_until": ""}})
+            raise
+        db.score_meta.update_one(
+            {"_id": "leagues"},
+            {"$set": {"week": week, "rolled_at": datetime.utcnow()}, "$unset": {"lock_until": ""}}
+        )
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.roll_if_due)
+            except Exception as e:
+                print(f"⚠️ League rollover failed: {e}")
+            # Wake up right after the week ends, and check at least every minute
+            now = datetime.utcnow()
+            until_week_end = (week_ends_at(now) - now).total_seconds()
+            await asyncio.sleep(max(1.0, min(ROLLOVER_CHECK_SECONDS, until_week_end + 1)))
+
+    def start(self):
+        """Start the weekly rollover task (idempotent)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def rollover(self, week: str):
+        """Promote/demote every cohort of a finished week in one ordered scan"""
+        db = Database.get_db()
+        membership_updates = []
+        user_updates = []
+
+        def settle(members: List[Dict]):
+            size = len(members)
+            for index, member in enumerate(members):
+                tier_index = TIER_NAMES.index(member["tier"])
+                result, next_index = "stayed", tier_index
+                if index < self.promote and member.get("points", 0) > 0 and tier_index < len(TIERS) - 1:
+                    result, next_index = "promoted", tier_index + 1
+                elif size > self.promote + self.demote and index >= size - self.demote and tier_index > 0:
+                    result, next_index = "demoted", tier_index - 1
+                membership_updates.append(UpdateOne(
+                    {"_id": member["_id"]},
+                    {"$set": {"rank": index + 1, "result": result}}
+                ))
+                user_updates.append(UpdateOne(
+                    {"_id": member["user_id"]},
+                    {"$set": {"league_tier": TIER_NAMES[next_index]}}
+                ))
+
+        members: List[Dict] = []
+        cursor = db.league_memberships.find(
+            {"week": week},
+            {"user_id": 1, "tier": 1, "cohort_id": 1, "points": 1}
+        ).sort([("cohort_id", 1), ("points", -1)])
+        for member in cursor:
+            if members and members[0]["cohort_id"] != member["cohort_id"]:
+                settle(members)
+                members = []
+            members.append(member)
+        if members:
+            settle(members)
+
+        if membership_updates:
+            db.league_memberships.bulk_write(membership_updates, ordered=False)
+            db.users.bulk_write(user_updates, ordered=False)
+        print(f"✅ Leagues rolled over from {week} ({len(membership_updates)} members)")
+
+    def _join(self, user_id: str, week: str) -> Optional[str]:
+        """Place a user in the next free seat of their tier; returns the cohort id"""
+        db = Database.get_db()
+        existing = db.league_memberships.find_one({"user_id": ObjectId(user_id), "week": week})
+        if existing:
+            # Joined through another worker
+            self._track(user_id, existing["cohort_id"], existing["tier"], existing.get("points", 0))
+            return existing["cohort_id"]
+
+        user = db.users.find_one({"_id": ObjectId(user_id)}, {"email": 1, "ai_score": 1, "league_tier": 1})
+        if not user or user.get("email", "").lower() in settings.get_test_account_emails():
+            return None
+
+        tier = user.get("league_tier") or tier_for_score(user.get("ai_score", 0.0))
+        seat = db.league_cohorts.find_one_and_update(
+            {"_id": f"{week}:{tier}"},
+            {"$inc": {"seats": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )["seats"]
+        cohort_id = f"{week}-{tier}-{(seat - 1) // self.size + 1}"
+
+        membership = db.league_memberships.find_one_and_update(
+            {"user_id": user["_id"], "week": week},
+            {"$setOnInsert": {
+                "tier": tier,
+                "cohort_id": cohort_id,
+                "points": 0,
+                "joined_at": datetime.utcnow()
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._track(user_id, membership["cohort_id"], membership["tier"], membership.get("points", 0))
+        return membership["cohort_id"]
+
+    def record_points(self, user_id, points: float):
+        """Add points to the user's cohort, joining one on the first positive points of the week"""
+        if not points:
+            return
+        user_id = str(user_id)
+
+        with self._lock:
+            week = self._current()
+            cohort_id = self._members.get(user_id)
+            if cohort_id is None:
+                if points < 0:
+                    return
+                cohort_id = self._join(user_id, week)
+                if cohort_id is None:
+                    return
+
+            db = Database.get_db()
+            db.league_memberships.update_one(
+                {"user_id": ObjectId(user_id), "week": week},
+                {"$inc": {"points": points}}
+            )
+            self._cohorts[cohort_id].add(user_id, points)
+
+    def standings(self, user_id) -> Dict:
+        """The user's cohort with ranks and promotion/demotion zones"""
+        user_id = str(user_id)
+        now = datetime.utcnow()
+
+        week = self._current()
+        db = Database.get_db()
+        with self._lock:
+            cohort_id = self._members.get(user_id)
+        if cohort_id is None:
+            membership = db.league_memberships.find_one(
+                {"user_id": ObjectId(user_id), "week": week}, {"cohort_id": 1}
+            )
+            cohort_id = membership["cohort_id"] if membership else None
+        if cohort_id is None:
+            user = db.users.find_one({"_id": ObjectId(user_id)}, {"ai_score": 1, "league_tier": 1}) or {}
+            return {
+                "week": week,
+                "ends_at": week_ends_at(now),
+                "joined": False,
+                "tier": user.get("league_tier") or tier_for_score(user.get("ai_score", 0.0))
+            }
+
+        # Reload the cohort (at most `size` documents) to include points earned on other workers
+        docs = list(db.league_memberships.find(
+            {"week": week, "cohort_id": cohort_id}, {"user_id": 1, "tier": 1, "points": 1}
+        ))
+        with self._lock:
+            cohort = CohortStandings(cohort_id, docs[0]["tier"])
+            for doc in docs:
+                cohort.add(str(doc["user_id"]), doc.get("points", 0))
+                self._members[str(doc["user_id"])] = cohort_id
+            self._cohorts[cohort_id] = cohort
+            entries = cohort.entries()
+            my_rank = cohort.rank(user_id)
+
+        names = {
+            str(user["_id"]): user
+            for user in db.users.find(
+                {"_id": {"$in": [ObjectId(member_id) for _, member_id, _ in entries]}},
+                {"name": 1, "avatar_url": 1}
+            )
+        }
+
+        size = len(entries)
+        tier_index = TIER_NAMES.index(cohort.tier)
+        members = []
+        for rank, member_id, points in entries:
+            zone = None
+            # Same rule as rollover(): promotion needs points this week
+            if rank <= self.promote and points > 0 and tier_index < len(TIERS) - 1:
+                zone = "promotion"
+            elif size > self.promote + self.demote and rank > size - self.demote and tier_index > 0:
+                zone = "demotion"
+            members.append({
+                "rank": rank,
+                "user_id": member_id,
+                "name": names.get(member_id, {}).get("name", "User"),
+                "avatar_url": names.get(member_id, {}).get("avatar_url"),
+                "points": round(points, 2),
+                "zone": zone,
+                "is_me": member_id == user_id
+            })
+
+        return {
+            "week": week,
+            "ends_at": week_ends_at(now),
+            "joined": True,
+            "tier": cohort.tier,
+            "cohort_id": cohort_id,
+            "rank": my_rank,
+            "size": size,
+            "members": members
+        }
+
+
+# Global instance
+leagues = LeagueService()
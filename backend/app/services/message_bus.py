@@ -0,0 +1,207 @@
+"""
+Message Bus
+Pub/sub transport that routes WebSocket messages to whichever worker holds
+the target connection: Redis in production, in-memory for a single worker
+and tests
+"""
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Every connected user has a channel; only the worker holding them subscribes
+USER_CHANNEL_PREFIX = "ws:user:"
+
+Handler = Callable[[str, dict], Awaitable[None]]
+
+
+def user_channel(user_id: str) -> str:
+    return f"{USER_CHANNEL_PREFIX}{user_id}"
+
+
+class MessageBus(ABC):
+    """Interface shared by the bus implementations"""
+
+    @abstractmethod
+    async def start(self, handler: Handler):
+        """Begin delivering messages on subscribed channels to handler(channel, message)"""
+        ...
+
+    @abstractmethod
+    async def stop(self):
+        ...
+
+    @abstractmethod
+    async def subscribe(self, channel: str):
+        ...
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str):
+        ...
+
+    @abstractmethod
+    async def publish(self, channel: str, message: dict, encoded: str = None, exclude_self: bool = False) -> int:
+        """Publish a message (optionally already JSON-encoded); returns how many subscribers received it
+        
+        With exclude_self the publishing worker doesn't receive its own
+        message, for when it has already delivered to its local connections.
+        """
+        ...
+
+    @abstractmethod
+    async def subscriber_count(self, channel: str) -> int:
+        ...
+
+    @abstractmethod
+    async def channels(self, prefix: str) -> List[str]:
+        """Channels with at least one subscriber, across all workers"""
+        ...
+
+
+class InMemoryBroker:
+    """Shared state for InMemoryMessageBus instances (one per simulated worker)"""
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set["InMemoryMessageBus"]] = {}
+
+
+class InMemoryMessageBus(MessageBus):
+    """Process-local bus; several instances sharing a broker behave like workers"""
+
+    def __init__(self, broker: InMemoryBroker = None):
+        self.broker = broker or InMemoryBroker()
+        self.handler: Optional[Handler] = None
+        self.subscribed: Set[str] = set()
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+
+    async def stop(self):
+        for channel in list(self.subscribed):
+            await self.unsubscribe(channel)
+        self.handler = None
+
+    async def subscribe(self, channel: str):
+        self.subscribed.add(channel)
+        self.broker.subscribers.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, channel: str):
+        self.subscribed.discard(channel)
+        buses = self.broker.subscribers.get(channel)
+        if buses:
+            buses.discard(self)
+            if not buses:
+                del self.broker.subscribers[channel]
+
+    async def publish(self, channel: str, message: dict, encoded: str = None, exclude_self: bool = False) -> int:
+        buses = [
+            bus for bus in self.broker.subscribers.get(channel, ())
+            if not (exclude_self and bus is self)
+        ]
+        if not buses:
+            return 0
+        # Round-trip through JSON so tests see exactly what Redis would carry
+        payload = json.loads(encoded or json.dumps(message, default=str))
+        for bus in buses:
+            if bus.handler:
+                await bus.handler(channel, payload)
+        return len(buses)
+
+    async def subscriber_count(self, channel: str) -> int:
+        return len(self.broker.subscribers.get(channel, ()))
+
+    async def channels(self, prefix: str) -> List[str]:
+        return [channel for channel in self.broker.subscribers if channel.startswith(prefix)]
+
+
+class RedisMessageBus(MessageBus):
+    """Redis pub/sub bus; one connection for commands, one for the subscriber loop
+
+    Payloads travel in an envelope {"skip": worker id or null, "message": ...}
+    so a worker can publish to a channel it also subscribes to without
+    receiving its own message back.
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio as aioredis
+
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self._pubsub = self._redis.pubsub()
+        self.handler: Optional[Handler] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            if not self._pubsub.subscribed:
+                await asyncio.sleep(0.1)
+                continue
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message["type"] == "message" and self.handler:
+                    envelope = json.loads(message["data"])
+                    if envelope.get("skip") != self.id:
+                        await self.handler(message["channel"], envelope["message"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Message bus receive failed: {e}")
+                await asyncio.sleep(1)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._pubsub.close()
+        await self._redis.close()
+
+    async def subscribe(self, channel: str):
+        await self._pubsub.subscribe(channel)
+
+    async def unsubscribe(self, channel: str):
+        await self._pubsub.unsubscribe(channel)
+
+    async def publish(self, channel: str, message: dict, encoded: str = None, exclude_self: bool = False) -> int:
+        skip = json.dumps(self.id if exclude_self else None)
+        envelope = f'{{"skip":{skip},"message":{encoded or json.dumps(message, default=str)}}}'
+        received = await self._redis.publish(channel, envelope)
+        if exclude_self and channel in self._pubsub.channels:
+            received -= 1
+        return max(received, 0)
+
+    async def subscriber_count(self, channel: str) -> int:
+        counts = await self._redis.pubsub_numsub(channel)
+        return counts[0][1] if counts else 0
+
+    async def channels(self, prefix: str) -> List[str]:
+        return await self._redis.pubsub_channels(f"{prefix}*")
+
+
+def create_message_bus() -> MessageBus:
+    """Redis when REDIS_URL is configured, otherwise the in-memory bus"""
+    if settings.redis_url:
+        try:
+            return RedisMessageBus(settings.redis_url)
+        except ImportError:
+            logger.warning("⚠️ REDIS_URL is set but the redis package is missing; using in-memory message bus")
+    return InMemoryMessageBus()
+
+
+# Global instance
+message_bus = create_message_bus()
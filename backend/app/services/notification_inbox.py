@@ -0,0 +1,76 @@
+"""
+Notification Inbox
+Persisted per-user notifications (friend requests, call invites) so nothing
+is lost while the recipient is offline: handed over in one batch when they
+connect and removed once the client acknowledges them by sequence number
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import List
+
+from pymongo import ReturnDocument
+
+from backend.app.core.config import settings
+from backend.app.database import Database
+
+
+class NotificationInbox:
+    """notifications: {user_id, seq, message, created_at, expires_at}
+
+    seq comes from a per-user counter in notification_counters, so an ack
+    of N covers everything up to N. Each user keeps at most `max_per_user`
+    entries (older ones are trimmed on insert) and a TTL index on
+    expires_at drops stale ones, e.g. call invites nobody answered.
+    """
+
+    def __init__(self, max_per_user: int):
+        self.max_per_user = max_per_user
+
+    def _add(self, user_id: str, message: dict, ttl: float) -> dict:
+        db = Database.get_db()
+        counter = db.notification_counters.find_one_and_update(
+            {"_id": user_id},
+            {"$inc": {"seq": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        seq = counter["seq"]
+        now = datetime.utcnow()
+        db.notifications.insert_one({
+            "user_id": user_id,
+            "seq": seq,
+            "message": message,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=ttl)
+        })
+        if seq > self.max_per_user:
+            db.notifications.delete_many({"user_id": user_id, "seq": {"$lte": seq - self.max_per_user}})
+        return {**message, "inbox_seq": seq}
+
+    def _pending(self, user_id: str) -> List[dict]:
+        db = Database.get_db()
+        # The TTL monitor runs about once a minute; skip what it hasn't removed yet
+        cursor = db.notifications.find(
+            {"user_id": user_id, "expires_at": {"$gt": datetime.utcnow()}}
+        ).sort("seq", 1).limit(self.max_per_user)
+        return [{**doc["message"], "inbox_seq": doc["seq"]} for doc in cursor]
+
+    def _ack(self, user_id: str, seq: int) -> int:
+        db = Database.get_db()
+        return db.notifications.delete_many({"user_id": user_id, "seq": {"$lte": seq}}).deleted_count
+
+    async def add(self, user_id: str, message: dict, ttl: float) -> dict:
+        """Store a notification; returns the message tagged with its inbox_seq"""
+        return await asyncio.to_thread(self._add, user_id, message, ttl)
+
+    async def pending(self, user_id: str) -> List[dict]:
+        """Unacknowledged notifications, oldest first"""
+        return await asyncio.to_thread(self._pending, user_id)
+
+    async def ack(self, user_id: str, seq: int) -> int:
+        """Remove every notification up to and including seq"""
+        return await asyncio.to_thread(self._ack, user_id, seq)
+
+
+# Global instance
+notification_inbox = NotificationInbox(settings.notification_inbox_size)
@@ -0,0 +1,240 @@
+"""
+Outbound Queue
+Bounded per-connection send queues drained by a writer task, with
+per-message-type overflow policies and queue metrics
+"""
+import asyncio
+import logging
+from collections import Counter, deque
+from typing import Awaitable, Callable, Deque, Dict, NamedTuple, Optional, Union
+
+from backend.app.services.ws_codec import JSON, MSGPACK, encode_json, encode_msgpack, json_with_seq, msgpack_with_seq
+
+logger = logging.getLogger(__name__)
+
+# Overflow policies
+DROP_OLDEST = "drop_oldest"  # evict the oldest queued message of the same type
+DROP_NEW = "drop_new"        # discard the incoming message
+CRITICAL = "critical"        # never dropped; evicts droppable messages instead
+
+# Message type -> policy; anything not listed is CRITICAL (call invites, signaling, ...)
+OVERFLOW_POLICIES: Dict[str, str] = {
+    "transcription": DROP_OLDEST,
+    "pong": DROP_NEW,
+    "heartbeat": DROP_NEW,
+    "online_status": DROP_NEW
+}
+
+
+class EncodedMessage:
+    """A message serialized at most once per wire format, shared by every recipient's queue"""
+
+    __slots__ = ("type", "message", "_text", "_binary")
+
+    def __init__(self, message: dict):
+        self.type: Optional[str] = message.get("type")
+        self.message = message
+        self._text: Optional[str] = None
+        self._binary: Optional[bytes] = None
+
+    @classmethod
+    def encode(cls, message: dict) -> "EncodedMessage":
+        return cls(message)
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = encode_json(self.message)
+        return self._text
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = encode_msgpack(self.message)
+        return self._binary
+
+
+class Sequenced(NamedTuple):
+    """A message in a user's replayable stream; seq is added to the frame as it is written"""
+    seq: int
+    message: EncodedMessage
+
+
+Outbound = Union[dict, EncodedMessage, Sequenced]
+
+
+def message_type(item: Outbound) -> Optional[str]:
+    if isinstance(item, Sequenced):
+        item = item.message
+    return item.type if isinstance(item, EncodedMessage) else item.get("type")
+
+
+class OutboundMetrics:
+    """Counters shared by every queue of a worker"""
+
+    def __init__(self):
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped: Counter = Counter()
+        self.send_failures = 0
+        self.overflow_disconnects = 0
+
+    def snapshot(self, queues: Dict[str, "OutboundQueue"], top: int = 10) -> Dict:
+        depths = sorted(((queue.depth, key) for key, queue in queues.items()), reverse=True)
+        return {
+            "connections": len(queues),
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "dropped": dict(self.dropped),
+            "dropped_total": sum(self.dropped.values()),
+            "send_failures": self.send_failures,
+            "overflow_disconnects": self.overflow_disconnects,
+            "queued_total": sum(depth for depth, _ in depths),
+            "max_depth": depths[0][0] if depths else 0,
+            "deepest": [
+                {
+                    "user_id": queues[key].user_id,
+                    "connection_id": queues[key].connection_id,
+                    "depth": depth,
+                    "high_water": queues[key].high_water
+                }
+                for depth, key in depths[:top] if depth
+            ]
+        }
+
+
+FailureHandler = Callable[["OutboundQueue", str], Awaitable[None]]
+
+
+class OutboundQueue:
+    """Messages waiting to be written to one WebSocket
+
+    put() never awaits the socket, so a slow client only delays itself.
+    When the queue is full the message type's policy decides what gives.
+    Critical messages may push the queue up to twice its size; a client
+    that falls that far behind is treated as stuck and disconnected.
+    """
+
+    def __init__(
+        self,
+        websocket,
+        user_id: str,
+        maxsize: int,
+        send_timeout: float,
+        metrics: OutboundMetrics,
+        on_failure: FailureHandler,
+        policies: Dict[str, str] = None,
+        connection_id: str = None,
+        codec: str = JSON
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.connection_id = connection_id
+        self.codec = codec
+        self.maxsize = maxsize
+        self.send_timeout = send_timeout
+        self.metrics = metrics
+        self.on_failure = on_failure
+        self.policies = policies if policies is not None else OVERFLOW_POLICIES
+        self.high_water = 0
+        self._items: Deque[Outbound] = deque()
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._failed = False
+
+    @property
+    def depth(self) -> int:
+        return len(self._items)
+
+    def _policy(self, message: Outbound) -> str:
+        return self.policies.get(message_type(message), CRITICAL)
+
+    def _drop(self, message: Outbound):
+        self.metrics.dropped[message_type(message) or "unknown"] += 1
+
+    def _evict(self, only_type: Optional[str] = None) -> bool:
+        """Remove the oldest droppable message (of a given type, if set)"""
+        for index, queued in enumerate(self._items):
+            if self._policy(queued) == CRITICAL:
+                continue
+            if only_type is None or message_type(queued) == only_type:
+                del self._items[index]
+                self._drop(queued)
+                return True
+        return False
+
+    def put(self, message: Outbound) -> bool:
+        """Queue a message; returns False if it was dropped"""
+        if self._failed:
+            return False
+
+        if len(self._items) >= self.maxsize:
+            policy = self._policy(message)
+            if policy == DROP_NEW:
+                self._drop(message)
+                return False
+            if policy == DROP_OLDEST:
+                if not self._evict(message_type(message)):
+                    self._drop(message)
+                    return False
+            elif not self._evict() and len(self._items) >= self.maxsize * 2:
+                self.metrics.overflow_disconnects += 1
+                self._fail(f"outbound queue overflow ({len(self._items)} messages)")
+                return False
+
+        self._items.append(message)
+        self.metrics.enqueued += 1
+        self.high_water = max(self.high_water, len(self._items))
+        self._ready.set()
+        return True
+
+    def _fail(self, reason: str):
+        if self._failed:
+            return
+        self._failed = True
+        self._items.clear()
+        asyncio.create_task(self.on_failure(self, reason))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain())
+
+    async def _drain(self):
+        while True:
+            if not self._items:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            message = self._items.popleft()
+            try:
+                seq = None
+                if isinstance(message, Sequenced):
+                    seq, message = message
+                elif not isinstance(message, EncodedMessage):
+                    message = EncodedMessage(message)
+                if self.codec == MSGPACK:
+                    frame = message.binary
+                    send = self.websocket.send_bytes(frame if seq is None else msgpack_with_seq(frame, seq))
+                else:
+                    frame = message.text
+                    send = self.websocket.send_text(frame if seq is None else json_with_seq(frame, seq))
+                await asyncio.wait_for(send, self.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.metrics.send_failures += 1
+                self._fail(f"send failed: {e!r}")
+                return
+            self.metrics.sent += 1
+
+    async def close(self):
+        """Stop the writer; anything still queued is discarded"""
+        self._failed = True
+        if self._task and self._task is not asyncio.current_task():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._items.clear()
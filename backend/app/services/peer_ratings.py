@@ -0,0 +1,101 @@
+"""
+Peer Ratings
+Per-user running peer-rating aggregates with a Bayesian-smoothed mean,
+updated atomically when a partner rating is submitted
+"""
+from typing import Dict, List
+
+from bson import ObjectId
+
+from backend.app.core.config import settings
+from backend.app.database import Database
+
+
+class PeerRatingStore:
+    """Maintain peer_rating_* fields on user documents
+
+    peer_rating_count / peer_rating_sum are raw running totals.
+    peer_rating is the Bayesian mean
+        (prior_weight * prior_mean + sum) / (prior_weight + count)
+    so a single 5-star rating doesn't outrank a long track record.
+    """
+
+    def __init__(self, prior_mean: float = None, prior_weight: float = None):
+        self.prior_mean = prior_mean if prior_mean is not None else settings.peer_rating_prior_mean
+        self.prior_weight = prior_weight if prior_weight is not None else settings.peer_rating_prior_weight
+
+    def record(self, user_id, rating: float, previous_rating: float = None):
+        """Add a rating, or replace one the same rater gave earlier for the same call"""
+        if previous_rating is None:
+            count_delta, sum_delta = 1, rating
+        else:
+            count_delta, sum_delta = 0, rating - previous_rating
+
+        db = Database.get_db()
+        db.users.update_one(
+            {"_id": ObjectId(str(user_id))},
+            [
+                {"$set": {
+                    "peer_rating_count": {"$add": [{"$ifNull": ["$peer_rating_count", 0]}, count_delta]},
+                    "peer_rating_sum": {"$add": [{"$ifNull": ["$peer_rating_sum", 0]}, sum_delta]}
+                }},
+                {"$set": {
+                    "peer_rating": {"$round": [
+                        {"$divide": [
+                            {"$add": [self.prior_weight * self.prior_mean, "$peer_rating_sum"]},
+                            {"$add": [self.prior_weight, "$peer_rating_count"]}
+                        ]},
+                        3
+                    ]}
+                }}
+            ]
+        )
+
+    def rebuild(self):
+        """Backfill the aggregates from the ratings stored on calls
+
+        Full scan; only meant for first deployment or repair.
+        """
+        db = Database.get_db()
+        db.calls.aggregate([
+            # caller_peer_rating is the rating the caller received, and vice versa
+            {"$project": {"ratings": [
+                {"user_id": "$caller_id", "rating": "$caller_peer_rating"},
+                {"user_id": "$receiver_id", "rating": "$receiver_peer_rating"}
+            ]}},
+            {"$unwind": "$ratings"},
+            {"$match": {"ratings.rating": {"$type": "number"}}},
+            {"$group": {
+                "_id": "$ratings.user_id",
+                "peer_rating_count": {"$sum": 1},
+                "peer_rating_sum": {"$sum": "$ratings.rating"}
+            }},
+            {"$set": {
+                "peer_rating": {"$round": [
+                    {"$divide": [
+                        {"$add": [self.prior_weight * self.prior_mean, "$peer_rating_sum"]},
+                        {"$add": [self.prior_weight, "$peer_rating_count"]}
+                    ]},
+                    3
+                ]}
+            }},
+            {"$merge": {"into": "users", "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+        ])
+        print("✅ Peer rating aggregates rebuilt")
+
+    def top(self, limit: int = 10, exclude_emails: List[str] = None) -> List[Dict]:
+        """Users ranked by smoothed peer rating"""
+        db = Database.get_db()
+
+        exclude_emails = exclude_emails or []
+        users = db.users.find(
+            {"peer_rating_count": {"$gt": 0}},
+            {"name": 1, "email": 1, "avatar_url": 1, "ai_score": 1, "total_calls": 1,
+             "avg_fluency_score": 1, "peer_rating": 1, "peer_rating_count": 1}
+        ).sort("peer_rating", -1).limit(limit + len(exclude_emails))
+
+        return [user for user in users if user.get("email") not in exclude_emails][:limit]
+
+
+# Global instance
+peer_ratings = PeerRatingStore()
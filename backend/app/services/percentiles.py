@@ -0,0 +1,253 @@
+"""
+Percentile Service
+Streaming KLL quantile sketches of per-user average fluency, WPM and call
+duration, fed whenever an average changes and checkpointed to MongoDB
+"""
+import asyncio
+import math
+import random
+import threading
+from bisect import bisect_right
+from datetime import datetime
+from itertools import accumulate
+from typing import Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from backend.app.core.config import settings
+from backend.app.database import Database
+
+# Metrics tracked by the service: per-user averages, the same figures the
+# percentiles endpoint looks up for a user. ai_score is not one of them: its
+# percentile is exact from the rankable_ai_score index (see leaderboard.py)
+METRICS = ["avg_fluency", "avg_wpm", "avg_call_duration"]
+
+
+class KLLSketch:
+    """KLL quantile sketch (Karnin, Lang & Liberty, 2016)
+
+    Keeps O(k) items no matter how many values it has seen. Level h holds
+    items of weight 2**h; a full level sorts itself and promotes every
+    other item (random offset) to the level above.
+
+    Error bound: with high probability the normalized rank error of any
+    single query is at most about 1.854 / k**0.9657. That is about 1.1% at
+    k=200 (the empirical 99%-confidence figure published for KLL). Answers
+    are exact until the first compaction.
+    """
+
+    def __init__(self, k: int = 200, c: float = 2 / 3, seed: int = None):
+        self.k = k
+        self.c = c
+        self.n = 0
+        self.levels: List[List[float]] = [[]]
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sorted: Optional[List[float]] = None
+        self._cumulative: Optional[List[int]] = None
+
+    @property
+    def rank_error(self) -> float:
+        """Normalized rank error bound (0 while the sketch is still exact)"""
+        if len(self.levels) == 1:
+            return 0.0
+        return 1.854 / self.k ** 0.9657
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * self.c ** depth)))
+
+    def _compact(self):
+        """Compact every full level, cascading upwards"""
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) >= self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items.sort()
+                # Keep the odd item out (if any) at this level
+                leftover = [items.pop()] if len(items) % 2 else []
+                offset = self._rng.randint(0, 1)
+                self.levels[level + 1].extend(items[offset::2])
+                self.levels[level] = leftover
+            level += 1
+
+    def add(self, value: float):
+        with self._lock:
+            self.levels[0].append(float(value))
+            self.n += 1
+            self._sorted = None
+            if len(self.levels[0]) >= self._capacity(0):
+                self._compact()
+
+    def merge(self, other: "KLLSketch"):
+        """Fold another sketch into this one"""
+        with self._lock:
+            while len(self.levels) < len(other.levels):
+                self.levels.append([])
+            for level, items in enumerate(other.levels):
+                self.levels[level].extend(items)
+            self.n += other.n
+            self._sorted = None
+            while any(len(items) >= self._capacity(level) for level, items in enumerate(self.levels)):
+                self._compact()
+
+    def _index(self):
+        """Sorted values with cumulative weights; rebuilt lazily after writes"""
+        with self._lock:
+            if self._sorted is None:
+                weighted = sorted(
+                    (value, 1 << level)
+                    for level, items in enumerate(self.levels)
+                    for value in items
+                )
+                self._sorted = [value for value, _ in weighted]
+                self._cumulative = list(accumulate(weight for _, weight in weighted))
+            return self._sorted, self._cumulative
+
+    def rank(self, value: float) -> float:
+        """Fraction of observed values <= value"""
+        values, cumulative = self._index()
+        if not values:
+            return 0.0
+        position = bisect_right(values, value)
+        if position == 0:
+            return 0.0
+        return cumulative[position - 1] / cumulative[-1]
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Smallest value whose rank is >= q"""
+        values, cumulative = self._index()
+        if not values:
+            return None
+        target = max(0.0, min(1.0, q)) * cumulative[-1]
+        position = min(len(values) - 1, bisect_right(cumulative, target - 1e-9))
+        return values[position]
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {"k": self.k, "c": self.c, "n": self.n, "levels": [list(items) for items in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "KLLSketch":
+        sketch = cls(k=data.get("k", 200), c=data.get("c", 2 / 3))
+        sketch.n = data.get("n", 0)
+        sketch.levels = [list(items) for items in data.get("levels", [[]])] or [[]]
+        return sketch
+
+
+class PercentileService:
+    """One KLL sketch per metric, shared by all workers through the quantile_sketches collection
+
+    Every metric is a per-user average, observed each time it changes (a
+    user's earlier averages stay in the sketch). Each worker answers from its copy of the shared sketch and keeps the
+    values it observed since its last checkpoint in a pending sketch. A
+    checkpoint merges the pending sketch into the stored one (guarded by a
+    version number, retried on conflict) and adopts the result, so workers
+    add to one distribution instead of overwriting each other's. A value
+    observed on one worker shows up in another's answers once both have
+    checkpointed, i.e. within about 2 * checkpoint_seconds.
+    """
+
+    def __init__(self, k: int = 200, checkpoint_seconds: float = 300):
+        self.k = k
+        self.checkpoint_seconds = checkpoint_seconds
+        self.sketches: Dict[str, KLLSketch] = {metric: KLLSketch(k) for metric in METRICS}
+        # Observations not yet merged into the stored sketches
+        self.pending: Dict[str, KLLSketch] = {metric: KLLSketch(k) for metric in METRICS}
+        self._task: Optional[asyncio.Task] = None
+
+    def observe(self, metric: str, value: float):
+        if value is None:
+            return
+        self.sketches[metric].add(value)
+        self.pending[metric].add(value)
+
+    def percentile(self, metric: str, value: float) -> Dict:
+        """Percentile (0-100) of a value with its error bound in percentile points"""
+        sketch = self.sketches[metric]
+        return {
+            "value": value,
+            "percentile": round(sketch.rank(value) * 100, 2),
+            "error_bound": round(sketch.rank_error * 100, 2),
+            "sample_size": sketch.n
+        }
+
+    def _merge_into_stored(self, metric: str, pending: KLLSketch) -> KLLSketch:
+        """Merge pending observations into the stored sketch; returns the merged sketch"""
+        db = Database.get_db()
+        while True:
+            doc = db.quantile_sketches.find_one({"_id": metric})
+            merged = KLLSketch.from_dict(doc) if doc else KLLSketch(self.k)
+            if pending.n == 0:
+                # Nothing new here; just pick up what other workers merged
+                return merged
+            merged.merge(pending)
+            version = doc.get("version", 0) if doc else 0
+            replacement = {
+                "_id": metric,
+                **merged.to_dict(),
+                "version": version + 1,
+                "checkpointed_at": datetime.utcnow()
+            }
+            if doc is None:
+                try:
+                    db.quantile_sketches.insert_one(replacement)
+                    return merged
+                except DuplicateKeyError:
+                    continue
+            # Checkpoints written before versioning have no version field
+            guard = {"_id": metric, "version": version} if "version" in doc else {"_id": metric, "version": {"$exists": False}}
+            if db.quantile_sketches.replace_one(guard, replacement).modified_count:
+                return merged
+
+    def checkpoint(self):
+        for metric in METRICS:
+            pending, self.pending[metric] = self.pending[metric], KLLSketch(self.k)
+            try:
+                merged = self._merge_into_stored(metric, pending)
+            except Exception:
+                # Keep the observations for the next attempt
+                self.pending[metric].merge(pending)
+                raise
+            # Values observed while merging are still pending; count them locally too
+            merged.merge(KLLSketch.from_dict(self.pending[metric].to_dict()))
+            self.sketches[metric] = merged
+
+    def load(self):
+        """Restore sketches from the shared checkpoint"""
+        db = Database.get_db()
+        for doc in db.quantile_sketches.find({"_id": {"$in": METRICS}}):
+            self.sketches[doc["_id"]] = KLLSketch.from_dict(doc)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.checkpoint_seconds)
+            try:
+                await asyncio.to_thread(self.checkpoint)
+            except Exception as e:
+                print(f"⚠️ Failed to checkpoint percentile sketches: {e}")
+
+    def start(self):
+        """Start periodic checkpointing (idempotent)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop checkpointing and write a final checkpoint"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.checkpoint)
+
+
+# Global instance
+percentile_service = PercentileService(
+    k=settings.percentile_sketch_k,
+    checkpoint_seconds=settings.percentile_checkpoint_seconds
+)
@@ -0,0 +1,308 @@
+"""
+Presence
+Single source of truth for who is online, driven by WebSocket connects and
+TTL refreshes, with coalesced online/offline diffs pushed to watchers
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from bson import ObjectId
+
+from backend.app.core.config import settings
+from backend.app.database import Database
+from backend.app.services.ephemeral_store import TimerWheel
+from backend.app.services.message_bus import message_bus
+
+logger = logging.getLogger(__name__)
+
+# Every worker subscribes; carries {"user_id": ..., "online": bool}
+PRESENCE_CHANNEL = "presence:changes"
+
+# Changes arriving within this window are folded into one push per watcher
+COALESCE_SECONDS = 0.25
+
+
+class MemoryPresence:
+    """Process-local online set; a user is online until their deadline passes"""
+
+    def __init__(self):
+        # user_id -> deadline tick (seconds)
+        self._deadlines: Dict[str, int] = {}
+        self._wheel = TimerWheel(start_tick=self._now())
+
+    @staticmethod
+    def _now() -> int:
+        return int(time.monotonic())
+
+    async def touch(self, user_ids: Iterable[str], ttl: float) -> List[str]:
+        """Refresh users' deadlines; returns the ones that were offline"""
+        deadline = self._wheel.current + max(1, int(ttl))
+        appeared = []
+        for user_id in user_ids:
+            if user_id not in self._deadlines:
+                appeared.append(user_id)
+            self._deadlines[user_id] = deadline
+            self._wheel.schedule(user_id, deadline)
+        return appeared
+
+    async def remove(self, user_id: str) -> bool:
+        self._wheel.cancel(user_id)
+        return self._deadlines.pop(user_id, None) is not None
+
+    async def expire(self) -> List[str]:
+        """Drop users whose deadline passed; returns them"""
+        lapsed = self._wheel.advance(self._now())
+        for user_id in lapsed:
+            self._deadlines.pop(user_id, None)
+        return lapsed
+
+    async def online(self, user_ids: Iterable[str]) -> Set[str]:
+        return {user_id for user_id in user_ids if user_id in self._deadlines}
+
+    async def all_online(self) -> Set[str]:
+        return set(self._deadlines)
+
+
+class RedisPresence:
+    """Online set shared by all workers: a sorted set scored by expiry time"""
+
+    KEY = "presence:online"
+
+    def __init__(self, url: str):
+        import redis.asyncio as aioredis
+
+        self._redis = aioredis.from_url(url, decode_responses=True)
+
+    async def touch(self, user_ids: Iterable[str], ttl: float) -> List[str]:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return []
+        now = time.time()
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zmscore(self.KEY, user_ids)
+            pipe.zadd(self.KEY, {user_id: now + ttl for user_id in user_ids})
+            scores, _ = await pipe.execute()
+        return [user_id for user_id, score in zip(user_ids, scores) if score is None or score <= now]
+
+    async def remove(self, user_id: str) -> bool:
+        return bool(await self._redis.zrem(self.KEY, user_id))
+
+    async def expire(self) -> List[str]:
+        lapsed = await self._redis.zrangebyscore(self.KEY, "-inf", time.time())
+        if not lapsed:
+            return []
+        # Several workers may sweep at once; whoever removes a member reports it
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for user_id in lapsed:
+                pipe.zrem(self.KEY, user_id)
+            removed = await pipe.execute()
+        return [user_id for user_id, count in zip(lapsed, removed) if count]
+
+    async def online(self, user_ids: Iterable[str]) -> Set[str]:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return set()
+        now = time.time()
+        scores = await self._redis.zmscore(self.KEY, user_ids)
+        return {user_id for user_id, score in zip(user_ids, scores) if score is not None and score > now}
+
+    async def all_online(self) -> Set[str]:
+        return set(await self._redis.zrangebyscore(self.KEY, f"({time.time()}", "+inf"))
+
+
+class PresenceService:
+    """Who is online, and who wants to hear about it
+
+    Connected users are refreshed every presence_refresh_seconds and
+    lapse after presence_ttl_seconds without a refresh, so users held by
+    a crashed worker go offline on their own. Each worker keeps a reverse
+    index of the watchers it holds (target -> viewers). A viewer watches
+    their friends automatically and can add users they are looking at.
+    Changes are published to every worker and pushed as one compact
+    {"type": "presence", "online": [...], "offline": [...]} per viewer.
+    """
+
+    def __init__(self):
+        self.backend = self._create_backend()
+        # target user_id -> viewer user_ids held by this worker
+        self.watchers: Dict[str, Set[str]] = {}
+        # viewer user_id -> target user_ids
+        self.watching: Dict[str, Set[str]] = {}
+        # user_id -> online, waiting for the next push
+        self._pending: Dict[str, bool] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _create_backend():
+        if settings.redis_url:
+            try:
+                return RedisPresence(settings.redis_url)
+            except ImportError:
+                logger.warning("⚠️ REDIS_URL is set but the redis package is missing; presence stays in memory")
+        return MemoryPresence()
+
+    async def set_online(self, user_id: str):
+        """A user's first connection on this worker opened"""
+        if await self.backend.touch([user_id], settings.presence_ttl_seconds):
+            await self._announce(user_id, True)
+
+    async def set_offline(self, user_id: str):
+        """A user's last connection on every worker closed"""
+        if await self.backend.remove(user_id):
+            await self._announce(user_id, False)
+
+    async def refresh(self, user_ids: Iterable[str]):
+        """Extend the TTL of users who are still connected"""
+        for user_id in await self.backend.touch(user_ids, settings.presence_ttl_seconds):
+            # Lapsed (e.g. a stalled refresh loop) and came back
+            await self._announce(user_id, True)
+
+    async def is_online(self, user_id: str) -> bool:
+        return bool(await self.backend.online([str(user_id)]))
+
+    async def online(self, user_ids: Iterable) -> Set[str]:
+        """The subset of user_ids that is online"""
+        return await self.backend.online([str(user_id) for user_id in user_ids])
+
+    async def online_user_ids(self) -> Set[str]:
+        return await self.backend.all_online()
+
+    def _friend_ids(self, user_id: str) -> List[str]:
+        db = Database.get_db()
+        user = db.users.find_one({"_id": ObjectId(user_id)}, {"friends": 1})
+        return [str(friend_id) for friend_id in (user or {}).get("friends", [])]
+
+    async def watch(self, viewer_id: str, target_ids: Iterable, snapshot: bool = True):
+        """Push the targets' future changes to the viewer (and their current state now)
+
+        Only viewers connected to this worker can watch; the index is
+        dropped when their last connection closes.
+        """
+        from backend.app.api.websocket import manager
+
+        viewer_id = str(viewer_id)
+        target_ids = {str(target_id) for target_id in target_ids} - {viewer_id}
+        if not target_ids or viewer_id not in manager.connections:
+            return
+        watching = self.watching.setdefault(viewer_id, set())
+        new_targets = target_ids - watching
+        watching |= new_targets
+        for target_id in new_targets:
+            self.watchers.setdefault(target_id, set()).add(viewer_id)
+        if snapshot and new_targets:
+            online = await self.backend.online(new_targets)
+            await self._push(viewer_id, sorted(online), sorted(new_targets - online))
+
+    async def watch_friends(self, viewer_id: str):
+        """Watch the viewer's friends; called when their first connection opens"""
+        from backend.app.api.websocket import manager
+
+        viewer_id = str(viewer_id)
+        if viewer_id not in manager.connections:
+            return
+        try:
+            friend_ids = await asyncio.to_thread(self._friend_ids, viewer_id)
+        except Exception as e:
+            logger.error(f"❌ Failed to load friends of {viewer_id} for presence: {e}")
+            return
+        await self.watch(viewer_id, friend_ids)
+
+    def unwatch(self, viewer_id: str, target_ids: Iterable = None):
+        """Stop pushing some (or, by default, all) targets to the viewer"""
+        watching = self.watching.get(viewer_id)
+        if not watching:
+            return
+        targets = watching.copy() if target_ids is None else {str(target_id) for target_id in target_ids} & watching
+        for target_id in targets:
+            watching.discard(target_id)
+            viewers = self.watchers.get(target_id)
+            if viewers:
+                viewers.discard(viewer_id)
+                if not viewers:
+                    del self.watchers[target_id]
+        if not watching:
+            del self.watching[viewer_id]
+
+    async def _announce(self, user_id: str, online: bool):
+        """Apply a change here and tell the other workers"""
+        self.handle_change({"user_id": user_id, "online": online})
+        try:
+            await message_bus.publish(PRESENCE_CHANNEL, {"user_id": user_id, "online": online}, exclude_self=True)
+        except Exception as e:
+            logger.error(f"❌ Failed to publish presence change for {user_id}: {e}")
+
+    def handle_change(self, change: dict):
+        """Queue a change for this worker's watchers (also the bus callback)"""
+        user_id = change.get("user_id")
+        if user_id not in self.watchers:
+            return
+        self._pending[user_id] = bool(change.get("online"))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(COALESCE_SECONDS)
+        while self._pending:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Presence flush failed: {e}")
+
+    async def flush(self):
+        """Send each watcher one message covering every change since the last flush"""
+        pending, self._pending = self._pending, {}
+        diffs: Dict[str, tuple] = {}
+        for user_id, online in pending.items():
+            for viewer_id in self.watchers.get(user_id, ()):
+                came, went = diffs.setdefault(viewer_id, ([], []))
+                (came if online else went).append(user_id)
+        for viewer_id, (came, went) in diffs.items():
+            await self._push(viewer_id, came, went)
+
+    async def _push(self, viewer_id: str, came: List[str], went: List[str]):
+        from backend.app.api.websocket import manager
+
+        await manager.send_personal_message({
+            "type": "presence",
+            "online": came,
+            "offline": went,
+            "timestamp": datetime.now().isoformat()
+        }, viewer_id)
+
+    async def sweep(self):
+        """Refresh this worker's users, then report users whose TTL lapsed"""
+        from backend.app.api.websocket import manager
+
+        await self.refresh(manager.connections.user_ids())
+        for user_id in await self.backend.expire():
+            await self._announce(user_id, False)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.presence_refresh_seconds)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"❌ Presence sweep failed: {e}")
+
+    async def start(self):
+        await message_bus.subscribe(PRESENCE_CHANNEL)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global instance
+presence = PresenceService()
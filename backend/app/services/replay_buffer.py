@@ -0,0 +1,114 @@
+"""
+Replay Buffer
+Per-user sequence numbers and a bounded ring buffer of recent messages, so a
+client that reconnects after a network blip gets only the frames it missed
+"""
+import time
+import uuid
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from backend.app.services.ephemeral_store import TimerWheel
+from backend.app.services.outbound_queue import EncodedMessage, Sequenced
+
+
+class UserStream:
+    """One user's numbered message stream on this worker
+
+    The stream id changes whenever the stream is recreated (worker restart,
+    linger expired), so a client can tell its last seq no longer applies.
+    """
+
+    __slots__ = ("id", "last_seq", "frames")
+
+    def __init__(self, size: int):
+        self.id = uuid.uuid4().hex[:12]
+        self.last_seq = 0
+        self.frames: Deque[Sequenced] = deque(maxlen=size)
+
+    def append(self, message: EncodedMessage) -> Sequenced:
+        self.last_seq += 1
+        item = Sequenced(self.last_seq, message)
+        self.frames.append(item)
+        return item
+
+    def since(self, last_seq: int) -> Optional[List[Sequenced]]:
+        """Frames after last_seq, or None if some of them already left the buffer"""
+        if last_seq > self.last_seq or last_seq < 0:
+            return None
+        missed = self.last_seq - last_seq
+        if missed > len(self.frames):
+            return None
+        return list(self.frames)[len(self.frames) - missed:] if missed else []
+
+
+class ReplayBuffer:
+    """user id -> UserStream for users connected to this worker
+
+    A stream is opened by the user's first connection and kept for
+    `linger` seconds after the last one closes; messages sent meanwhile are
+    still numbered and buffered so a reconnect can pick them up. Expiry
+    runs on a one-second TimerWheel, one timer per lingering user.
+    """
+
+    def __init__(self, size: int, linger: float):
+        self.size = size
+        self.linger = linger
+        self.streams: Dict[str, UserStream] = {}
+        self._wheel = TimerWheel(start_tick=self._now_tick())
+        self.replayed = 0
+        self.resyncs = 0
+
+    @staticmethod
+    def _now_tick() -> int:
+        return int(time.monotonic())
+
+    def _expire(self):
+        for user_id in self._wheel.advance(self._now_tick()):
+            self.streams.pop(user_id, None)
+
+    def open(self, user_id: str) -> UserStream:
+        """Stream for a connecting user; an existing (lingering) one is kept"""
+        self._expire()
+        self._wheel.cancel(user_id)
+        stream = self.streams.get(user_id)
+        if stream is None:
+            stream = self.streams[user_id] = UserStream(self.size)
+        return stream
+
+    def release(self, user_id: str):
+        """The user's last connection closed: keep buffering for `linger` seconds"""
+        if user_id in self.streams:
+            self._wheel.schedule(user_id, self._now_tick() + int(self.linger))
+
+    def stream(self, user_id: str) -> Optional[UserStream]:
+        self._expire()
+        return self.streams.get(user_id)
+
+    def append(self, user_id: str, message) -> Optional[Sequenced]:
+        """Number and buffer a message (dict or EncodedMessage); None if the user has no stream here"""
+        stream = self.stream(user_id)
+        if stream is None:
+            return None
+        if not isinstance(message, EncodedMessage):
+            message = EncodedMessage.encode(message)
+        return stream.append(message)
+
+    def resume(self, user_id: str, stream_id: str, last_seq: int) -> Optional[List[Sequenced]]:
+        """Frames the client missed since last_seq, or None if it has to resync"""
+        stream = self.stream(user_id)
+        missed = stream.since(last_seq) if stream is not None and stream.id == stream_id else None
+        if missed is None:
+            self.resyncs += 1
+        else:
+            self.replayed += len(missed)
+        return missed
+
+    def stats(self) -> Dict:
+        return {
+            "streams": len(self.streams),
+            "lingering": len(self._wheel),
+            "buffered": sum(len(stream.frames) for stream in self.streams.values()),
+            "replayed": self.replayed,
+            "resyncs": self.resyncs
+        }
@@ -0,0 +1,272 @@
+"""
+Score Ledger
+Append-only log of score events with per-user daily buckets and
+pre-aggregated rolling windows for the daily/weekly/monthly leaderboards
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from backend.app.database import Database
+
+# Window name -> number of daily buckets it covers (today included)
+WINDOWS = {
+    "daily": 1,
+    "weekly": 7,
+    "monthly": 30
+}
+
+
+class ScoreLedger:
+    """Record score events and serve windowed rankings from pre-aggregated documents
+
+    Collections:
+        score_events:  one document per event (audit trail)
+        score_daily:   {user_id, day, points, events} - one bucket per user per day
+        score_windows: {_id: user_id, anchor_day, daily, weekly, monthly}
+
+    The unit is call points: a completed call earns each participant their
+    AI rating (0-10) times ten, i.e. 0-100 per call. Events with a ref_id
+    (the call) are unique per user and source, so a call is never counted
+    twice.
+    """
+
+    def __init__(self):
+        # Day the score_windows documents were last rolled to
+        self._anchor_day: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _day_key(moment: datetime) -> str:
+        return moment.strftime("%Y-%m-%d")
+
+    def record(self, user_id, points: float, source: str, ref_id=None, at: datetime = None) -> bool:
+        """Append a score event and fold it into the daily bucket and window sums
+
+        Returns False if nothing was recorded (no points, or the event for
+        this ref_id was already recorded).
+        """
+        if not points:
+            return False
+
+        db = Database.get_db()
+        at = at or datetime.utcnow()
+        user_oid = ObjectId(str(user_id))
+        day = self._day_key(at)
+        # Roll first: a roll rebuilds the windows from score_daily, so doing it
+        # after the bucket write below would count this event twice
+        anchor = self.ensure_current()
+
+        try:
+            db.score_events.insert_one({
+                "user_id": user_oid,
+                "points": points,
+                "source": source,
+                "ref_id": ref_id,
+                "day": day,
+                "created_at": at
+            })
+        except DuplicateKeyError:
+            return False
+
+        db.score_daily.update_one(
+            {"user_id": user_oid, "day": day},
+            {
+                "$inc": {"points": points, "events": 1},
+                "$set": {"updated_at": at}
+            },
+            upsert=True
+        )
+
+        if day == anchor:
+            db.score_windows.update_one(
+                {"_id": user_oid},
+                {
+                    "$inc": {window: points for window in WINDOWS},
+                    "$set": {"anchor_day": anchor}
+                },
+                upsert=True
+            )
+        return True
+
+    def drop_duplicate_events(self) -> int:
+        """Delete repeated events for the same call (kept: the first), so the unique index can build
+
+        Their points come off the daily buckets they were added to, and the
+        windows are rebuilt from those buckets.
+        """
+        db = Database.get_db()
+        duplicates = db.score_events.aggregate([
+            {"$match": {"ref_id": {"$type": "objectId"}}},
+            {"$sort": {"created_at": 1}},
+            {"$group": {
+                "_id": {"ref_id": "$ref_id", "user_id": "$user_id", "source": "$source"},
+                "events": {"$push": {"_id": "$_id", "day": "$day", "points": "$points"}},
+                "count": {"$sum": 1}
+            }},
+            {"$match": {"count": {"$gt": 1}}}
+        ])
+        extra_ids = []
+        bucket_updates = []
+        for group in duplicates:
+            for event in group["events"][1:]:
+                extra_ids.append(event["_id"])
+                bucket_updates.append(UpdateOne(
+                    {"user_id": group["_id"]["user_id"], "day": event["day"]},
+                    {"$inc": {"points": -event["points"], "events": -1}}
+                ))
+        if not extra_ids:
+            return 0
+
+        db.score_events.delete_many({"_id": {"$in": extra_ids}})
+        db.score_daily.bulk_write(bucket_updates, ordered=False)
+        today = self._day_key(datetime.utcnow())
+        with self._lock:
+            self.roll_windows(today)
+            self._anchor_day = today
+        print(f"✅ Dropped {len(extra_ids)} duplicate score events")
+        return len(extra_ids)
+
+    def ensure_current(self) -> str:
+        """Roll the window documents forward if the UTC day has changed"""
+        today = self._day_key(datetime.utcnow())
+        if self._anchor_day == today:
+            return today
+
+        with self._lock:
+            if self._anchor_day == today:
+                return today
+
+            db = Database.get_db()
+            meta = db.score_meta.find_one({"_id": "windows"})
+            if not meta or meta.get("anchor_day") != today:
+                self.roll_windows(today)
+            self._anchor_day = today
+
+        return today
+
+    def roll_windows(self, today: str = None):
+        """Rebuild score_windows from the last 30 daily buckets
+
+        Only runs once per day per deployment. It touches buckets from the
+        last month, not the whole event history.
+        """
+        db = Database.get_db()
+        today = today or self._day_key(datetime.utcnow())
+        today_date = datetime.strptime(today, "%Y-%m-%d")
+
+        window_starts = {
+            window: self._day_key(today_date - timedelta(days=days - 1))
+            for window, days in WINDOWS.items()
+        }
+        oldest = min(window_starts.values())
+
+        db.score_daily.aggregate([
+            {"$match": {"day": {"$gte": oldest, "$lte": today}}},
+            {"$group": {
+                "_id": "$user_id",
+                **{
+                    window: {"$sum": {
+                        "$cond": [{"$gte": ["$day", start]}, "$points", 0]
+                    }}
+                    for window, start in window_starts.items()
+                }
+            }},
+            {"$set": {"anchor_day": today}},
+            {"$merge": {
+                "into": "score_windows",
+                "on": "_id",
+                "whenMatched": "replace",
+                "whenNotMatched": "insert"
+            }}
+        ])
+
+        # Users with no activity in the last month drop out entirely
+        db.score_windows.delete_many({"anchor_day": {"$ne": today}})
+
+        db.score_meta.update_one(
+            {"_id": "windows"},
+            {"$set": {"anchor_day": today, "rolled_at": datetime.utcnow()}},
+            upsert=True
+        )
+        print(f"✅ Score windows rolled to {today}")
+
+    def top(self, window: str, limit: int = 10, exclude_emails: List[str] = None) -> List[Dict]:
+        """Top users for a window, joined with their profile fields"""
+        db = Database.get_db()
+        self.ensure_current()
+
+        exclude_emails = exclude_emails or []
+        window_docs = list(
+            db.score_windows.find({window: {"$gt": 0}}, {window: 1})
+            .sort(window, -1)
+            .limit(limit + len(exclude_emails))
+        )
+        if not window_docs:
+            return []
+
+        users = {
+            user["_id"]: user
+            for user in db.users.find(
+                {"_id": {"$in": [doc["_id"] for doc in window_docs]}},
+                {"name": 1, "email": 1, "avatar_url": 1, "ai_score": 1,
+                 "total_calls": 1, "avg_fluency_score": 1}
+            )
+        }
+
+        results = []
+        for doc in window_docs:
+            user = users.get(doc["_id"])
+            if not user or user.get("email") in exclude_emails:
+                continue
+            results.append({**user, "window_score": round(doc[window], 2)})
+            if len(results) >= limit:
+                break
+        return results
+
+    def window_score(self, user_id, window: str) -> float:
+        """A single user's points for a window"""
+        db = Database.get_db()
+        self.ensure_current()
+        doc = db.score_windows.find_one({"_id": ObjectId(str(user_id))}, {window: 1})
+        return doc.get(window, 0) if doc else 0
+
+    def rank(self, user_id, window: str, context_size: int = 2) -> Dict:
+        """Rank of a user within a window plus the entries just above and below"""
+        db = Database.get_db()
+        self.ensure_current()
+
+        user_oid = ObjectId(str(user_id))
+        score = self.window_score(user_oid, window)
+        total = db.score_windows.count_documents({window: {"$gt": 0}})
+        rank = db.score_windows.count_documents({window: {"$gt": score}}) + 1
+
+        above = list(
+            db.score_windows.find({window: {"$gt": score}}, {window: 1})
+            .sort(window, 1)
+            .limit(context_size)
+        )
+        below = list(
+            db.score_windows.find(
+                {window: {"$lte": score, "$gt": 0}, "_id": {"$ne": user_oid}},
+                {window: 1}
+            )
+            .sort(window, -1)
+            .limit(context_size)
+        )
+
+        return {
+            "score": score,
+            "rank": rank,
+            "total": total,
+            "above": list(reversed(above)),
+            "below": below
+        }
+
+
+# Global instance
+score_ledger = ScoreLedger()
@@ -0,0 +1,83 @@
+"""
+Signal Batcher
+Coalesces trickle-ICE candidates per (call, sender, recipient) over a short
+window so a burst is forwarded as one WebSocket frame
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Signal types carrying a single trickle-ICE candidate
+CANDIDATE_SIGNAL_TYPES = ("ice-candidate", "candidate", "ice_candidate")
+
+# (call_id, from_user, to_user)
+PairKey = Tuple[str, str, str]
+
+Forwarder = Callable[[str, str, str, List[dict]], Awaitable[None]]
+
+
+class SignalBatcher:
+    """Buffer candidates per peer pair and forward them in batches
+
+    The first candidate for a pair opens a window of `window` seconds;
+    everything that arrives before it closes goes out together. A full
+    batch is sent at once. Callers flush a pair before forwarding any
+    other signal for it (offer, answer, ...) so ordering is preserved.
+    """
+
+    def __init__(self, window: float, max_batch: int, forward: Forwarder):
+        self.window = window
+        self.max_batch = max_batch
+        self.forward = forward
+        self._pending: Dict[PairKey, List[dict]] = {}
+        self._timers: Dict[PairKey, asyncio.TimerHandle] = {}
+        self.candidates = 0
+        self.frames = 0
+
+    @staticmethod
+    def is_candidate(signal: dict) -> bool:
+        return signal.get("type") in CANDIDATE_SIGNAL_TYPES
+
+    def add(self, call_id: str, from_user: str, to_user: str, signal: dict):
+        key = (call_id, from_user, to_user)
+        batch = self._pending.setdefault(key, [])
+        batch.append(signal)
+        self.candidates += 1
+        if len(batch) >= self.max_batch:
+            asyncio.create_task(self.flush(*key))
+        elif key not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[key] = loop.call_later(self.window, lambda: asyncio.create_task(self.flush(*key)))
+
+    async def flush(self, call_id: str, from_user: str, to_user: str):
+        """Forward whatever is buffered for the pair (no-op if nothing is)"""
+        key = (call_id, from_user, to_user)
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if not batch:
+            return
+        self.frames += 1
+        try:
+            await self.forward(call_id, from_user, to_user, batch)
+        except Exception as e:
+            logger.error(f"❌ Failed to forward {len(batch)} ICE candidate(s) to {to_user}: {e}")
+
+    def discard_call(self, call_id: str):
+        """Drop buffered candidates of a call that ended"""
+        for key in [key for key in self._pending if key[0] == call_id]:
+            timer = self._timers.pop(key, None)
+            if timer:
+                timer.cancel()
+            del self._pending[key]
+
+    def stats(self) -> Dict:
+        return {
+            "candidates": self.candidates,
+            "frames": self.frames,
+            "frames_saved": self.candidates - self.frames,
+            "pending_pairs": len(self._pending)
+        }
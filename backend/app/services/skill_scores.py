@@ -0,0 +1,156 @@
+"""
+Skill Scores
+Per-user running skill aggregates (grammar, fluency, vocabulary, activity)
+maintained incrementally so skill leaderboards are a single indexed read
+"""
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from backend.app.database import Database
+
+SKILLS = ["grammar", "fluency", "vocabulary", "activity"]
+
+
+class SkillScoreStore:
+    """Maintain user_skill_scores documents
+
+    Document shape:
+        {_id: user_id, grammar, grammar_sum, grammar_count, fluency, ...,
+         activity, updated_at}
+
+    grammar, fluency and vocabulary are running means on a 0-100 scale;
+    activity is the number of counted calls. wpm (words per minute) is
+    kept the same way but is not a ranked skill.
+    """
+
+    @staticmethod
+    def skills_from_analysis(analysis: dict) -> Dict[str, float]:
+        """Map an ai_analysis document to 0-100 skill observations"""
+        skills = {}
+        if analysis.get("grammar_errors") is not None:
+            skills["grammar"] = 100 - analysis["grammar_errors"] * 5
+        if analysis.get("fluency_score") is not None:
+            skills["fluency"] = analysis["fluency_score"]
+        if analysis.get("vocabulary_repetition") is not None:
+            skills["vocabulary"] = (1 - analysis["vocabulary_repetition"]) * 100
+        return skills
+
+    def record(self, user_id, grammar: float = None, fluency: float = None, vocabulary: float = None,
+               wpm: float = None) -> Optional[Dict]:
+        """Fold new observations into the user's running means atomically; returns the updated document"""
+        observations = {
+            skill: value
+            for skill, value in (("grammar", grammar), ("fluency", fluency), ("vocabulary", vocabulary), ("wpm", wpm))
+            if value is not None
+        }
+        if not observations:
+            return None
+
+        sums = {}
+        means = {}
+        for skill, value in observations.items():
+            sums[f"{skill}_sum"] = {"$add": [{"$ifNull": [f"${skill}_sum", 0]}, value]}
+            sums[f"{skill}_count"] = {"$add": [{"$ifNull": [f"${skill}_count", 0]}, 1]}
+            means[skill] = {"$round": [{"$divide": [f"${skill}_sum", f"${skill}_count"]}, 2]}
+
+        db = Database.get_db()
+        return db.user_skill_scores.find_one_and_update(
+            {"_id": ObjectId(str(user_id))},
+            [
+                {"$set": {**sums, "updated_at": "$$NOW"}},
+                {"$set": means}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    def record_analysis(self, user_id, analysis: dict) -> Optional[Dict]:
+        """Fold a transcript analysis into the aggregates; returns the updated document"""
+        return self.record(user_id, wpm=analysis.get("words_per_minute"), **self.skills_from_analysis(analysis))
+
+    def record_activity(self, user_id, calls: int = 1):
+        """Count completed calls towards the activity skill"""
+        db = Database.get_db()
+        db.user_skill_scores.update_one(
+            {"_id": ObjectId(str(user_id))},
+            {"$inc": {"activity": calls}, "$currentDate": {"updated_at": True}},
+            upsert=True
+        )
+
+    def top(self, skill: str, limit: int = 10, exclude_emails: List[str] = None) -> List[Dict]:
+        """Top users for a skill, joined with their profile fields"""
+        db = Database.get_db()
+
+        exclude_emails = exclude_emails or []
+        skill_docs = list(
+            db.user_skill_scores.find({skill: {"$exists": True}}, {skill: 1})
+            .sort(skill, -1)
+            .limit(limit + len(exclude_emails))
+        )
+        if not skill_docs:
+            return []
+
+        users = {
+            user["_id"]: user
+            for user in db.users.find(
+                {"_id": {"$in": [doc["_id"] for doc in skill_docs]}},
+                {"name": 1, "email": 1, "avatar_url": 1, "ai_score": 1,
+                 "total_calls": 1, "avg_fluency_score": 1}
+            )
+        }
+
+        results = []
+        for doc in skill_docs:
+            user = users.get(doc["_id"])
+            if not user or user.get("email") in exclude_emails:
+                continue
+            results.append({**user, "skill_score": doc[skill]})
+            if len(results) >= limit:
+                break
+        return results
+
+    def get(self, user_id) -> Optional[Dict]:
+        """A user's skill aggregates"""
+        db = Database.get_db()
+        return db.user_skill_scores.find_one({"_id": ObjectId(str(user_id))})
+
+    def rebuild(self):
+        """Backfill the aggregates from ai_analysis and users.total_calls
+
+        Full scan; only meant for first deployment or repair.
+        """
+        db = Database.get_db()
+        db.ai_analysis.aggregate([
+            {"$group": {
+                "_id": "$user_id",
+                "grammar_sum": {"$sum": {"$subtract": [100, {"$multiply": ["$grammar_errors", 5]}]}},
+                "grammar_count": {"$sum": {"$cond": [{"$isNumber": "$grammar_errors"}, 1, 0]}},
+                "fluency_sum": {"$sum": "$fluency_score"},
+                "fluency_count": {"$sum": {"$cond": [{"$isNumber": "$fluency_score"}, 1, 0]}},
+                "vocabulary_sum": {"$sum": {"$multiply": [{"$subtract": [1, "$vocabulary_repetition"]}, 100]}},
+                "vocabulary_count": {"$sum": {"$cond": [{"$isNumber": "$vocabulary_repetition"}, 1, 0]}}
+            }},
+            {"$set": {
+                skill: {"$cond": [
+                    {"$gt": [f"${skill}_count", 0]},
+                    {"$round": [{"$divide": [f"${skill}_sum", f"${skill}_count"]}, 2]},
+                    "$$REMOVE"
+                ]}
+                for skill in ("grammar", "fluency", "vocabulary")
+            }},
+            {"$merge": {"into": "user_skill_scores", "on": "_id", "whenMatched": "merge"}}
+        ])
+
+        updates = [
+            UpdateOne({"_id": user["_id"]}, {"$set": {"activity": user["total_calls"]}}, upsert=True)
+            for user in db.users.find({"total_calls": {"$gt": 0}}, {"total_calls": 1})
+        ]
+        if updates:
+            db.user_skill_scores.bulk_write(updates, ordered=False)
+        print("✅ Skill score aggregates rebuilt")
+
+
+# Global instance
+skill_scores = SkillScoreStore()
@@ -0,0 +1,81 @@
+"""
+Stale-While-Revalidate Cache
+Serves the last computed value immediately while a single background task
+keeps it fresh on a fixed schedule
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class StaleWhileRevalidateCache:
+    """Cache one expensive synchronous computation behind a background refresher
+
+    Requests never wait on the computation except for the very first one
+    after startup, before any value exists.
+    """
+
+    def __init__(self, name: str, compute: Callable[[], Any], refresh_seconds: float = 60):
+        self.name = name
+        self.compute = compute
+        self.refresh_seconds = refresh_seconds
+        self._value: Any = None
+        self._computed_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_lock = asyncio.Lock()
+
+    @property
+    def age_seconds(self) -> Optional[float]:
+        if self._computed_at is None:
+            return None
+        return time.time() - self._computed_at
+
+    async def refresh(self):
+        """Recompute the value off the event loop
+
+        Callers that queued behind a refresh in progress take its result
+        instead of computing again.
+        """
+        seen = self._computed_at
+        async with self._refresh_lock:
+            if self._computed_at != seen:
+                return
+            value = await asyncio.to_thread(self.compute)
+            self._value = value
+            self._computed_at = time.time()
+
+    async def get(self) -> Dict:
+        """Return the cached value with its age, computing it only on a cold start"""
+        if self._computed_at is None:
+            await self.refresh()
+        return {
+            "value": self._value,
+            "computed_at": self._computed_at,
+            "age_seconds": round(self.age_seconds, 3)
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep serving the stale copy and try again next cycle
+                print(f"⚠️ Failed to refresh {self.name}: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self):
+        """Start the background refresher (idempotent)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the background refresher"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,108 @@
+"""
+WebSocket Codec
+Wire formats negotiated through the WebSocket subprotocol header: JSON text
+frames (the default) and MessagePack binary frames with epoch-millisecond
+timestamps
+"""
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional
+
+try:
+    import msgpack
+except ImportError:  # optional; without it every connection speaks JSON
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+# Offered by clients in Sec-WebSocket-Protocol, most preferred first
+SUBPROTOCOLS = (MSGPACK, JSON)
+
+# Top-level fields sent as ISO strings in JSON and as epoch ms in MessagePack
+TIMESTAMP_FIELDS = frozenset(("timestamp", "created_at", "accepted_at", "rejected_at", "started_at"))
+
+
+def available_subprotocols() -> List[str]:
+    return [name for name in SUBPROTOCOLS if name != MSGPACK or msgpack is not None]
+
+
+def negotiate(offered: List[str]) -> Optional[str]:
+    """Pick the subprotocol to accept from the client's offer (None: plain JSON, no header)"""
+    supported = available_subprotocols()
+    for name in offered or ():
+        if name in supported:
+            return name
+    return None
+
+
+def epoch_ms(value: Any) -> Any:
+    """datetime or ISO string -> integer epoch milliseconds (anything else unchanged)"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    if not isinstance(value, datetime):
+        return value
+    return int(value.timestamp() * 1000)
+
+
+def _msgpack_default(value: Any):
+    if isinstance(value, datetime):
+        return epoch_ms(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+_packers = []
+
+
+def _packer():
+    """One reusable Packer; building one per packb() call costs more than packing a small frame"""
+    if not _packers:
+        _packers.append(msgpack.Packer(default=_msgpack_default))
+    return _packers[0]
+
+
+def encode_json(message: dict) -> str:
+    return json.dumps(message, default=str)
+
+
+def encode_msgpack(message: dict) -> bytes:
+    fields = TIMESTAMP_FIELDS.intersection(message)
+    if fields:
+        message = dict(message)
+        for field in fields:
+            message[field] = epoch_ms(message[field])
+    return _packer().pack(message)
+
+
+def json_with_seq(text: str, seq: int) -> str:
+    """Add a "seq" field to an encoded JSON object without re-encoding it"""
+    if text == "{}":
+        return f'{{"seq": {seq}}}'
+    return f'{{"seq": {seq}, {text[1:]}'
+
+
+def msgpack_with_seq(frame: bytes, seq: int) -> bytes:
+    """Add a "seq" entry to an encoded MessagePack map without re-encoding it"""
+    head = frame[0]
+    if 0x80 <= head < 0x8f:
+        header, body = bytes((head + 1,)), frame[1:]
+    elif head == 0x8f:
+        header, body = b"\xde" + (16).to_bytes(2, "big"), frame[1:]
+    elif head == 0xde and int.from_bytes(frame[1:3], "big") < 0xffff:
+        header, body = b"\xde" + (int.from_bytes(frame[1:3], "big") + 1).to_bytes(2, "big"), frame[3:]
+    elif head == 0xde:
+        header, body = b"\xdf" + (0x10000).to_bytes(4, "big"), frame[3:]
+    elif head == 0xdf:
+        header, body = b"\xdf" + (int.from_bytes(frame[1:5], "big") + 1).to_bytes(4, "big"), frame[5:]
+    else:
+        raise ValueError("Not a MessagePack map")
+    return header + body + msgpack.packb("seq") + msgpack.packb(seq)
+
+
+def decode_msgpack(frame: bytes) -> Any:
+    return msgpack.unpackb(frame)
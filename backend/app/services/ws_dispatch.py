@@ -0,0 +1,108 @@
+"""
+WebSocket Dispatch
+Registry mapping WebSocket message types to handlers, with per-type field
+schemas checked once per frame and fast JSON decoding of raw frames
+"""
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; stdlib json is the fallback
+    orjson = None
+
+from backend.app.services.ws_codec import JSON, MSGPACK, decode_msgpack
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str, dict], Awaitable[Any]]
+
+
+class MessageError(ValueError):
+    """A frame that can't be decoded or doesn't match its message schema"""
+
+
+def decode_frame(frame: Union[bytes, str], codec: str = JSON) -> dict:
+    """Decode a raw text or binary frame into a message dict
+
+    Binary frames are MessagePack on connections that negotiated it;
+    text frames are always JSON.
+    """
+    if codec == MSGPACK and isinstance(frame, bytes):
+        try:
+            data = decode_msgpack(frame)
+        except (ValueError, TypeError) as e:
+            raise MessageError(f"Invalid MessagePack: {e or type(e).__name__}")
+        if not isinstance(data, dict):
+            raise MessageError("Message must be a map")
+        return data
+    try:
+        data = orjson.loads(frame) if orjson else json.loads(frame)
+    except ValueError as e:
+        raise MessageError(f"Invalid JSON: {e}")
+    if not isinstance(data, dict):
+        raise MessageError("Message must be a JSON object")
+    return data
+
+
+class MessageSchema:
+    """Required and optional fields of one message type, precompiled to tuples"""
+
+    def __init__(self, required: Dict[str, type] = None, optional: Dict[str, type] = None):
+        self.required: Tuple[Tuple[str, type], ...] = tuple((required or {}).items())
+        self.optional: Tuple[Tuple[str, type], ...] = tuple((optional or {}).items())
+
+    def validate(self, message_type: str, data: dict):
+        for field, field_type in self.required:
+            value = data.get(field)
+            if value is None:
+                raise MessageError(f"{message_type}: missing field '{field}'")
+            if not isinstance(value, field_type):
+                raise MessageError(f"{message_type}: field '{field}' must be {field_type.__name__}")
+        for field, field_type in self.optional:
+            value = data.get(field)
+            if value is not None and not isinstance(value, field_type):
+                raise MessageError(f"{message_type}: field '{field}' must be {field_type.__name__}")
+
+
+class MessageRegistry:
+    """Message type -> (schema, handler); one dict lookup per frame"""
+
+    def __init__(self):
+        self._handlers: Dict[str, Tuple[MessageSchema, Handler]] = {}
+
+    def on(self, *message_types: str, required: Dict[str, type] = None, optional: Dict[str, type] = None):
+        """Decorator registering a handler(user_id, data) for one or more message types"""
+        schema = MessageSchema(required, optional)
+
+        def register(handler: Handler) -> Handler:
+            for message_type in message_types:
+                if message_type in self._handlers:
+                    raise ValueError(f"Handler for '{message_type}' already registered")
+                self._handlers[message_type] = (schema, handler)
+            return handler
+
+        return register
+
+    @property
+    def message_types(self):
+        return list(self._handlers)
+
+    def resolve(self, data: dict) -> Tuple[str, Optional[Handler]]:
+        """Validate a decoded message and find its handler (None if the type is unknown)"""
+        message_type = data.get("type")
+        entry = self._handlers.get(message_type)
+        if entry is None:
+            return message_type, None
+        schema, handler = entry
+        schema.validate(message_type, data)
+        return message_type, handler
+
+    async def dispatch(self, user_id: str, data: dict) -> Tuple[str, bool]:
+        """Run the handler for a decoded message; returns (type, handled)"""
+        message_type, handler = self.resolve(data)
+        if handler is None:
+            return message_type, False
+        await handler(user_id, data)
+        return message_type, True
@@ -5,6 +5,8 @@ from typing import Optional
 import json
 from bson import ObjectId
 
+from backend.app.core.config import settings
+
 class JSONEncoder(json.JSONEncoder):
     """Custom JSON encoder for MongoDB ObjectId and datetime"""
     def default(self, o):
@@ -52,6 +54,10 @@ def calculate_ai_score(user_data: dict) -> float:
     # Ensure score stays within bounds
     return max(0.0, min(100.0, base_score))
 
+def is_rankable(email: str, ai_score: float) -> bool:
+    """Whether a user appears in rankings (non-test account with a positive score)"""
+    return (ai_score or 0) > 0 and (email or "").lower() not in settings.get_test_account_emails()
+
 def format_duration(seconds: int) -> str:
     """Format duration in seconds to human-readable string"""
     if seconds < 60:
@@ -0,0 +1,102 @@
+"""
+Benchmark WebSocket wire formats: bytes per message and encode/decode CPU
+for JSON text frames vs MessagePack binary frames
+Run this with: python bench_ws_codec.py [iterations]
+"""
+
+import sys
+import os
+import json
+import timeit
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.app.services import ws_codec
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def sample_messages():
+    """Representative frames; transcription dominates real traffic"""
+    now = datetime.now().isoformat()
+    return {
+        "transcription": {
+            "type": "transcription",
+            "call_id": "6531f0c2a4b8e91d2c3f4a5b",
+            "speaker_id": "6531f0c2a4b8e91d2c3f4a5c",
+            "speaker_role": "caller",
+            "text": "I think the most important thing when you practise speaking is to keep going",
+            "timestamp": now
+        },
+        "webrtc_signal": {
+            "type": "webrtc_signal",
+            "signal": {
+                "type": "ice-candidate",
+                "to_user_id": "6531f0c2a4b8e91d2c3f4a5d",
+                "call_id": "6531f0c2a4b8e91d2c3f4a5b",
+                "candidate": {
+                    "candidate": "candidate:842163049 1 udp 1677729535 203.0.113.7 61234 typ srflx raddr 10.0.0.12 rport 61234 generation 0",
+                    "sdpMid": "0",
+                    "sdpMLineIndex": 0
+                }
+            },
+            "from_user": "6531f0c2a4b8e91d2c3f4a5c",
+            "timestamp": now
+        },
+        "call_invitation": {
+            "type": "call_invitation",
+            "invitation_id": "0f8fad5b-d9cb-469f-a165-70867728950e",
+            "from_user": "6531f0c2a4b8e91d2c3f4a5c",
+            "call_id": "6531f0c2a4b8e91d2c3f4a5b",
+            "call_data": {"caller_name": "Alex", "topic": "travel"},
+            "timestamp": now
+        },
+        "presence": {
+            "type": "presence",
+            "online": ["6531f0c2a4b8e91d2c3f4a5c", "6531f0c2a4b8e91d2c3f4a5d"],
+            "offline": ["6531f0c2a4b8e91d2c3f4a5e"],
+            "timestamp": now
+        },
+        "pong": {"type": "pong", "timestamp": now}
+    }
+
+def per_call_us(fn, iterations):
+    return timeit.timeit(fn, number=iterations) / iterations * 1e6
+
+def run_benchmark(iterations: int = 20000):
+    """Print bytes/message and µs per encode/decode for each format"""
+    codecs = [("json", lambda m: json.dumps(m, default=str), json.loads)]
+    if orjson:
+        codecs.append(("orjson", orjson.dumps, orjson.loads))
+    if ws_codec.msgpack:
+        codecs.append(("msgpack", ws_codec.encode_msgpack, ws_codec.decode_msgpack))
+    else:
+        print("⚠️ msgpack is not installed; only JSON is measured")
+    
+    print(f"{'message':<16}{'format':<10}{'bytes':>8}{'encode µs':>12}{'decode µs':>12}")
+    totals = {}
+    for name, message in sample_messages().items():
+        for codec, encode, decode in codecs:
+            frame = encode(message)
+            size = len(frame.encode() if isinstance(frame, str) else frame)
+            encode_us = per_call_us(lambda: encode(message), iterations)
+            decode_us = per_call_us(lambda: decode(frame), iterations)
+            total = totals.setdefault(codec, [0, 0.0, 0.0])
+            total[0] += size
+            total[1] += encode_us
+            total[2] += decode_us
+            print(f"{name:<16}{codec:<10}{size:>8}{encode_us:>12.2f}{decode_us:>12.2f}")
+    
+    print()
+    baseline = totals["json"][0]
+    for codec, (size, encode_us, decode_us) in totals.items():
+        print(f"{codec:<10} total {size:>6} bytes ({size / baseline:.0%} of JSON), "
+              f"encode {encode_us:.2f} µs, decode {decode_us:.2f} µs")
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"📊 WebSocket codec benchmark ({iterations} iterations per measurement)")
+    run_benchmark(iterations)
+    print("✅ Done!")
@@ -51,6 +51,7 @@ def initialize_database():
             "is_online": False,
             "last_seen": datetime.utcnow(),
             "ai_score": 85.5,
+            "rankable": False,
             "total_calls": 12,
             "total_call_duration": 3600,
             "avg_fluency_score": 78.2,
@@ -67,6 +68,7 @@ def initialize_database():
             "is_online": False,
             "last_seen": datetime.utcnow(),
             "ai_score": 92.3,
+            "rankable": False,
             "total_calls": 25,
             "total_call_duration": 7200,
             "avg_fluency_score": 88.5,
@@ -83,6 +85,7 @@ def initialize_database():
             "is_online": False,
             "last_seen": datetime.utcnow(),
             "ai_score": 67.8,
+            "rankable": False,
             "total_calls": 8,
             "total_call_duration": 1800,
             "avg_fluency_score": 65.4,
@@ -100,6 +103,11 @@ def initialize_database():
     print("\n🔧 Creating database indexes...")
     db.users.create_index("email", unique=True)
     db.users.create_index("ai_score")
+    db.users.create_index(
+        [("rankable", 1), ("ai_score", -1)],
+        name="rankable_ai_score",
+        partialFilterExpression={"rankable": True}
+    )
     db.users.create_index("is_online")
     print("✅ User indexes created")
     
@@ -0,0 +1,355 @@
+"""
+WebSocket load test for ConnectionManager
+Drives simulated clients against /api/ws/{user_id} over loopback. Pairs of
+clients run scripted call flows: invite, accept, webrtc_signal bursts,
+transcription streams and end_call.
+
+Reports:
+- message throughput;
+- end-to-end latency percentiles per flow step;
+- server memory per connection;
+- server event-loop lag.
+
+Run this with: python loadtest_ws.py --clients 2000 --calls 3
+(start the server first, or pass --spawn to launch uvicorn on --port)
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import itertools
+import json
+import subprocess
+import time
+import urllib.request
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import websockets
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Message types a flow waits on; everything else is only counted
+AWAITED_TYPES = ("welcome", "call_invitation", "call_accepted", "call_started", "call_ended")
+
+class Stats:
+    """Counters and latency samples shared by every simulated client"""
+
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.flows = 0
+        # step -> latencies in ms
+        self.latency = {}
+        # probe id -> (step, send time)
+        self.probes = {}
+        self._probe_ids = itertools.count()
+
+    def probe(self, step: str) -> int:
+        probe_id = next(self._probe_ids)
+        self.probes[probe_id] = (step, time.perf_counter())
+        return probe_id
+
+    def arrived(self, probe_id):
+        entry = self.probes.pop(probe_id, None)
+        if entry:
+            step, sent_at = entry
+            self.latency.setdefault(step, []).append((time.perf_counter() - sent_at) * 1000)
+
+class Client:
+    """One simulated browser tab"""
+
+    def __init__(self, user_id: str, stats: Stats, use_msgpack: bool):
+        self.user_id = user_id
+        self.stats = stats
+        self.use_msgpack = use_msgpack
+        self.ws = None
+        self.inbox = {message_type: asyncio.Queue() for message_type in AWAITED_TYPES}
+        self._reader = None
+
+    async def connect(self, base_url: str):
+        subprotocols = ["msgpack"] if self.use_msgpack else None
+        self.ws = await websockets.connect(
+            f"{base_url}/api/ws/{self.user_id}",
+            subprotocols=subprotocols,
+            max_size=2 ** 20,
+            open_timeout=30,
+            ping_interval=None
+        )
+        self._reader = asyncio.create_task(self._read())
+        await self.expect("welcome")
+
+    async def send(self, message: dict):
+        frame = msgpack.packb(message) if self.use_msgpack else json.dumps(message)
+        await self.ws.send(frame)
+        self.stats.sent += 1
+
+    async def expect(self, message_type: str, timeout: float = 10) -> dict:
+        try:
+            return await asyncio.wait_for(self.inbox[message_type].get(), timeout)
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+
+    async def _read(self):
+        try:
+            async for frame in self.ws:
+                self.stats.received += 1
+                data = msgpack.unpackb(frame) if isinstance(frame, bytes) else json.loads(frame)
+                self._observe(data)
+        except websockets.ConnectionClosed:
+            pass
+
+    def _observe(self, data: dict):
+        message_type = data.get("type")
+        if message_type == "heartbeat":
+            asyncio.create_task(self.send({"type": "heartbeat_ack"}))
+        elif message_type == "error":
+            self.stats.errors += 1
+        elif message_type == "transcription":
+            if data.get("speaker_id") != self.user_id:
+                self.stats.arrived(int(data["text"].split(":", 1)[0]))
+        elif message_type == "webrtc_signal":
+            signal = data.get("signal") or {}
+            if signal.get("type") == "ice-candidates":
+                for candidate in signal.get("candidates", []):
+                    self.stats.arrived(candidate.get("probe"))
+            elif signal.get("type") == "ice-candidate":
+                self.stats.arrived(signal["candidate"].get("probe"))
+            else:
+                self.stats.arrived(signal.get("probe"))
+
+        queue = self.inbox.get(message_type)
+        if queue is not None:
+            queue.put_nowait(data)
+
+    async def close(self):
+        if self.ws:
+            await self.ws.close()
+        if self._reader:
+            await self._reader
+
+def fake_object_id(index: int, prefix: str) -> str:
+    """Valid 24-hex ids so server-side ObjectId() lookups just miss"""
+    return f"{prefix}{index:0{24 - len(prefix)}x}"
+
+async def run_call(caller: Client, callee: Client, call_id: str, args, stats: Stats):
+    """One scripted call between two connected clients"""
+    # Invite -> invitation delivered
+    probe_id = stats.probe("invite")
+    await caller.send({"type": "send_call_invitation", "to_user": callee.user_id, "call_id": call_id, "call_data": {}})
+    invitation = await callee.expect("call_invitation")
+    stats.arrived(probe_id)
+
+    # Accept -> both sides told the call started
+    probe_id = stats.probe("accept")
+    await callee.send({"type": "accept_call_invitation", "invitation_id": invitation["invitation_id"]})
+    await caller.expect("call_accepted")
+    await callee.expect("call_started")
+    stats.arrived(probe_id)
+
+    # Offer/answer, then a trickle-ICE burst from each side
+    await caller.send({"type": "webrtc_signal", "signal": {
+        "type": "offer", "offer": {"type": "offer", "sdp": "v=0" * 200},
+        "to_user_id": callee.user_id, "call_id": call_id, "probe": stats.probe("signal")
+    }})
+    await callee.send({"type": "webrtc_signal", "signal": {
+        "type": "answer", "answer": {"type": "answer", "sdp": "v=0" * 200},
+        "to_user_id": caller.user_id, "call_id": call_id, "probe": stats.probe("signal")
+    }})
+    for index in range(args.candidates):
+        for sender, receiver in ((caller, callee), (callee, caller)):
+            await sender.send({"type": "webrtc_signal", "signal": {
+                "type": "ice-candidate",
+                "candidate": {
+                    "candidate": f"candidate:{index} 1 udp 2122260223 127.0.0.1 {50000 + index} typ host",
+                    "sdpMid": "0",
+                    "sdpMLineIndex": 0,
+                    "probe": stats.probe("ice_candidate")
+                },
+                "to_user_id": receiver.user_id,
+                "call_id": call_id
+            }})
+
+    # Both sides stream transcription lines
+    for index in range(args.transcriptions):
+        speaker = caller if index % 2 == 0 else callee
+        await speaker.send({
+            "type": "transcription",
+            "call_id": call_id,
+            "speaker_role": "caller" if speaker is caller else "receiver",
+            "text": f"{stats.probe('transcription')}: this is line {index} of the practice conversation"
+        })
+        await asyncio.sleep(args.transcription_interval)
+
+    # End -> partner told
+    probe_id = stats.probe("end_call")
+    await caller.send({"type": "end_call", "call_id": call_id})
+    await callee.expect("call_ended")
+    stats.arrived(probe_id)
+    stats.flows += 1
+
+async def run_pair(index: int, caller: Client, callee: Client, args, stats: Stats):
+    for call in range(args.calls):
+        try:
+            await run_call(caller, callee, fake_object_id(index * args.calls + call, "ca11"), args, stats)
+        except asyncio.TimeoutError:
+            pass
+
+def server_metrics(http_url: str) -> dict:
+    try:
+        with urllib.request.urlopen(f"{http_url}/api/ws-metrics", timeout=5) as response:
+            return json.loads(response.read())
+    except Exception:
+        return {}
+
+def server_rss_kb(pid) -> int:
+    """Resident memory of the server process (Linux /proc), 0 if unknown"""
+    if not pid:
+        return 0
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def percentiles(samples, points=(50, 90, 99, 99.9)) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {p: ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in points}
+
+async def sample_loop_lag(http_url: str, lags: list, stop: asyncio.Event):
+    """Poll the server's event-loop lag (from its heartbeat ticker) once a second"""
+    while not stop.is_set():
+        metrics = await asyncio.to_thread(server_metrics, http_url)
+        lag = (metrics.get("heartbeats") or {}).get("loop_lag_ms") or {}
+        if lag.get("last") is not None:
+            lags.append(lag["last"])
+        try:
+            await asyncio.wait_for(stop.wait(), 1)
+        except asyncio.TimeoutError:
+            pass
+
+async def connect_all(clients, base_url: str, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def connect(client):
+        async with semaphore:
+            await client.connect(base_url)
+
+    await asyncio.gather(*(connect(client) for client in clients))
+
+async def run_load_test(args, server_pid=None):
+    base_url = f"ws://{args.host}:{args.port}"
+    http_url = f"http://{args.host}:{args.port}"
+    stats = Stats()
+    clients = [Client(fake_object_id(i, "10ad"), stats, args.msgpack) for i in range(args.clients - args.clients % 2)]
+
+    rss_before = server_rss_kb(server_pid)
+    started = time.perf_counter()
+    await connect_all(clients, base_url, args.connect_concurrency)
+    connect_seconds = time.perf_counter() - started
+    rss_connected = server_rss_kb(server_pid)
+    print(f"🔌 {len(clients)} clients connected in {connect_seconds:.2f}s")
+
+    lags = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(sample_loop_lag(http_url, lags, stop))
+
+    sent_before, received_before = stats.sent, stats.received
+    started = time.perf_counter()
+    pairs = list(zip(clients[0::2], clients[1::2]))
+    await asyncio.gather(*(run_pair(index, caller, callee, args, stats) for index, (caller, callee) in enumerate(pairs)))
+    elapsed = time.perf_counter() - started
+    # Let batched candidates and trailing frames land
+    await asyncio.sleep(0.5)
+
+    stop.set()
+    await lag_task
+    metrics = await asyncio.to_thread(server_metrics, http_url)
+    await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+
+    sent = stats.sent - sent_before
+    received = stats.received - received_before
+    print()
+    print(f"📞 {stats.flows} call flows by {len(pairs)} pairs in {elapsed:.2f}s "
+          f"({stats.timeouts} timeouts, {stats.errors} error frames)")
+    print(f"📨 Client -> server: {sent} messages ({sent / elapsed:.0f}/s)")
+    print(f"📬 Server -> client: {received} messages ({received / elapsed:.0f}/s)")
+    if stats.probes:
+        print(f"⚠️ {len(stats.probes)} probed messages never arrived")
+
+    print()
+    print(f"{'latency ms':<16}{'count':>8}{'p50':>10}{'p90':>10}{'p99':>10}{'p99.9':>10}{'max':>10}")
+    for step, samples in stats.latency.items():
+        p = percentiles(samples)
+        print(f"{step:<16}{len(samples):>8}{p[50]:>10.2f}{p[90]:>10.2f}{p[99]:>10.2f}{p[99.9]:>10.2f}{max(samples):>10.2f}")
+
+    print()
+    if rss_before and rss_connected:
+        print(f"🧠 Server RSS {rss_before / 1024:.1f} MB -> {rss_connected / 1024:.1f} MB connected, "
+              f"{(rss_connected - rss_before) / len(clients):.1f} KB per connection")
+    else:
+        print("🧠 Server memory not measured (pass --spawn or --server-pid on Linux)")
+    if lags:
+        p = percentiles(lags)
+        print(f"⏱️ Server event-loop lag ms: p50 {p[50]:.2f}, p99 {p[99]:.2f}, max {max(lags):.2f} ({len(lags)} samples)")
+    if metrics:
+        print(f"📊 Server outbound: {metrics.get('sent')} sent, {metrics.get('dropped_total')} dropped, "
+              f"max queue depth {metrics.get('max_depth')}; ICE batching {metrics.get('ice_batches')}")
+
+def spawn_server(args):
+    """Start uvicorn for the app and wait until /health answers"""
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", args.host, "--port", str(args.port),
+         "--log-level", "warning"],
+        cwd=repo_root
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://{args.host}:{args.port}/health", timeout=1)
+            return process
+        except Exception:
+            time.sleep(0.3)
+    process.terminate()
+    raise RuntimeError("Server did not come up within 30s")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="WebSocket load test for ConnectionManager")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--clients", type=int, default=1000, help="simulated clients (paired into calls)")
+    parser.add_argument("--calls", type=int, default=3, help="call flows per pair")
+    parser.add_argument("--candidates", type=int, default=10, help="ICE candidates per side per call")
+    parser.add_argument("--transcriptions", type=int, default=20, help="transcription lines per call")
+    parser.add_argument("--transcription-interval", type=float, default=0.05, help="seconds between lines")
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--msgpack", action="store_true", help="negotiate the MessagePack subprotocol")
+    parser.add_argument("--spawn", action="store_true", help="start uvicorn for the app on --port")
+    parser.add_argument("--server-pid", type=int, help="server process to measure memory of")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.msgpack and msgpack is None:
+        sys.exit("❌ --msgpack needs the msgpack package")
+    server = spawn_server(args) if args.spawn else None
+    print(f"🚀 Load testing ws://{args.host}:{args.port} with {args.clients} clients")
+    try:
+        asyncio.run(run_load_test(args, server.pid if server else args.server_pid))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    print("✅ Done!")
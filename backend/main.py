@@ -1,4 +1,4 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
@@ -17,6 +17,14 @@ if str(parent_dir) not in sys.path:
 from backend.app.api import users, calls, analysis, leaderboard, websocket, oauth
 from backend.app.database import init_db
 from backend.app.core.config import settings
+from backend.app.services.percentiles import percentile_service
+from backend.app.services.leagues import leagues
+from backend.app.services.active_users import active_users
+from backend.app.services.message_bus import message_bus
+from backend.app.services.presence import presence
+from backend.app.services.leaderboard_feed import leaderboard_feed
+from backend.app.services.friends_leaderboard import friends_leaderboard
+from backend.app.services.directory import directory
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -24,9 +32,31 @@ async def lifespan(app: FastAPI):
     print("Initializing database...")
     await init_db()
     print("Database initialized")
+    leaderboard.global_stats_cache.start()
+    percentile_service.load()
+    leagues.load()
+    leagues.start()
+    active_users.start()
+    await message_bus.start(websocket.manager.handle_bus_message)
+    await presence.start()
+    await leaderboard_feed.start()
+    await friends_leaderboard.start()
+    await directory.start()
+    await websocket.manager.start()
+    percentile_service.start()
     yield
     # Shutdown
     print("Shutting down...")
+    await leaderboard.global_stats_cache.stop()
+    await percentile_service.stop()
+    await leagues.stop()
+    await active_users.stop()
+    await presence.stop()
+    await leaderboard_feed.stop()
+    await friends_leaderboard.stop()
+    await directory.stop()
+    await websocket.manager.heartbeats.stop()
+    await message_bus.stop()
 
 app = FastAPI(
     title="English Communication Platform",
@@ -79,28 +109,8 @@ async def health_check():
 @app.websocket("/api/ws/{user_id}")
 async def websocket_route(websocket: WebSocket, user_id: str):
     """Direct WebSocket endpoint for compatibility"""
-    from backend.app.api.websocket import manager
-    await manager.connect(websocket, user_id)
-    
-    try:
-        while True:
-            data = await websocket.receive_json()
-            message_type = data.get("type")
-            
-            if message_type == "ping":
-                await manager.send_personal_message({
-                    "type": "pong",
-                    "timestamp": "now"
-                }, user_id)
-            elif message_type == "webrtc-signal":
-                signal_data = data.get("signal", {})
-                await manager.handle_webrtc_signal(user_id, signal_data)
-                
-    except WebSocketDisconnect:
-        manager.disconnect(user_id)
-    except Exception as e:
-        print(f"WebSocket error: {e}")
-        manager.disconnect(user_id)
+    from backend.app.api.websocket import serve_connection
+    await serve_connection(websocket, user_id)
 
 if __name__ == "__main__":
     uvicorn.run(
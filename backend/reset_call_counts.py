@@ -20,6 +20,7 @@ def reset_call_counts():
                 "total_calls": 0,
                 "total_call_duration": 0,
                 "ai_score": 0.0,
+                "rankable": False,
                 "avg_fluency_score": 0.0
             }
         }
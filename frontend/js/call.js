@@ -193,6 +193,10 @@ const CallManager = {
             const data = JSON.parse(event.data);
             
             switch(data.type) {
+                case 'heartbeat':
+                    this.state.ws.send(JSON.stringify({ type: 'heartbeat_ack' }));
+                    break;
+                    
                 case 'webrtc-signal':
                     this.handleWebRTCSignal(data.signal);
                     break;
@@ -336,6 +340,19 @@ const CallManager = {
                     }
                     break;
                     
+                case 'ice-candidates':
+                    // A trickle-ICE burst coalesced by the server into one frame
+                    for (const candidate of signal.candidates) {
+                        try {
+                            await this.state.peerConnection.addIceCandidate(
+                                new RTCIceCandidate(candidate)
+                            );
+                        } catch (e) {
+                            console.warn('⚠️ Failed to add ICE candidate:', e);
+                        }
+                    }
+                    break;
+                    
                 case 'call-end':
                     this.endCall();
                     break;
@@ -33,7 +33,7 @@ const API_ENDPOINTS = {
     leaderboardTop: `${API_BASE_URL}/api/leaderboard/top`,
     
     // WebSocket
-    ws: `${WS_BASE_URL}/ws`
+    ws: `${WS_BASE_URL}/api/ws`
 };
 
 // Auth checker for protected routes
@@ -159,6 +159,10 @@ function initWebSocket(onMessage, onOpen, onClose) {
     ws.onmessage = (event) => {
         try {
             const data = JSON.parse(event.data);
+            if (data.type === 'heartbeat') {
+                ws.send(JSON.stringify({ type: 'heartbeat_ack' }));
+                return;
+            }
             if (onMessage) onMessage(data);
         } catch (error) {
             console.error('Failed to parse WebSocket message:', error);
@@ -168,9 +172,64 @@ function initWebSocket(onMessage, onOpen, onClose) {
     return ws;
 }
 
+// Notifications stored while the user had no page open (friend requests, call invites).
+// The server hands them over as one 'inbox' frame on every connect; live copies carry
+// inbox_seq too. Pages that show notifications pass each frame through handle(), which
+// skips duplicates and acks handled ones (acks wait for the connect batch, since an ack
+// of N removes everything up to N).
+function createInbox(getSocket) {
+    const seen = new Set();
+    let ready = false;
+    let ackSeq = 0;
+    
+    function ack() {
+        const socket = getSocket();
+        if (!ackSeq || !socket || socket.readyState !== WebSocket.OPEN) {
+            return;
+        }
+        socket.send(JSON.stringify({ type: 'inbox_ack', seq: ackSeq }));
+        ackSeq = 0;
+    }
+    
+    // Returns false for a notification already handled (live and again from the inbox)
+    function accept(seq) {
+        if (seen.has(seq)) {
+            return false;
+        }
+        seen.add(seq);
+        ackSeq = Math.max(ackSeq, seq);
+        if (ready) {
+            ack();
+        }
+        return true;
+    }
+    
+    return {
+        // True if the frame was consumed here (the inbox batch, or a duplicate)
+        handle(data, onNotification) {
+            if (data.type === 'inbox') {
+                (data.notifications || []).forEach(notification => {
+                    if (accept(notification.inbox_seq)) {
+                        onNotification(notification);
+                    }
+                });
+                ready = true;
+                ack();
+                return true;
+            }
+            return data.inbox_seq !== undefined && !accept(data.inbox_seq);
+        },
+        // Socket closed: hold acks until the next connection's batch arrives
+        reset() {
+            ready = false;
+        }
+    };
+}
+
 // Export for use in other files
 window.API_ENDPOINTS = API_ENDPOINTS;
 window.apiCall = apiCall;
 window.checkAuth = checkAuth;
 window.uploadFile = uploadFile;
-window.initWebSocket = initWebSocket;
\ No newline at end of file
+window.initWebSocket = initWebSocket;
+window.createInbox = createInbox;
\ No newline at end of file
@@ -1,7 +1,8 @@
 // Dashboard functionality with live updates
 let userData = null;
 let ws = null;
-let statsRefreshInterval = null;
+// Friend requests and call invites are shown here too, so they are acked here
+const inbox = createInbox(() => ws);
 
 // Initialize dashboard
 async function initDashboard() {
@@ -14,11 +15,8 @@ async function initDashboard() {
     // Load dashboard data
     await loadDashboardData();
     
-    // Setup WebSocket for live updates
+    // Setup WebSocket for live updates (stats refresh on pushed leaderboard deltas)
     setupWebSocket(currentUser.id);
-    
-    // Refresh stats periodically
-    statsRefreshInterval = setInterval(loadDashboardData, 30000);
 }
 
 // Display welcome message
@@ -301,10 +299,18 @@ function setupWebSocket(userId) {
         ws.onopen = () => {
             console.log('✅ Dashboard WebSocket connected');
             console.log('📡 Ready to receive notifications');
+            ws.send(JSON.stringify({ type: 'subscribe_leaderboard', timeframe: 'all', limit: 10 }));
         };
         
         ws.onmessage = (event) => {
             const data = JSON.parse(event.data);
+            if (data.type === 'heartbeat') {
+                ws.send(JSON.stringify({ type: 'heartbeat_ack' }));
+                return;
+            }
+            if (inbox.handle(data, handleWebSocketMessage)) {
+                return;
+            }
             console.log('📨 *** DASHBOARD WEBSOCKET MESSAGE ***', data);
             handleWebSocketMessage(data);
         };
@@ -315,6 +321,7 @@ function setupWebSocket(userId) {
         
         ws.onclose = () => {
             console.log('⚠️ WebSocket closed, reconnecting...');
+            inbox.reset();
             setTimeout(() => setupWebSocket(userId), 5000);
         };
     } catch (error) {
@@ -348,6 +355,13 @@ function handleWebSocketMessage(data) {
             // Handle call rejection notification
             showToast(`❌ ${data.rejected_by_name || 'User'} declined your call`, 'error');
             break;
+        case 'leaderboard_snapshot':
+            // Initial subscription snapshot; dashboard data is already fresh
+            break;
+        case 'leaderboard_delta':
+            // Rankings moved - refresh stats and rank
+            loadDashboardData();
+            break;
         default:
             // Refresh dashboard data for other updates
             loadDashboardData();
@@ -500,7 +514,6 @@ async function initiateCall(userId) {
 // Cleanup on page unload
 window.addEventListener('beforeunload', () => {
     if (ws) ws.close();
-    if (statsRefreshInterval) clearInterval(statsRefreshInterval);
 });
 
 // Show connection error
@@ -2,6 +2,7 @@
 let leaderboardData = [];
 let currentTimeframe = 'all';
 let currentSkillFilter = 'all';
+let leaderboardWs = null;
 
 // Initialize leaderboard page
 async function initLeaderboardPage() {
@@ -14,8 +15,63 @@ async function initLeaderboardPage() {
     // Load leaderboard
     await loadLeaderboard();
     
-    // Refresh every 30 seconds
-    setInterval(loadLeaderboard, 30000);
+    // Live updates are pushed over WebSocket as deltas
+    setupLeaderboardSocket();
+}
+
+// Subscribe to leaderboard deltas for the current filters
+function setupLeaderboardSocket() {
+    const currentUser = getCurrentUser();
+    if (!currentUser || !currentUser.id) return;
+    
+    leaderboardWs = new WebSocket(`${API_ENDPOINTS.ws}/${currentUser.id}`);
+    
+    leaderboardWs.onopen = () => {
+        console.log('✅ Leaderboard WebSocket connected');
+        subscribeLeaderboard();
+    };
+    
+    leaderboardWs.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.type === 'heartbeat') {
+            leaderboardWs.send(JSON.stringify({ type: 'heartbeat_ack' }));
+        } else if (data.type === 'leaderboard_snapshot') {
+            leaderboardData = data.entries;
+            displayLeaderboard(leaderboardData);
+        } else if (data.type === 'leaderboard_delta') {
+            applyLeaderboardDelta(data);
+        }
+    };
+    
+    leaderboardWs.onclose = () => {
+        console.log('⚠️ Leaderboard WebSocket closed, reconnecting in 5s...');
+        setTimeout(setupLeaderboardSocket, 5000);
+    };
+}
+
+function subscribeLeaderboard() {
+    if (!leaderboardWs || leaderboardWs.readyState !== WebSocket.OPEN) return;
+    
+    leaderboardWs.send(JSON.stringify({
+        type: 'subscribe_leaderboard',
+        timeframe: currentTimeframe,
+        skill_filter: currentSkillFilter,
+        limit: 20
+    }));
+}
+
+// Merge changed entries into the current list and re-render
+function applyLeaderboardDelta(delta) {
+    const removed = new Set(delta.removed || []);
+    const changed = new Map((delta.changes || []).map(entry => [entry.user_id, entry]));
+    
+    const merged = leaderboardData
+        .filter(entry => !removed.has(entry.user_id) && !changed.has(entry.user_id))
+        .concat([...changed.values()]);
+    merged.sort((a, b) => a.rank - b.rank);
+    
+    leaderboardData = merged;
+    displayLeaderboard(leaderboardData);
 }
 
 // Get current user helper
@@ -33,6 +89,7 @@ function setupFilters() {
         timeframeSelect.addEventListener('change', (e) => {
             currentTimeframe = e.target.value;
             loadLeaderboard();
+            subscribeLeaderboard();
         });
     }
     
@@ -40,6 +97,7 @@ function setupFilters() {
         skillSelect.addEventListener('change', (e) => {
             currentSkillFilter = e.target.value;
             loadLeaderboard();
+            subscribeLeaderboard();
         });
     }
 }
@@ -159,8 +217,13 @@ function displayLeaderboard(data) {
                     </div>
                 </div>
                 <div class="score">
-                    <div class="score-value">${entry.ai_score.toFixed(1)}</div>
-                    <div class="score-label">AI Score</div>
+                    ${entry.peer_rating != null ? `
+                    <div class="score-value">${entry.peer_rating.toFixed(2)}</div>
+                    <div class="score-label">Peer Rating (${entry.peer_rating_count})</div>
+                    ` : `
+                    <div class="score-value">${(entry.window_score ?? entry.ai_score).toFixed(1)}</div>
+                    <div class="score-label">${entry.window_score != null ? 'Points' : 'AI Score'}</div>
+                    `}
                 </div>
             </div>
         `;
@@ -3,6 +3,11 @@ let allUsers = [];
 let friends = [];
 let currentUser = null;
 let ws = null;
+// Server message stream this page has seen so far; a reconnect resumes from here
+let wsStream = null;
+let wsLastSeq = 0;
+// Inbox notifications handled on this page
+const inbox = createInbox(() => ws);
 
 // Initialize page
 async function initUsersPage() {
@@ -29,13 +34,6 @@ async function initUsersPage() {
     
     // Setup search
     setupSearch();
-    
-    // Refresh data every 10 seconds
-    setInterval(() => {
-        loadAllUsers();
-        loadFriends();
-        loadPendingRequests();
-    }, 10000);
 }
 
 function setupTabs() {
@@ -91,6 +89,7 @@ async function loadAllUsers() {
                 allUsers = allUsers.filter(u => u.id !== currentUser.id);
             }
             displayUsers(allUsers, 'all-users-grid');
+            watchPresence();
         } else {
             console.error('Failed to load users, status:', response.status);
             const container = document.getElementById('all-users-grid');
@@ -568,7 +567,8 @@ function setupWebSocket() {
         ws.close();
     }
     
-    const wsUrl = `ws://localhost:8000/api/ws/${userId}`;
+    const resume = wsStream ? `?stream=${wsStream}&last_seq=${wsLastSeq}` : '';
+    const wsUrl = `ws://localhost:8000/api/ws/${userId}${resume}`;
     console.log('🔌 Connecting to WebSocket:', wsUrl);
     console.log('👤 User ID:', userId);
     console.log('👤 User Name:', currentUser.name);
@@ -578,10 +578,25 @@ function setupWebSocket() {
     ws.onopen = () => {
         console.log('✅ WebSocket connected successfully');
         console.log('📡 Ready to receive call notifications');
+        watchPresence();
     };
     
     ws.onmessage = (event) => {
         const data = JSON.parse(event.data);
+        if (data.type === 'heartbeat') {
+            ws.send(JSON.stringify({ type: 'heartbeat_ack' }));
+            return;
+        }
+        if (data.seq !== undefined) {
+            // Replayed frames we already handled are skipped
+            if (data.seq <= wsLastSeq) {
+                return;
+            }
+            wsLastSeq = data.seq;
+        }
+        if (inbox.handle(data, handleWebSocketMessage)) {
+            return;
+        }
         console.log('📨 *** INCOMING WEBSOCKET MESSAGE ***', data);
         handleWebSocketMessage(data);
     };
@@ -592,6 +607,7 @@ function setupWebSocket() {
     
     ws.onclose = () => {
         console.log('⚠️ WebSocket closed, reconnecting in 5s...');
+        inbox.reset();
         setTimeout(setupWebSocket, 5000);
     };
 }
@@ -604,6 +620,21 @@ function handleWebSocketMessage(data) {
     
     if (data.type === 'welcome') {
         console.log('✅ Welcome message received - WebSocket is working!');
+        const reconnected = wsStream !== null;
+        wsStream = data.stream;
+        if (data.resumed) {
+            console.log(`🔁 Resumed: ${data.replayed} missed message(s) replayed`);
+        } else {
+            wsLastSeq = data.last_seq;
+            if (reconnected) {
+                // Missed messages are gone; reload instead
+                refreshAfterResync();
+            }
+        }
+    } else if (data.type === 'resync') {
+        wsStream = data.stream;
+        wsLastSeq = data.last_seq;
+        refreshAfterResync();
     } else if (data.type === 'user_online') {
         console.log(`✅ User ${data.user_id} is now ONLINE`);
         updateUserStatus(data.user_id, true);
@@ -616,6 +647,10 @@ function handleWebSocketMessage(data) {
         // Reload user lists to reflect offline status
         loadAllUsers();
         loadFriends();
+    } else if (data.type === 'presence') {
+        // Compact diff: ids that came online / went offline since the last push
+        (data.online || []).forEach(id => updateUserStatus(id, true));
+        (data.offline || []).forEach(id => updateUserStatus(id, false));
     } else if (data.type === 'user_status_changed') {
         console.log(`🔄 User ${data.user_id} status changed: ${data.is_online ? 'ONLINE' : 'OFFLINE'}`);
         updateUserStatus(data.user_id, data.is_online);
@@ -665,6 +700,24 @@ function handleWebSocketMessage(data) {
     }
 }
 
+// Reload server state when messages sent while disconnected could not be replayed
+function refreshAfterResync() {
+    loadAllUsers();
+    loadFriends();
+    loadPendingRequests();
+}
+
+// Ask the server to push online/offline changes for the users on screen (friends are watched automatically)
+function watchPresence() {
+    if (!ws || ws.readyState !== WebSocket.OPEN || allUsers.length === 0) {
+        return;
+    }
+    ws.send(JSON.stringify({
+        type: 'watch_presence',
+        user_ids: allUsers.map(u => u.id)
+    }));
+}
+
 function updateUserStatus(userId, isOnline) {
     const card = document.querySelector(`[data-user-id="${userId}"]`);
     if (card) {